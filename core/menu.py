@@ -197,6 +197,8 @@ class Menu(BaseMenu):
         [BaseUiElements.new_text_sprite('Online Chess', (Menu.font_60, 'Black', False), 0, 'midtop', (centerx, 50)),
         BaseUiElements.new_button('BlueButton', 'Local', 1, 'midbottom', (centerx - 260, window_size[1] - 15), (0.5, 1.4), 
         {'name' : 'play_button'}, (Menu.font_40, 'Black', False)),
+        BaseUiElements.new_button('BlueButton', 'CPU', 1, 'midbottom', (centerx, window_size[1] - 15), (0.5, 1.4), 
+        {'name' : 'cpu_button'}, (Menu.font_40, 'Black', False)),
         BaseUiElements.new_button('BlueButton', 'Online', 1, 'midbottom', (centerx + 260, window_size[1] - 15), (0.5, 1.4), 
         {'name' : 'online_button'}, (Menu.font_40, 'Black', False))], #stage 1
         ]
@@ -224,6 +226,10 @@ class Menu(BaseMenu):
                     if self.started_game: return
                     pygame.event.post(pygame.Event(core_object.START_GAME, {'mode' : 'local_pvp'}))
                     self.started_game = True
+                elif name == "cpu_button":
+                    if self.started_game: return
+                    pygame.event.post(pygame.Event(core_object.START_GAME, {'mode' : 'cpu'}))
+                    self.started_game = True
                 elif name == 'online_button':
                     if self.started_game: return
                     if not core_object.is_web():
@@ -0,0 +1,209 @@
+import argparse
+import mmap
+import os
+import sys
+from collections import deque
+from time import perf_counter
+from game.chess_module import (ChessGame, PieceType, TeamType, KING_TARGETS, PAWN_ATTACKS,
+                               ROOK_RAY_MASKS, BISHOP_RAY_MASKS, iter_squares)
+
+#win/draw/loss from the point of view of the side to move
+WIN : int = 1
+DRAW : int = 0
+LOSS : int = -1
+
+DEFAULT_DIRECTORY : str = 'assets/bitbases'
+BITBASE_MAGIC : bytes = b'BITBASE\x01'
+#every ending covered is a king and piece against a lone king
+BITBASE_PIECES : int = 3
+#positions are indexed as strong king * 4096 + weak king * 64 + piece square, with the strong side moved to white
+POSITION_COUNT : int = 64 * 64 * 64
+TABLE_BYTES : int = POSITION_COUNT // 8
+#the remaining move count of a position where the weak king can take the piece, it never reaches zero
+CAN_CAPTURE : int = 255
+
+ENDING_PIECES : dict[str, PieceType] = {'kqk' : PieceType.WHITE_QUEEN, 'krk' : PieceType.WHITE_ROOK, 'kpk' : PieceType.WHITE_PAWN}
+PIECE_ENDINGS : dict[PieceType, str] = {PieceType.WHITE_QUEEN : 'kqk', PieceType.BLACK_QUEEN : 'kqk',
+                                        PieceType.WHITE_ROOK : 'krk', PieceType.BLACK_ROOK : 'krk',
+                                        PieceType.WHITE_PAWN : 'kpk', PieceType.BLACK_PAWN : 'kpk'}
+
+def slider_attacks(square : int, occupied : int, ray_masks : list[tuple[list[int], bool]]) -> int:
+    attacks : int = 0
+    for masks, ascending in ray_masks:
+        ray : int = masks[square]
+        blockers : int = ray & occupied
+        if blockers:
+            nearest : int = (blockers & -blockers) if ascending else (1 << (blockers.bit_length() - 1))
+            ray ^= masks[nearest.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+def piece_attacks(piece : PieceType, square : int, occupied : int) -> int:
+    if piece == PieceType.WHITE_PAWN: return PAWN_ATTACKS[TeamType.WHITE][square]
+    attacks : int = slider_attacks(square, occupied, ROOK_RAY_MASKS)
+    if piece == PieceType.WHITE_QUEEN: attacks |= slider_attacks(square, occupied, BISHOP_RAY_MASKS)
+    return attacks
+
+def piece_unmoves(piece : PieceType, square : int, occupied : int) -> list[int]:
+    #squares the piece could have come from with a quiet move
+    if piece != PieceType.WHITE_PAWN: return list(iter_squares(piece_attacks(piece, square, occupied) & ~occupied))
+    origins : list[int] = []
+    if square >= 16 and not (occupied >> (square - 8)) & 1:
+        origins.append(square - 8)
+        if 24 <= square < 32 and not (occupied >> (square - 16)) & 1: origins.append(square - 16)
+    return origins
+
+def generate_bitbase(ending : str, promotion_tables : dict[str, tuple[bytearray, bytearray]]|None = None) -> tuple[bytearray, bytearray]:
+    '''Retrograde analysis of king and piece against king. Returns one byte per position for the strong side
+    to move and for the weak side to move, set when the strong side wins. The weak side can never win these endings,
+    so everything else is a draw. kpk needs the kqk and krk tables in promotion_tables.'''
+    piece : PieceType = ENDING_PIECES[ending]
+    is_pawn : bool = piece == PieceType.WHITE_PAWN
+    valid_white : bytearray = bytearray(POSITION_COUNT)
+    valid_black : bytearray = bytearray(POSITION_COUNT)
+    remaining : bytearray = bytearray(POSITION_COUNT)
+    win_white : bytearray = bytearray(POSITION_COUNT)
+    win_black : bytearray = bytearray(POSITION_COUNT)
+    queue : deque[tuple[bool, int]] = deque()
+    for index in range(POSITION_COUNT):
+        white_king, black_king, piece_square = index >> 12, (index >> 6) & 63, index & 63
+        if white_king == black_king or piece_square == white_king or piece_square == black_king: continue
+        if KING_TARGETS[white_king] >> black_king & 1: continue
+        if is_pawn and not 8 <= piece_square < 56: continue
+        king_bit : int = 1 << black_king
+        in_check : bool = bool(piece_attacks(piece, piece_square, (1 << white_king) | king_bit | (1 << piece_square)) & king_bit)
+        valid_black[index] = 1
+        if not in_check: valid_white[index] = 1
+        #legal moves of the weak king, the king itself no longer blocks the piece
+        occupied : int = (1 << white_king) | (1 << piece_square)
+        attacked : int = KING_TARGETS[white_king] | piece_attacks(piece, piece_square, occupied)
+        move_count : int = 0
+        for target in iter_squares(KING_TARGETS[black_king]):
+            if target == piece_square:
+                if not KING_TARGETS[white_king] >> piece_square & 1:
+                    move_count = CAN_CAPTURE
+                    break
+            elif not attacked >> target & 1:
+                move_count += 1
+        remaining[index] = move_count
+        if move_count == 0 and in_check:
+            win_black[index] = 1
+            queue.append((False, index))
+    if is_pawn:
+        queen_black : bytearray = promotion_tables['kqk'][1]
+        rook_black : bytearray = promotion_tables['krk'][1]
+        for index in range(POSITION_COUNT):
+            piece_square : int = index & 63
+            if not valid_white[index] or piece_square < 48: continue
+            if (index >> 12) == piece_square + 8 or ((index >> 6) & 63) == piece_square + 8: continue
+            if queen_black[index + 8] or rook_black[index + 8]:
+                win_white[index] = 1
+                queue.append((True, index))
+    while queue:
+        white_to_move, index = queue.popleft()
+        white_king, black_king, piece_square = index >> 12, (index >> 6) & 63, index & 63
+        occupied : int = (1 << white_king) | (1 << black_king) | (1 << piece_square)
+        if white_to_move:
+            #every weak king move into this position loses one escape for the position it came from
+            for origin in iter_squares(KING_TARGETS[black_king] & ~occupied):
+                previous : int = (white_king << 12) | (origin << 6) | piece_square
+                if not valid_black[previous] or win_black[previous]: continue
+                remaining[previous] -= 1
+                if remaining[previous] == 0:
+                    win_black[previous] = 1
+                    queue.append((False, previous))
+        else:
+            previous_indexes : list[int] = [(origin << 12) | (black_king << 6) | piece_square
+                                            for origin in iter_squares(KING_TARGETS[white_king] & ~occupied)]
+            previous_indexes += [(white_king << 12) | (black_king << 6) | origin for origin in piece_unmoves(piece, piece_square, occupied)]
+            for previous in previous_indexes:
+                if not valid_white[previous] or win_white[previous]: continue
+                win_white[previous] = 1
+                queue.append((True, previous))
+    return win_white, win_black
+
+def pack_bits(values : bytearray) -> bytes:
+    packed : bytearray = bytearray(len(values) // 8)
+    for index in range(len(values)):
+        if values[index]: packed[index >> 3] |= 1 << (index & 7)
+    return bytes(packed)
+
+def write_bitbase(path : str, tables : tuple[bytearray, bytearray]):
+    with open(path, 'wb') as file:
+        file.write(BITBASE_MAGIC + pack_bits(tables[0]) + pack_bits(tables[1]))
+
+class Bitbases:
+    '''Probes the kqk/krk/kpk files written by generate, memory mapped so only the touched pages are read.'''
+    def __init__(self, directory : str = DEFAULT_DIRECTORY):
+        self.files : list = []
+        self.tables : dict[str, mmap.mmap] = {}
+        for ending in ENDING_PIECES:
+            path : str = os.path.join(directory, f'{ending}.bb')
+            if not os.path.isfile(path): continue
+            file = open(path, 'rb')
+            mapping : mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if mapping[:len(BITBASE_MAGIC)] != BITBASE_MAGIC or len(mapping) != len(BITBASE_MAGIC) + 2 * TABLE_BYTES:
+                mapping.close()
+                file.close()
+                raise ValueError(f'{path} is not a bitbase file')
+            self.files.append(file)
+            self.tables[ending] = mapping
+
+    def close(self):
+        for mapping in self.tables.values(): mapping.close()
+        for file in self.files: file.close()
+        self.tables.clear()
+        self.files.clear()
+
+    def probe(self, game : ChessGame) -> int|None:
+        '''WIN, DRAW or LOSS for the side to move, or None when the position is not covered.'''
+        if len(game.piece_squares[TeamType.WHITE]) + len(game.piece_squares[TeamType.BLACK]) != BITBASE_PIECES: return None
+        strong_team : TeamType = TeamType.WHITE if len(game.piece_squares[TeamType.WHITE]) == 2 else TeamType.BLACK
+        weak_team : TeamType = strong_team.opposite()
+        piece_square : int = next(square for square in game.piece_squares[strong_team] if square != game.king_squares[strong_team])
+        ending : str|None = PIECE_ENDINGS.get(game.mailbox[piece_square])
+        if ending is None or ending not in self.tables: return None
+        strong_king : int = game.king_squares[strong_team]
+        weak_king : int = game.king_squares[weak_team]
+        if strong_team == TeamType.BLACK:
+            strong_king, weak_king, piece_square = strong_king ^ 56, weak_king ^ 56, piece_square ^ 56
+        index : int = (strong_king << 12) | (weak_king << 6) | piece_square
+        strong_to_move : bool = game.current_turn == strong_team
+        byte : int = self.tables[ending][len(BITBASE_MAGIC) + (0 if strong_to_move else TABLE_BYTES) + (index >> 3)]
+        if not (byte >> (index & 7)) & 1: return DRAW
+        return WIN if strong_to_move else LOSS
+
+def load_bitbases(directory : str = DEFAULT_DIRECTORY) -> Bitbases|None:
+    bitbases : Bitbases = Bitbases(directory)
+    if not bitbases.tables: return None
+    return bitbases
+
+def main(argv : list[str]|None = None) -> int:
+    parser = argparse.ArgumentParser(description='Generate or probe the king and piece against king bitbases')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    generate_parser = subparsers.add_parser('generate', help='run the retrograde analysis and write kqk.bb, krk.bb and kpk.bb')
+    generate_parser.add_argument('-o', '--output', default=DEFAULT_DIRECTORY)
+    probe_parser = subparsers.add_parser('probe', help='print the result of a position')
+    probe_parser.add_argument('fen')
+    probe_parser.add_argument('-d', '--directory', default=DEFAULT_DIRECTORY)
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        os.makedirs(args.output, exist_ok=True)
+        tables : dict[str, tuple[bytearray, bytearray]] = {}
+        for ending in ('kqk', 'krk', 'kpk'):
+            start_time : float = perf_counter()
+            tables[ending] = generate_bitbase(ending, tables)
+            wins : int = sum(tables[ending][0]) + sum(tables[ending][1])
+            write_bitbase(os.path.join(args.output, f'{ending}.bb'), tables[ending])
+            print(f'{ending}: {wins} won positions in {perf_counter() - start_time:.1f}s')
+        return 0
+    bitbases : Bitbases = Bitbases(args.directory)
+    try:
+        result : int|None = bitbases.probe(ChessGame.from_fen(args.fen))
+    finally:
+        bitbases.close()
+    print({WIN : 'win', DRAW : 'draw', LOSS : 'loss', None : 'not in the bitbases'}[result])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,7 @@
 
 from enum import Enum, IntEnum
-from typing import Any, TypedDict, NotRequired, Literal
-from utils.helpers import sign
-from copy import deepcopy
+from random import Random
+from typing import Any, TypedDict, NotRequired, Literal, Iterator
 
 class ChessMoveExtraInfo(TypedDict):
     promotion_choice : NotRequired['PieceType']
@@ -45,21 +44,397 @@ class PieceType(IntEnum):
         return TeamType.WHITE if self.value <= 6 else TeamType.BLACK
 
 
+PIECE_TEAMS : list[TeamType|None] = [None] + [TeamType.WHITE] * 6 + [TeamType.BLACK] * 6
+
+def square_index(x : int, y : int) -> int:
+    return (y - 1) * 8 + (x - 1)
+
+def square_coords(square : int) -> tuple[int, int]:
+    return (square % 8 + 1, square // 8 + 1)
+
+def iter_squares(mask : int) -> Iterator[int]:
+    while mask:
+        lowest_bit : int = mask & -mask
+        yield lowest_bit.bit_length() - 1
+        mask ^= lowest_bit
+
+def make_between_table() -> list[list[int]]:
+    table : list[list[int]] = [[0 for _ in range(64)] for _ in range(64)]
+    for start in range(64):
+        start_x, start_y = start % 8, start // 8
+        for direction_x, direction_y in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)):
+            x, y = start_x + direction_x, start_y + direction_y
+            path : int = 0
+            while 0 <= x < 8 and 0 <= y < 8:
+                table[start][y * 8 + x] = path
+                path |= 1 << (y * 8 + x)
+                x += direction_x
+                y += direction_y
+    return table
+
+BETWEEN : list[list[int]] = make_between_table()
+
+ROOK_DIRECTIONS : tuple[tuple[int, int], ...] = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS : tuple[tuple[int, int], ...] = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+KNIGHT_OFFSETS : tuple[tuple[int, int], ...] = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_OFFSETS : tuple[tuple[int, int], ...] = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+def make_ray_table() -> dict[tuple[int, int], list[list[int]]]:
+    table : dict[tuple[int, int], list[list[int]]] = {}
+    for direction_x, direction_y in KING_OFFSETS:
+        rays : list[list[int]] = []
+        for start in range(64):
+            x, y = start % 8 + direction_x, start // 8 + direction_y
+            ray : list[int] = []
+            while 0 <= x < 8 and 0 <= y < 8:
+                ray.append(y * 8 + x)
+                x += direction_x
+                y += direction_y
+            rays.append(ray)
+        table[(direction_x, direction_y)] = rays
+    return table
+
+def make_step_table(offsets : tuple[tuple[int, int], ...]) -> list[int]:
+    table : list[int] = []
+    for start in range(64):
+        mask : int = 0
+        for offset_x, offset_y in offsets:
+            x, y = start % 8 + offset_x, start // 8 + offset_y
+            if 0 <= x < 8 and 0 <= y < 8: mask |= 1 << (y * 8 + x)
+        table.append(mask)
+    return table
+
+def make_ray_mask_table(directions : tuple[tuple[int, int], ...]) -> list[tuple[list[int], bool]]:
+    #the nearest blocker on a ray is its lowest set bit when the ray runs towards higher squares, else its highest
+    return [([sum(1 << square for square in ray) for ray in RAYS[direction]], direction[1] * 8 + direction[0] > 0) 
+            for direction in directions]
+
+RAYS : dict[tuple[int, int], list[list[int]]] = make_ray_table()
+ROOK_RAY_MASKS : list[tuple[list[int], bool]] = make_ray_mask_table(ROOK_DIRECTIONS)
+BISHOP_RAY_MASKS : list[tuple[list[int], bool]] = make_ray_mask_table(BISHOP_DIRECTIONS)
+KNIGHT_TARGETS : list[int] = make_step_table(KNIGHT_OFFSETS)
+KING_TARGETS : list[int] = make_step_table(KING_OFFSETS)
+PAWN_ATTACKS : dict[TeamType, list[int]] = {TeamType.WHITE : make_step_table(((-1, 1), (1, 1))), 
+                                            TeamType.BLACK : make_step_table(((-1, -1), (1, -1)))}
+TEAM_PIECES : dict[TeamType, tuple[PieceType, ...]] = {
+    TeamType.WHITE : (PieceType.WHITE_PAWN, PieceType.WHITE_KNIGHT, PieceType.WHITE_BISHOP, PieceType.WHITE_ROOK, PieceType.WHITE_QUEEN, PieceType.WHITE_KING),
+    TeamType.BLACK : (PieceType.BLACK_PAWN, PieceType.BLACK_KNIGHT, PieceType.BLACK_BISHOP, PieceType.BLACK_ROOK, PieceType.BLACK_QUEEN, PieceType.BLACK_KING)
+}
+
+#piece values used by the static exchange evaluation, indexed by PieceType
+SEE_PIECE_VALUES : list[int] = [0, 500, 320, 330, 900, 20000, 100, 500, 320, 330, 900, 20000, 100]
+
+#moves are packed into 16 bits: start square (bits 0-5), end square (bits 6-11) and flags (bits 12-15)
+PackedMove = int
+
+MOVE_QUIET : int = 0
+MOVE_DOUBLE_PUSH : int = 1
+MOVE_KING_CASTLE : int = 2
+MOVE_QUEEN_CASTLE : int = 3
+MOVE_CAPTURE : int = 4
+MOVE_EN_PASSANT : int = 5
+MOVE_PROMOTION : int = 8 #the two lowest flag bits then hold the promotion piece index
+
+PROMOTION_PIECES : dict[TeamType, tuple[PieceType, ...]] = {
+    TeamType.WHITE : (PieceType.WHITE_KNIGHT, PieceType.WHITE_BISHOP, PieceType.WHITE_ROOK, PieceType.WHITE_QUEEN),
+    TeamType.BLACK : (PieceType.BLACK_KNIGHT, PieceType.BLACK_BISHOP, PieceType.BLACK_ROOK, PieceType.BLACK_QUEEN)
+}
+PROMOTION_INDEXES : dict[PieceType, int] = {piece : index for pieces in PROMOTION_PIECES.values() for index, piece in enumerate(pieces)}
+
+def pack_move(start : int, end : int, flags : int = MOVE_QUIET) -> PackedMove:
+    return start | (end << 6) | (flags << 12)
+
+def move_start(move : PackedMove) -> int:
+    return move & 63
+
+def move_end(move : PackedMove) -> int:
+    return (move >> 6) & 63
+
+def move_flags(move : PackedMove) -> int:
+    return move >> 12
+
+def move_promotion(move : PackedMove) -> PieceType:
+    flags : int = move >> 12
+    if not flags & MOVE_PROMOTION: return PieceType.EMPTY
+    return PROMOTION_PIECES[TeamType.WHITE if (move >> 6) & 63 >= 56 else TeamType.BLACK][flags & 3]
+
+CASTLING_ROOK_MOVES : dict[int, tuple[int, int]] = {6 : (7, 5), 2 : (0, 3), 62 : (63, 61), 58 : (56, 59)}
+CASTLING_CORNERS : dict[int, tuple[TeamType, int]] = {0 : (TeamType.WHITE, 0), 7 : (TeamType.WHITE, 1),
+                                                      56 : (TeamType.BLACK, 0), 63 : (TeamType.BLACK, 1)}
+
+FEN_PIECES : dict[str, PieceType] = {
+    'R' : PieceType.WHITE_ROOK, 'N' : PieceType.WHITE_KNIGHT, 'B' : PieceType.WHITE_BISHOP,
+    'Q' : PieceType.WHITE_QUEEN, 'K' : PieceType.WHITE_KING, 'P' : PieceType.WHITE_PAWN,
+    'r' : PieceType.BLACK_ROOK, 'n' : PieceType.BLACK_KNIGHT, 'b' : PieceType.BLACK_BISHOP,
+    'q' : PieceType.BLACK_QUEEN, 'k' : PieceType.BLACK_KING, 'p' : PieceType.BLACK_PAWN,
+}
+PIECE_FEN_LETTERS : dict[PieceType, str] = {piece : letter for letter, piece in FEN_PIECES.items()}
+STARTING_FEN : str = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+UndoRecord = tuple[PackedMove, PieceType, PieceType, int, tuple[bool, bool, bool, bool], tuple[tuple[int, int], tuple[int, int]]|None, int, int]
+
+_zobrist_random : Random = Random(0x5EED_C4E55)
+ZOBRIST_PIECES : list[list[int]] = [[0 for _ in range(64)]] + [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_CASTLING : list[int] = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EN_PASSANT : list[int] = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_SIDE : int = _zobrist_random.getrandbits(64)
+del _zobrist_random
+
+#evaluation terms, kept as running totals by set_square and blended by game phase in evaluate
+MIDGAME_PIECE_VALUES : dict[str, int] = {'pawn' : 100, 'knight' : 320, 'bishop' : 330, 'rook' : 500, 'queen' : 900, 'king' : 0}
+ENDGAME_PIECE_VALUES : dict[str, int] = {'pawn' : 120, 'knight' : 300, 'bishop' : 320, 'rook' : 530, 'queen' : 950, 'king' : 0}
+PHASE_WEIGHTS : dict[str, int] = {'pawn' : 0, 'knight' : 1, 'bishop' : 1, 'rook' : 2, 'queen' : 4, 'king' : 0}
+MAX_PHASE : int = 24
+
+#piece-square tables from white's point of view, written rank 8 first so they read like a board
+MIDGAME_PIECE_SQUARE_TABLES : dict[str, list[int]] = {
+    'pawn' : [
+          0,   0,   0,   0,   0,   0,   0,   0,
+         50,  50,  50,  50,  50,  50,  50,  50,
+         10,  10,  20,  30,  30,  20,  10,  10,
+          5,   5,  10,  25,  25,  10,   5,   5,
+          0,   0,   0,  20,  20,   0,   0,   0,
+          5,  -5, -10,   0,   0, -10,  -5,   5,
+          5,  10,  10, -20, -20,  10,  10,   5,
+          0,   0,   0,   0,   0,   0,   0,   0],
+    'knight' : [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20,   0,   0,   0,   0, -20, -40,
+        -30,   0,  10,  15,  15,  10,   0, -30,
+        -30,   5,  15,  20,  20,  15,   5, -30,
+        -30,   0,  15,  20,  20,  15,   0, -30,
+        -30,   5,  10,  15,  15,  10,   5, -30,
+        -40, -20,   0,   5,   5,   0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50],
+    'bishop' : [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,  10,  10,   5,   0, -10,
+        -10,   5,   5,  10,  10,   5,   5, -10,
+        -10,   0,  10,  10,  10,  10,   0, -10,
+        -10,  10,  10,  10,  10,  10,  10, -10,
+        -10,   5,   0,   0,   0,   0,   5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20],
+    'rook' : [
+          0,   0,   0,   0,   0,   0,   0,   0,
+          5,  10,  10,  10,  10,  10,  10,   5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+          0,   0,   0,   5,   5,   0,   0,   0],
+    'queen' : [
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,   5,   5,   5,   0, -10,
+         -5,   0,   5,   5,   5,   5,   0,  -5,
+          0,   0,   5,   5,   5,   5,   0,  -5,
+        -10,   5,   5,   5,   5,   5,   0, -10,
+        -10,   0,   5,   0,   0,   0,   0, -10,
+        -20, -10, -10,  -5,  -5, -10, -10, -20],
+    'king' : [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+         20,  20,   0,   0,   0,   0,  20,  20,
+         20,  30,  10,   0,   0,  10,  30,  20],
+}
+
+ENDGAME_PIECE_SQUARE_TABLES : dict[str, list[int]] = MIDGAME_PIECE_SQUARE_TABLES | {
+    'pawn' : [
+          0,   0,   0,   0,   0,   0,   0,   0,
+         80,  80,  80,  80,  80,  80,  80,  80,
+         50,  50,  50,  50,  50,  50,  50,  50,
+         30,  30,  30,  30,  30,  30,  30,  30,
+         15,  15,  15,  15,  15,  15,  15,  15,
+          5,   5,   5,   5,   5,   5,   5,   5,
+          0,   0,   0,   0,   0,   0,   0,   0,
+          0,   0,   0,   0,   0,   0,   0,   0],
+    'king' : [
+        -50, -40, -30, -20, -20, -30, -40, -50,
+        -30, -20, -10,   0,   0, -10, -20, -30,
+        -30, -10,  20,  30,  30,  20, -10, -30,
+        -30, -10,  30,  40,  40,  30, -10, -30,
+        -30, -10,  30,  40,  40,  30, -10, -30,
+        -30, -10,  20,  30,  30,  20, -10, -30,
+        -30, -30,   0,   0,   0,   0, -30, -30,
+        -50, -30, -30, -30, -30, -30, -30, -50],
+}
+
+PIECE_KINDS : list[str] = [''] + [piece.name.split('_')[1].lower() for piece in list(PieceType)[1:]]
+
+def make_piece_square_values(piece_values : dict[str, int], tables : dict[str, list[int]]) -> list[list[int]]:
+    #signed material + position value of every piece on every square, white positive
+    table : list[list[int]] = [[0 for _ in range(64)]]
+    for piece in list(PieceType)[1:]:
+        kind : str = PIECE_KINDS[piece]
+        values : list[int] = []
+        for square in range(64):
+            x, y = square % 8, square // 8
+            if piece.get_color() == TeamType.WHITE:
+                values.append(piece_values[kind] + tables[kind][(7 - y) * 8 + x])
+            else:
+                values.append(-(piece_values[kind] + tables[kind][y * 8 + x]))
+        table.append(values)
+    return table
+
+MIDGAME_SQUARE_VALUES : list[list[int]] = make_piece_square_values(MIDGAME_PIECE_VALUES, MIDGAME_PIECE_SQUARE_TABLES)
+ENDGAME_SQUARE_VALUES : list[list[int]] = make_piece_square_values(ENDGAME_PIECE_VALUES, ENDGAME_PIECE_SQUARE_TABLES)
+PIECE_PHASES : list[int] = [0] + [PHASE_WEIGHTS[PIECE_KINDS[piece]] for piece in list(PieceType)[1:]]
+
 class ChessGame:
     def __init__(self):
         self.current_turn : TeamType = TeamType.WHITE
-        self.board : list[list[PieceType]] = self.make_new_board()
         self.castling_rights : dict[TeamType, list[bool]] = {TeamType.WHITE : [True, True], TeamType.BLACK : [True, True]}
         self.captured_pieces : dict[TeamType, list[PieceType]] = {TeamType.WHITE : [], TeamType.BLACK : []}
         self.en_passant : tuple[tuple[int, int], tuple[int, int]]|None = None
+        self.undo_stack : list[UndoRecord] = []
+        self.halfmove_clock : int = 0
+        self.fullmove_number : int = 1
+        self.zobrist_key : int = 0
+        self.position_counts : dict[int, int] = {}
+        self.bitboards : list[int] = [0 for _ in PieceType]
+        self.occupancy : list[int] = [0, 0]
+        self.occupied : int = 0
+        self.mailbox : list[PieceType] = [PieceType.EMPTY for _ in range(64)]
+        self.piece_squares : dict[TeamType, set[int]] = {TeamType.WHITE : set(), TeamType.BLACK : set()}
+        self.king_squares : list[int] = [-1, -1]
+        self.piece_counts : list[int] = [0 for _ in PieceType]
+        self.midgame_score : int = 0
+        self.endgame_score : int = 0
+        self.phase : int = 0
+        self.board = self.make_new_board()
+
+    @property
+    def board(self) -> list[list[PieceType]]:
+        return [self.mailbox[row * 8 : row * 8 + 8] for row in range(8)]
+
+    @board.setter
+    def board(self, new_board : list[list[PieceType]]):
+        self.bitboards = [0 for _ in PieceType]
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.mailbox = [PieceType.EMPTY for _ in range(64)]
+        self.piece_squares = {TeamType.WHITE : set(), TeamType.BLACK : set()}
+        self.king_squares = [-1, -1]
+        self.piece_counts = [0 for _ in PieceType]
+        self.midgame_score = 0
+        self.endgame_score = 0
+        self.phase = 0
+        for y, row in enumerate(new_board):
+            for x, piece in enumerate(row):
+                if piece != PieceType.EMPTY: self.set_at(x + 1, y + 1, piece)
+        self.zobrist_key = self.compute_zobrist_key()
+        self.position_counts = {self.zobrist_key : 1}
+
+    @classmethod
+    def from_fen(cls, fen : str) -> 'ChessGame':
+        fields : list[str] = fen.split()
+        if len(fields) < 4: raise ValueError(f'Invalid FEN: {fen}')
+        placement, turn, castling, en_passant = fields[:4]
+        rows : list[str] = placement.split('/')
+        if len(rows) != 8 or turn not in {'w', 'b'}: raise ValueError(f'Invalid FEN: {fen}')
+        board : list[list[PieceType]] = [[PieceType.EMPTY for _ in range(8)] for _ in range(8)]
+        for row_index, row in enumerate(rows):
+            x : int = 0
+            for char in row:
+                if char.isdigit():
+                    x += int(char)
+                elif char in FEN_PIECES and x < 8:
+                    board[7 - row_index][x] = FEN_PIECES[char]
+                    x += 1
+                else:
+                    raise ValueError(f'Invalid FEN: {fen}')
+            if x != 8: raise ValueError(f'Invalid FEN: {fen}')
+
+        game = cls()
+        game.current_turn = TeamType.WHITE if turn == 'w' else TeamType.BLACK
+        game.castling_rights = {TeamType.WHITE : ['Q' in castling, 'K' in castling], TeamType.BLACK : ['q' in castling, 'k' in castling]}
+        game.en_passant = None
+        if en_passant != '-':
+            if len(en_passant) != 2 or en_passant[0] not in 'abcdefgh' or en_passant[1] not in '36':
+                raise ValueError('bad FEN en passant field')
+            target_x : int = 'abcdefgh'.index(en_passant[0]) + 1
+            target_y : int = int(en_passant[1])
+            game.en_passant = ((target_x, target_y), (target_x, 4 if target_y == 3 else 5))
+        game.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        game.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        game.board = board
+        return game
+
+    def to_fen(self) -> str:
+        rows : list[str] = []
+        for y in range(7, -1, -1):
+            row : str = ''
+            empty_count : int = 0
+            for piece in self.mailbox[y * 8 : y * 8 + 8]:
+                if piece == PieceType.EMPTY:
+                    empty_count += 1
+                    continue
+                if empty_count: row += str(empty_count)
+                empty_count = 0
+                row += PIECE_FEN_LETTERS[piece]
+            if empty_count: row += str(empty_count)
+            rows.append(row)
+        white_rights : list[bool] = self.castling_rights[TeamType.WHITE]
+        black_rights : list[bool] = self.castling_rights[TeamType.BLACK]
+        castling : str = ('K' if white_rights[1] else '') + ('Q' if white_rights[0] else '') + ('k' if black_rights[1] else '') + ('q' if black_rights[0] else '')
+        en_passant : str = '-' if self.en_passant is None else number_to_string_coord(*self.en_passant[0])
+        return ' '.join(['/'.join(rows), 'w' if self.current_turn == TeamType.WHITE else 'b', castling or '-', en_passant,
+                         str(self.halfmove_clock), str(self.fullmove_number)])
+
+    def compute_zobrist_key(self) -> int:
+        key : int = 0
+        for square in iter_squares(self.occupied):
+            key ^= ZOBRIST_PIECES[self.mailbox[square]][square]
+        key ^= ZOBRIST_CASTLING[self.get_castling_index()]
+        key ^= self.get_en_passant_key()
+        if self.current_turn == TeamType.BLACK: key ^= ZOBRIST_SIDE
+        return key
+
+    def get_castling_index(self) -> int:
+        white_rights : list[bool] = self.castling_rights[TeamType.WHITE]
+        black_rights : list[bool] = self.castling_rights[TeamType.BLACK]
+        return white_rights[0] | (white_rights[1] << 1) | (black_rights[0] << 2) | (black_rights[1] << 3)
+
+    def get_en_passant_key(self) -> int:
+        #only hashed when the side to move has a pawn that could actually take en passant
+        if self.en_passant is None: return 0
+        pawn_x, pawn_y = self.en_passant[1]
+        capturing_pawns : int = self.bitboards[PieceType.WHITE_PAWN if self.current_turn == TeamType.WHITE else PieceType.BLACK_PAWN]
+        pawn_square : int = square_index(pawn_x, pawn_y)
+        if (pawn_x > 1 and (capturing_pawns >> (pawn_square - 1)) & 1) or (pawn_x < 8 and (capturing_pawns >> (pawn_square + 1)) & 1):
+            return ZOBRIST_EN_PASSANT[pawn_x - 1]
+        return 0
+    
+    def is_threefold_repetition(self) -> bool:
+        return self.position_counts.get(self.zobrist_key, 0) >= 3
     
     def copy(self) -> 'ChessGame':
         new_game = ChessGame()
         new_game.current_turn = self.current_turn
-        new_game.board = deepcopy(self.board)
-        new_game.castling_rights = deepcopy(self.castling_rights)
-        new_game.captured_pieces = deepcopy(self.captured_pieces)
+        new_game.bitboards = self.bitboards[:]
+        new_game.occupancy = self.occupancy[:]
+        new_game.occupied = self.occupied
+        new_game.mailbox = self.mailbox[:]
+        new_game.piece_squares = {team : squares.copy() for team, squares in self.piece_squares.items()}
+        new_game.king_squares = self.king_squares[:]
+        new_game.piece_counts = self.piece_counts[:]
+        new_game.midgame_score = self.midgame_score
+        new_game.endgame_score = self.endgame_score
+        new_game.phase = self.phase
+        new_game.castling_rights = {team : rights[:] for team, rights in self.castling_rights.items()}
+        new_game.captured_pieces = {team : pieces[:] for team, pieces in self.captured_pieces.items()}
         new_game.en_passant = self.en_passant
+        new_game.undo_stack = self.undo_stack[:]
+        new_game.halfmove_clock = self.halfmove_clock
+        new_game.fullmove_number = self.fullmove_number
+        new_game.zobrist_key = self.zobrist_key
+        new_game.position_counts = self.position_counts.copy()
         return new_game
     
     def make_move(self, start_pos : tuple[int, int], end_pos : tuple[int, int], bonus_info : ChessMoveExtraInfo,
@@ -67,151 +442,327 @@ class ChessGame:
         bonus_instructions : list[dict[str, Any]] = []
         if not simulation:
             if not self.validate_move(start_pos, end_pos, bonus_info): return False
-        PT = PieceType
-        selected : PieceType = self.get_at(*start_pos)
-        team : TeamType = selected.get_color()
-        if selected == PT.EMPTY:
+        if self.get_at(*start_pos) == PieceType.EMPTY:
             return False
-        target : PieceType = self.get_at(*end_pos)
-        if target != PT.EMPTY:
-            self.captured_pieces[target.get_color()].append(target)
-            bonus_instructions.append({'type' : 'capture_at', 'pos' : end_pos})
-        self.set_at(*end_pos, selected)
-        self.set_at(*start_pos, PieceType.EMPTY)
-        target_en_passant : tuple[int, int]|None = None if self.en_passant is None else self.en_passant[0]
-        if selected == PT.WHITE_PAWN:
-            if end_pos[1] == 8:
-                promotion_choice : PieceType = bonus_info.get('promotion_choice', PT.WHITE_QUEEN)
-                self.set_at(*end_pos, promotion_choice)
-                bonus_instructions.append({'type' : 'change_type', 'pos' : end_pos, 'new_type' : promotion_choice})
-            
-            if target_en_passant is not None:
-                if target_en_passant[0] == end_pos[0] and target_en_passant[1] == end_pos[1]:
-                    self.set_at(*(self.en_passant[1]), PT.EMPTY)
-                    bonus_instructions.append({'type' : 'capture_at', 'pos' : self.en_passant[1]})
-
-        elif selected == PT.BLACK_PAWN:
-            if end_pos[1] == 1:
-                promotion_choice : PieceType = bonus_info.get('promotion_choice', PT.BLACK_QUEEN)
-                self.set_at(*end_pos, promotion_choice)
-                bonus_instructions.append({'type' : 'change_type', 'pos' : end_pos, 'new_type' : promotion_choice})
-            
-            if target_en_passant is not None:
-                if target_en_passant[0] == end_pos[0] and target_en_passant[1] == end_pos[1]:
-                    self.set_at(*(self.en_passant[1]), PT.EMPTY)
-                    bonus_instructions.append({'type' : 'capture_at', 'pos' : self.en_passant[1]})
-            
-
-        elif selected == PT.WHITE_ROOK or selected == PT.BLACK_ROOK:
-            team = selected.get_color()
-            if start_pos[0] == 1: self.castling_rights[team][0] = False
-            if start_pos[0] == 8: self.castling_rights[team][1] = False
-        
-        elif selected == PT.BLACK_KING:
-            self.castling_rights[team] = [False, False]
-            if abs(start_pos[0] - end_pos[0]) >= 2:
-                direction_x : int = int(sign(end_pos[0] - start_pos[0]))
-                rook_x : int = end_pos[0] - direction_x
-                rook_y : int = 8
-                og_x : int = 8 if end_pos[0] > 5 else 1
-                og_y = rook_y
-                self.set_at(rook_x, rook_y, PT.BLACK_ROOK)
-                self.set_at(og_x, og_y, PT.EMPTY)
-                bonus_instructions.append({'type' : 'move_piece_to', 'start_pos' : (og_x, og_y), 'end_pos' : (rook_x, rook_y)})
-
-        elif selected == PT.WHITE_KING:
-            self.castling_rights[team] = [False, False]
-            if abs(start_pos[0] - end_pos[0]) >= 2:
-                direction_x : int = int(sign(end_pos[0] - start_pos[0]))
-                rook_x : int = end_pos[0] - direction_x
-                rook_y : int = 1
-                og_x : int = 8 if end_pos[0] > 5 else 1
-                og_y = rook_y
-                self.set_at(rook_x, rook_y, PT.WHITE_ROOK)
-                self.set_at(og_x, og_y, PT.EMPTY)
-                bonus_instructions.append({'type' : 'move_piece_to', 'start_pos' : (og_x, og_y), 'end_pos' : (rook_x, rook_y)})
+        move : PackedMove = self.pack_move(start_pos, end_pos, bonus_info)
+        flags : int = move >> 12
+        promotion : PieceType = move_promotion(move)
+        self.push(move)
+        captured : PieceType = self.undo_stack[-1][2]
+        captured_square : int = self.undo_stack[-1][3]
+        if captured != PieceType.EMPTY:
+            bonus_instructions.append({'type' : 'capture_at', 'pos' : square_coords(captured_square)})
+        if promotion != PieceType.EMPTY:
+            bonus_instructions.append({'type' : 'change_type', 'pos' : end_pos, 'new_type' : promotion})
+        if flags == MOVE_KING_CASTLE or flags == MOVE_QUEEN_CASTLE:
+            rook_start, rook_end = CASTLING_ROOK_MOVES[move_end(move)]
+            bonus_instructions.append({'type' : 'move_piece_to', 'start_pos' : square_coords(rook_start), 'end_pos' : square_coords(rook_end)})
 
-        self.change_turn()
-        self.en_passant = None
-        if selected in {PT.WHITE_PAWN, PT.BLACK_PAWN}:
-            delta_y : int = end_pos[1] - start_pos[1]
-            abs_x : int = abs(end_pos[0] - start_pos[0])
-            abs_y : int = abs(delta_y)
-            direction_y : int = int(sign(delta_y))
-            if abs_y == 2 and abs_x == 0:
-                self.en_passant = ((start_pos[0], start_pos[1] + direction_y), end_pos)
         if simulation: return bonus_instructions
         in_check : bool = self.is_check()
         has_legal_move : bool = self.has_legal_move()
         #print(has_legal_move)
-        if in_check and has_legal_move:
-            bonus_instructions.append({'type' : 'check'})
-        elif in_check and not has_legal_move:
+        if in_check and not has_legal_move:
             bonus_instructions.append({'type' : 'checkmate'})
-        elif not in_check and not has_legal_move:
+        elif not has_legal_move:
             bonus_instructions.append({'type' : 'stalemate'})
         else:
-            if not (self.has_checkmating_material(TeamType.WHITE) or self.has_checkmating_material(TeamType.BLACK)):
+            if in_check:
+                bonus_instructions.append({'type' : 'check'})
+            #a repetition reached by a checking move (perpetual check) is still a draw
+            if self.is_threefold_repetition():
+                bonus_instructions.append({'type' : 'threefold_repetition'})
+            elif not in_check and not (self.has_checkmating_material(TeamType.WHITE) or self.has_checkmating_material(TeamType.BLACK)):
                 bonus_instructions.append({'type' : 'insufficent_material'})
         return bonus_instructions
+
+    def pack_move(self, start_pos : tuple[int, int], end_pos : tuple[int, int], bonus_info : ChessMoveExtraInfo) -> PackedMove:
+        PT = PieceType
+        start : int = square_index(*start_pos)
+        end : int = square_index(*end_pos)
+        selected : PieceType = self.mailbox[start]
+        flags : int = MOVE_CAPTURE if (self.occupied >> end) & 1 else MOVE_QUIET
+        if selected == PT.WHITE_PAWN or selected == PT.BLACK_PAWN:
+            if end >= 56 or end < 8:
+                flags |= MOVE_PROMOTION | PROMOTION_INDEXES.get(bonus_info.get('promotion_choice', PT.EMPTY), 3)
+            elif abs(end - start) == 16:
+                flags = MOVE_DOUBLE_PUSH
+            elif (end - start) % 8 and flags == MOVE_QUIET:
+                flags = MOVE_EN_PASSANT
+        elif (selected == PT.WHITE_KING or selected == PT.BLACK_KING) and abs(end - start) == 2:
+            flags = MOVE_KING_CASTLE if end > start else MOVE_QUEEN_CASTLE
+        return pack_move(start, end, flags)
+
+    def pack_chess_move(self, move : ChessMove) -> PackedMove:
+        return self.pack_move(move['start_pos'], move['end_pos'], move['extra_info'])
+
+    def push(self, move : PackedMove):
+        start : int = move & 63
+        end : int = (move >> 6) & 63
+        flags : int = move >> 12
+        PT = PieceType
+        mailbox : list[PieceType] = self.mailbox
+        selected : PieceType = mailbox[start]
+        captured_square : int = end
+        if flags == MOVE_EN_PASSANT:
+            captured_square = (start & 56) | (end & 7)
+        captured : PieceType = mailbox[captured_square]
+        rights : dict[TeamType, list[bool]] = self.castling_rights
+        white_rights : list[bool] = rights[TeamType.WHITE]
+        black_rights : list[bool] = rights[TeamType.BLACK]
+        self.undo_stack.append((move, selected, captured, captured_square,
+                                (white_rights[0], white_rights[1], black_rights[0], black_rights[1]), self.en_passant, self.zobrist_key,
+                                self.halfmove_clock))
+        self.zobrist_key ^= ZOBRIST_CASTLING[self.get_castling_index()] ^ self.get_en_passant_key()
+
+        if captured != PT.EMPTY:
+            self.captured_pieces[PIECE_TEAMS[captured]].append(captured)
+            self.set_square(captured_square, PT.EMPTY)
+        self.set_square(start, PT.EMPTY)
+        self.set_square(end, PROMOTION_PIECES[PIECE_TEAMS[selected]][flags & 3] if flags & MOVE_PROMOTION else selected)
+
+        if selected == PT.WHITE_KING or selected == PT.BLACK_KING:
+            rights[PIECE_TEAMS[selected]][0] = rights[PIECE_TEAMS[selected]][1] = False
+            if flags == MOVE_KING_CASTLE or flags == MOVE_QUEEN_CASTLE:
+                rook_start, rook_end = CASTLING_ROOK_MOVES[end]
+                self.set_square(rook_end, mailbox[rook_start])
+                self.set_square(rook_start, PT.EMPTY)
+        if start in CASTLING_CORNERS:
+            team, side = CASTLING_CORNERS[start]
+            rights[team][side] = False
+        if end in CASTLING_CORNERS:
+            team, side = CASTLING_CORNERS[end]
+            rights[team][side] = False
+
+        self.en_passant = None
+        if flags == MOVE_DOUBLE_PUSH:
+            self.en_passant = (square_coords((start + end) // 2), square_coords(end))
+        if captured != PT.EMPTY or selected == PT.WHITE_PAWN or selected == PT.BLACK_PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.current_turn == TeamType.BLACK: self.fullmove_number += 1
+        self.change_turn()
+        self.zobrist_key ^= ZOBRIST_CASTLING[self.get_castling_index()] ^ self.get_en_passant_key()
+        self.position_counts[self.zobrist_key] = self.position_counts.get(self.zobrist_key, 0) + 1
+
+    def pop(self) -> PackedMove:
+        move, selected, captured, captured_square, castling_rights, en_passant, zobrist_key, halfmove_clock = self.undo_stack.pop()
+        start : int = move & 63
+        end : int = (move >> 6) & 63
+        flags : int = move >> 12
+        PT = PieceType
+        remaining : int = self.position_counts[self.zobrist_key] - 1
+        if remaining: self.position_counts[self.zobrist_key] = remaining
+        else: del self.position_counts[self.zobrist_key]
+        self.change_turn()
+        if flags == MOVE_KING_CASTLE or flags == MOVE_QUEEN_CASTLE:
+            rook_start, rook_end = CASTLING_ROOK_MOVES[end]
+            self.set_square(rook_start, self.mailbox[rook_end])
+            self.set_square(rook_end, PT.EMPTY)
+        self.set_square(end, PT.EMPTY)
+        self.set_square(start, selected)
+        if captured != PT.EMPTY:
+            self.set_square(captured_square, captured)
+            self.captured_pieces[PIECE_TEAMS[captured]].pop()
+        white_rights : list[bool] = self.castling_rights[TeamType.WHITE]
+        black_rights : list[bool] = self.castling_rights[TeamType.BLACK]
+        white_rights[0], white_rights[1], black_rights[0], black_rights[1] = castling_rights
+        self.en_passant = en_passant
+        self.zobrist_key = zobrist_key
+        self.halfmove_clock = halfmove_clock
+        if self.current_turn == TeamType.BLACK: self.fullmove_number -= 1
+        return move
     
     def will_end_turn_in_check(self, start_pos : tuple[int, int], end_pos : tuple[int, int], bonus_info : ChessMoveExtraInfo) -> bool:
-        alternate_reality = self.copy()
-        alternate_reality.make_move(start_pos, end_pos, bonus_info, simulation=True)
-        alternate_reality.change_turn()
-        if alternate_reality.is_check(): return True
-        return False
+        team : TeamType|None = PIECE_TEAMS[self.get_at(*start_pos)]
+        self.push(self.pack_move(start_pos, end_pos, bonus_info))
+        in_check : bool = self.is_check(team)
+        self.pop()
+        return in_check
     
     def has_legal_move(self, team : TeamType|None = None) -> bool:
-        team = team or self.current_turn
-        for coords, piece in self.get_all_pieces().items():
-            if piece.get_color() != team: continue
-            for end_y in range(1, 8 + 1):
-                for end_x in range(1, 8 + 1):
-                    if self.validate_move(coords, (end_x, end_y), {}):
-                        return (coords, (end_x, end_y))
+        for _ in self.generate_legal_moves(team):
+            return True
         return False
 
+    def generate_legal_moves(self, team : TeamType|None = None) -> Iterator[PackedMove]:
+        team = self.current_turn if team is None else team
+        for move in self.generate_pseudo_legal_moves(team):
+            self.push(move)
+            in_check : bool = self.is_check(team)
+            self.pop()
+            if not in_check:
+                yield move
+
+    def generate_pseudo_legal_moves(self, team : TeamType|None = None) -> Iterator[PackedMove]:
+        team = self.current_turn if team is None else team
+        own : int = self.occupancy[team]
+        enemy : int = self.occupancy[team.opposite()]
+        occupied : int = self.occupied
+        pawn, knight, bishop, rook, queen, king = TEAM_PIECES[team]
+        if team == TeamType.WHITE:
+            forward, double_push_row, promotion_row = 8, 1, 7
+        else:
+            forward, double_push_row, promotion_row = -8, 6, 0
+        #the en passant square only belongs to the side to move, the other side never gets to use it
+        en_passant_square : int = -1 if self.en_passant is None or team != self.current_turn else square_index(*self.en_passant[0])
+        CAPTURE_FLAGS : int = MOVE_CAPTURE << 12
+
+        for start in iter_squares(self.bitboards[pawn]):
+            x : int = start % 8
+            push : int = start + forward
+            targets : list[tuple[int, int]] = []
+            if not (occupied >> push) & 1:
+                targets.append((push, MOVE_QUIET))
+                if start // 8 == double_push_row and not (occupied >> (push + forward)) & 1:
+                    yield start | ((push + forward) << 6) | (MOVE_DOUBLE_PUSH << 12)
+            for end in ((push - 1,) if x == 7 else (push + 1,) if x == 0 else (push - 1, push + 1)):
+                if (enemy >> end) & 1: targets.append((end, MOVE_CAPTURE))
+                elif end == en_passant_square: targets.append((end, MOVE_EN_PASSANT))
+            for end, flags in targets:
+                if end // 8 == promotion_row:
+                    for index in (3, 2, 1, 0): yield start | (end << 6) | ((flags | MOVE_PROMOTION | index) << 12)
+                else:
+                    yield start | (end << 6) | (flags << 12)
+
+        for start in iter_squares(self.bitboards[knight]):
+            for end in iter_squares(KNIGHT_TARGETS[start] & ~own):
+                yield start | (end << 6) | (CAPTURE_FLAGS if (enemy >> end) & 1 else 0)
+
+        for piece, directions in ((bishop, BISHOP_DIRECTIONS), (rook, ROOK_DIRECTIONS), (queen, KING_OFFSETS)):
+            for start in iter_squares(self.bitboards[piece]):
+                for direction in directions:
+                    for end in RAYS[direction][start]:
+                        if (occupied >> end) & 1:
+                            if (enemy >> end) & 1: yield start | (end << 6) | CAPTURE_FLAGS
+                            break
+                        yield start | (end << 6)
+
+        for start in iter_squares(self.bitboards[king]):
+            for end in iter_squares(KING_TARGETS[start] & ~own):
+                yield start | (end << 6) | (CAPTURE_FLAGS if (enemy >> end) & 1 else 0)
+            if any(self.castling_rights[team]):
+                start_pos : tuple[int, int] = square_coords(start)
+                if self.validate_castling(start_pos, (7, start_pos[1]), team):
+                    yield start | ((start + 2) << 6) | (MOVE_KING_CASTLE << 12)
+                if self.validate_castling(start_pos, (3, start_pos[1]), team):
+                    yield start | ((start - 2) << 6) | (MOVE_QUEEN_CASTLE << 12)
+
     def has_checkmating_material(self, team : TeamType|None = None) -> bool:
-        team = team or self.current_turn
-        piece_count : dict[PieceType, int] = {piece : 0 for piece in PieceType}
-        piece_total : int = 0
-        for coords, piece in self.get_all_pieces().items():
-            if piece.get_color() != team: continue
-            if piece == PieceType.WHITE_KING or piece == PieceType.BLACK_KING: continue
-            if piece.value % 6 in {1, 4, 5}: return True
-            piece_count[piece] += 1
-            piece_total += 1
-            if piece_total >= 3: return True
-            if piece_total == 2 and (piece_count[PieceType.WHITE_KNIGHT] + piece_count[PieceType.BLACK_KNIGHT]) < 2: return True
-        return False
+        team = self.current_turn if team is None else team
+        pawn, knight, bishop, rook, queen, _ = TEAM_PIECES[team]
+        piece_counts : list[int] = self.piece_counts
+        if piece_counts[pawn] or piece_counts[rook] or piece_counts[queen]: return True
+        minor_count : int = piece_counts[knight] + piece_counts[bishop]
+        return minor_count >= 3 or (minor_count == 2 and piece_counts[knight] < 2)
+
 
+    def evaluate(self) -> int:
+        '''Material and piece-square score in centipawns, white positive, tapered between middlegame and endgame by phase.'''
+        phase : int = min(self.phase, MAX_PHASE)
+        return (self.midgame_score * phase + self.endgame_score * (MAX_PHASE - phase)) // MAX_PHASE
+    
+    def get_material(self, team : TeamType) -> int:
+        piece_counts : list[int] = self.piece_counts
+        return sum(piece_counts[piece] * MIDGAME_PIECE_VALUES[PIECE_KINDS[piece]] for piece in TEAM_PIECES[team])
 
     def is_check(self, defending_team : TeamType|None = None) -> bool:
-        defending_team = defending_team or self.current_turn
-        defending_king_pos : tuple[int, int] = self.get_kings()[defending_team]
-        return self.is_square_attacked(*defending_king_pos, defending_team.opposite())
+        defending_team = self.current_turn if defending_team is None else defending_team
+        return self.is_square_index_attacked(self.king_squares[defending_team], defending_team.opposite())
     
     def is_square_attacked(self, target_x : int, target_y : int, attacking_team : TeamType) -> bool:
-        for coords, piece in self.get_all_pieces().items():
-            if piece.get_color() != attacking_team: continue
-            valid_attack : bool = self.validate_movement(coords, (target_x, target_y), piece)
-            if valid_attack: return True
+        return self.is_square_index_attacked((target_y - 1) * 8 + (target_x - 1), attacking_team)
+
+    def is_square_index_attacked(self, square : int, attacking_team : TeamType) -> bool:
+        bitboards : list[int] = self.bitboards
+        pawn, knight, bishop, rook, queen, king = TEAM_PIECES[attacking_team]
+        if PAWN_ATTACKS[attacking_team.opposite()][square] & bitboards[pawn]: return True
+        if KNIGHT_TARGETS[square] & bitboards[knight]: return True
+        if KING_TARGETS[square] & bitboards[king]: return True
+        occupied : int = self.occupied
+        for sliders, ray_masks in ((bitboards[bishop] | bitboards[queen], BISHOP_RAY_MASKS), (bitboards[rook] | bitboards[queen], ROOK_RAY_MASKS)):
+            if not sliders: continue
+            for masks, ascending in ray_masks:
+                blockers : int = masks[square] & occupied
+                if not blockers: continue
+                nearest : int = (blockers & -blockers) if ascending else (1 << (blockers.bit_length() - 1))
+                if nearest & sliders: return True
         return False
     
+    def attackers_to(self, square : int, occupied : int) -> int:
+        '''Bitboard of the pieces of both teams attacking square, with sliders seeing through anything missing from occupied.'''
+        bitboards : list[int] = self.bitboards
+        p = PieceType
+        attackers : int = ((PAWN_ATTACKS[TeamType.BLACK][square] & bitboards[p.WHITE_PAWN]) 
+                           | (PAWN_ATTACKS[TeamType.WHITE][square] & bitboards[p.BLACK_PAWN])
+                           | (KNIGHT_TARGETS[square] & (bitboards[p.WHITE_KNIGHT] | bitboards[p.BLACK_KNIGHT]))
+                           | (KING_TARGETS[square] & (bitboards[p.WHITE_KING] | bitboards[p.BLACK_KING])))
+        queens : int = bitboards[p.WHITE_QUEEN] | bitboards[p.BLACK_QUEEN]
+        for sliders, ray_masks in ((bitboards[p.WHITE_BISHOP] | bitboards[p.BLACK_BISHOP] | queens, BISHOP_RAY_MASKS), 
+                                   (bitboards[p.WHITE_ROOK] | bitboards[p.BLACK_ROOK] | queens, ROOK_RAY_MASKS)):
+            for masks, ascending in ray_masks:
+                blockers : int = masks[square] & occupied
+                if not blockers: continue
+                nearest : int = (blockers & -blockers) if ascending else (1 << (blockers.bit_length() - 1))
+                if nearest & sliders: attackers |= nearest
+        return attackers & occupied
+    
+    def see(self, start_pos : tuple[int, int], end_pos : tuple[int, int]) -> int:
+        '''Static exchange evaluation of the piece on start_pos capturing on end_pos, in centipawns for the moving side.
+        Pins and checks are ignored.'''
+        return self.see_square(square_index(*start_pos), square_index(*end_pos))
+
+    def see_square(self, start : int, end : int) -> int:
+        mailbox : list[PieceType] = self.mailbox
+        bitboards : list[int] = self.bitboards
+        attacker : PieceType = mailbox[start]
+        team : TeamType = PIECE_TEAMS[attacker]
+        occupied : int = self.occupied ^ (1 << start)
+        gain : int = SEE_PIECE_VALUES[mailbox[end]]
+        on_square : int = SEE_PIECE_VALUES[attacker]
+        if attacker == TEAM_PIECES[team][0]:
+            if mailbox[end] == PieceType.EMPTY and (start - end) % 8:
+                #en passant, the captured pawn is not on the target square
+                gain = SEE_PIECE_VALUES[PieceType.WHITE_PAWN]
+                occupied ^= 1 << (end - 8 if team == TeamType.WHITE else end + 8)
+            if end >= 56 or end < 8:
+                gain += SEE_PIECE_VALUES[PieceType.WHITE_QUEEN] - SEE_PIECE_VALUES[PieceType.WHITE_PAWN]
+                on_square = SEE_PIECE_VALUES[PieceType.WHITE_QUEEN]
+        gains : list[int] = [gain]
+        side : TeamType = team.opposite()
+        attackers : int = self.attackers_to(end, occupied)
+        while True:
+            side_attackers : int = attackers & self.occupancy[side]
+            if not side_attackers: break
+            for piece in TEAM_PIECES[side]:
+                candidates : int = bitboards[piece] & side_attackers
+                if candidates: break
+            if piece == TEAM_PIECES[side][5] and attackers & self.occupancy[side.opposite()]:
+                break #the king cannot recapture onto a defended square
+            gains.append(on_square - gains[-1])
+            on_square = SEE_PIECE_VALUES[piece]
+            occupied ^= candidates & -candidates
+            attackers = self.attackers_to(end, occupied)
+            side = side.opposite()
+        while len(gains) > 1:
+            last : int = gains.pop()
+            gains[-1] = -max(-gains[-1], last)
+        return gains[0]
+    
     def validate_move(self, start_pos : tuple[int, int], end_pos : tuple[int, int], bonus_info : ChessMoveExtraInfo, return_true : bool = False,
                       verify_turn_end_check : bool = True) -> bool:
         #teamkilling
         #turnorder
         if return_true: return True
-        PT = PieceType
         selected_piece : PieceType = self.get_at(*start_pos)
         if selected_piece == PieceType.EMPTY: return False
-        team : TeamType = selected_piece.get_color()
+        team : TeamType = PIECE_TEAMS[selected_piece]
         if (team != self.current_turn): return False
-        if start_pos[0] == end_pos[0] and start_pos[1] == end_pos[1]: return False
-        target : PieceType|None = self.get_at(*end_pos)
-        if (target.get_color() == selected_piece.get_color()) and target is not None: return False
+        start : int = square_index(*start_pos)
+        end : int = square_index(*end_pos)
+        if start == end: return False
+        if self.occupancy[team] & (1 << end): return False
         movement_is_valid : bool = self.validate_movement(start_pos, end_pos, selected_piece)
         if not movement_is_valid: return False
         if verify_turn_end_check:
@@ -219,7 +770,7 @@ class ChessGame:
         return True
     
     def validate_movement(self, start_pos : tuple[int, int], end_pos : tuple[int, int], piece : PieceType) -> bool:
-        team = piece.get_color()
+        team = PIECE_TEAMS[piece]
         if team is None: return False
         PT = PieceType
         match piece:
@@ -239,147 +790,88 @@ class ChessGame:
                 movement_is_valid = False
         return movement_is_valid
 
+    def validate_sliding_movement(self, start_pos : tuple[int, int], end_pos : tuple[int, int], team : TeamType) -> bool:
+        start : int = square_index(*start_pos)
+        end : int = square_index(*end_pos)
+        if BETWEEN[start][end] & self.occupied: return False
+        return not (self.occupancy[team] >> end) & 1
+
     def validate_rook_movement(self, start_pos : tuple[int, int], end_pos : tuple[int, int], team : TeamType) -> bool:
-        delta_x : int = end_pos[0] - start_pos[0]
-        delta_y : int = end_pos[1] - start_pos[1]
-        abs_x : int = abs(delta_x)
-        abs_y : int = abs(delta_y)
-        direction_x : int = int(sign(delta_x))
-        direction_y : int = int(sign(delta_y))
+        abs_x : int = abs(end_pos[0] - start_pos[0])
+        abs_y : int = abs(end_pos[1] - start_pos[1])
         if abs_x > 0 and abs_y > 0: return False
         if abs_x == 0 and abs_y == 0: return False
-        x, y = start_pos
-        while (True):
-            x += direction_x
-            y += direction_y
-            current_tile : PieceType = self.get_at(x, y)
-            if x == end_pos[0] and y == end_pos[1]:
-                return team != current_tile.get_color()
-            if current_tile != PieceType.EMPTY:
-                return False
-        return False
+        return self.validate_sliding_movement(start_pos, end_pos, team)
     
     def validate_bishop_movement(self, start_pos : tuple[int, int], end_pos : tuple[int, int], team : TeamType) -> bool:
-        delta_x : int = end_pos[0] - start_pos[0]
-        delta_y : int = end_pos[1] - start_pos[1]
-        abs_x : int = abs(delta_x)
-        abs_y : int = abs(delta_y)
-        direction_x : int = int(sign(delta_x))
-        direction_y : int = int(sign(delta_y))
+        abs_x : int = abs(end_pos[0] - start_pos[0])
+        abs_y : int = abs(end_pos[1] - start_pos[1])
         if abs_x != abs_y: return False
         if abs_x == 0: return False
-        x, y = start_pos
-        while (True):
-            x += direction_x
-            y += direction_y
-            current_tile : PieceType = self.get_at(x, y)
-            if x == end_pos[0] and y == end_pos[1]:
-                return team != current_tile.get_color()
-            if current_tile != PieceType.EMPTY:
-                return False
-        return False
+        return self.validate_sliding_movement(start_pos, end_pos, team)
 
     def validate_queen_movement(self, start_pos : tuple[int, int], end_pos : tuple[int, int], team : TeamType) -> bool:
         return self.validate_rook_movement(start_pos, end_pos, team) or self.validate_bishop_movement(start_pos, end_pos, team)
     
     def validate_knight_movement(self, start_pos : tuple[int, int], end_pos : tuple[int, int], team : TeamType) -> bool:
-        delta_x : int = end_pos[0] - start_pos[0]
-        delta_y : int = end_pos[1] - start_pos[1]
-        abs_x : int = abs(delta_x)
-        abs_y : int = abs(delta_y)
+        abs_x : int = abs(end_pos[0] - start_pos[0])
+        abs_y : int = abs(end_pos[1] - start_pos[1])
         if (abs_x not in {1, 2}) or (abs_y not in {1, 2}): return False
         if abs_x == abs_y: return False
-        return team != self.get_piece_color(self.get_at(*end_pos))
+        return not (self.occupancy[team] >> square_index(*end_pos)) & 1
     
     def validate_king_movement(self, start_pos : tuple[int, int], end_pos : tuple[int, int], team : TeamType) -> bool:
-        delta_x : int = end_pos[0] - start_pos[0]
-        delta_y : int = end_pos[1] - start_pos[1]
-        abs_x : int = abs(delta_x)
-        abs_y : int = abs(delta_y)
+        abs_x : int = abs(end_pos[0] - start_pos[0])
+        abs_y : int = abs(end_pos[1] - start_pos[1])
         if abs_x == 0 and abs_y == 0: return False
         if abs_y > 1: return False
         if abs_x > 2: return False
         if abs_x <= 1:
-            return team != self.get_piece_color(self.get_at(*end_pos))
+            return not (self.occupancy[team] >> square_index(*end_pos)) & 1
         if abs_x == 2 and abs_y > 0: return False
         return self.validate_castling(start_pos, end_pos, team)
     
     def validate_castling(self, start_pos : tuple[int, int], end_pos : tuple[int, int], team : TeamType) -> bool:
         if not any(self.castling_rights[team]): return False
+        Y_LEVEL : int = 1 if team == TeamType.WHITE else 8
+        if start_pos[0] != 5 or start_pos[1] != Y_LEVEL: return False
+        direction_x : int = 1 if end_pos[0] > start_pos[0] else -1
+        if not self.castling_rights[team][0 if direction_x == -1 else 1]: return False
+        rook_square : int = square_index(8 if direction_x == 1 else 1, Y_LEVEL)
+        rook_type : PieceType = PieceType.WHITE_ROOK if team == TeamType.WHITE else PieceType.BLACK_ROOK
+        if not (self.bitboards[rook_type] >> rook_square) & 1: return False
+        if BETWEEN[square_index(*start_pos)][rook_square] & self.occupied: return False
         if self.is_check(defending_team=team): return False
-        delta_x : int = end_pos[0] - start_pos[0]
-        delta_y : int = end_pos[1] - start_pos[1]
-        abs_x : int = abs(delta_x)
-        abs_y : int = abs(delta_y)
-        direction_x : int = int(sign(delta_x))
-        if direction_x == 1:
-            if not self.castling_rights[team][1]: return False
-        elif direction_x == -1:
-            if not self.castling_rights[team][0]: return False
-        match team:
-            case TeamType.WHITE:
-                Y_LEVEL = 1
-                if start_pos[0] != 5 or start_pos[1] != Y_LEVEL: return False
-                if direction_x == 1:
-                    if self.get_at(8, Y_LEVEL) != PieceType.WHITE_ROOK: return False
-                elif direction_x == -1:
-                    if self.get_at(1,Y_LEVEL) != PieceType.WHITE_ROOK: return False
-                if any(self.is_square_attacked(x, Y_LEVEL, TeamType.BLACK) for x in range(5, 5 + direction_x * 3)):
-                    return False
-            case TeamType.BLACK:
-                Y_LEVEL = 8
-                #print('break1')
-                if start_pos[0] != 5 or start_pos[1] != Y_LEVEL: return False
-                #print('break2')
-                if direction_x == 1:
-                    if self.get_at(8, Y_LEVEL) != PieceType.BLACK_ROOK: return False
-                
-                elif direction_x == -1:
-                    if self.get_at(1,Y_LEVEL) != PieceType.BLACK_ROOK: return False
-                #print('break_3')
-                if any(self.is_square_attacked(x, Y_LEVEL, TeamType.WHITE) for x in range(5, 5 + direction_x * 3)):
-                    return False
-        #print('break4')
+        if any(self.is_square_attacked(x, Y_LEVEL, team.opposite()) for x in range(5 + direction_x, 5 + direction_x * 3, direction_x)):
+            return False
         return True
     
     def validate_pawn_movement(self, start_pos : tuple[int, int], end_pos : tuple[int, int], team : TeamType) -> bool:
-        delta_x : int = end_pos[0] - start_pos[0]
         delta_y : int = end_pos[1] - start_pos[1]
-        abs_x : int = abs(delta_x)
-        abs_y : int = abs(delta_y)
-        direction_x : int = int(int(sign(delta_x)))
-        direction_y : int = int(int(sign(delta_y)))
+        abs_x : int = abs(end_pos[0] - start_pos[0])
+        direction_y : int = 1 if team == TeamType.WHITE else -1
+        end_bit : int = 1 << square_index(*end_pos)
         if abs_x > 1: return False
-        if abs_y > 2: return False
-        if abs_y == 0: return False
-        target : PieceType = self.get_at(*end_pos)
-        if team == TeamType.WHITE:
-            if direction_y == -1: return False
-            if abs_y == 2 and (start_pos[1] != 2 or abs_x != 0 or target != PieceType.EMPTY): return False
-        else:
-            if direction_y == 1: return False
-            if abs_y == 2 and (start_pos[1] != 7 or abs_x != 0 or target != PieceType.EMPTY): return False
         if abs_x == 0: #we are moving forwards
-            if abs_y == 1:
-                return target == PieceType.EMPTY
-            else:
-                return (target == PieceType.EMPTY
-                        and self.get_at(start_pos[0], start_pos[1] + direction_y)) == PieceType.EMPTY
+            if end_bit & self.occupied: return False
+            if delta_y == direction_y: return True
+            if delta_y != 2 * direction_y: return False
+            if start_pos[1] != (2 if team == TeamType.WHITE else 7): return False
+            return not BETWEEN[square_index(*start_pos)][square_index(*end_pos)] & self.occupied
         else:
-            if (self.get_at(*end_pos) == PieceType.EMPTY):
-                if self.en_passant is None: return False
-                target_en_passant : tuple[int, int] = self.en_passant[0]
-                if not (end_pos[0] == target_en_passant[0] and end_pos[1] == target_en_passant[1]): return False
-            if self.get_piece_color(self.get_at(*end_pos)) == team: return False
-            return True
+            if delta_y != direction_y: return False
+            if end_bit & self.occupancy[team.opposite()]: return True
+            if self.en_passant is None: return False
+            target_en_passant : tuple[int, int] = self.en_passant[0]
+            return end_pos[0] == target_en_passant[0] and end_pos[1] == target_en_passant[1]
     
     def change_turn(self):
         self.current_turn = TeamType.WHITE if self.current_turn == TeamType.BLACK else TeamType.BLACK
+        self.zobrist_key ^= ZOBRIST_SIDE
     
     @staticmethod
     def get_piece_color(piece : PieceType) -> TeamType|None:
-        if piece == PieceType.EMPTY: return None
-        return TeamType.WHITE if (1 <= piece.value <= 6) else TeamType.BLACK
+        return PIECE_TEAMS[piece]
 
     @staticmethod
     def make_new_board() -> list[list[PieceType]]:
@@ -396,47 +888,123 @@ class ChessGame:
         ]
     
     def get_at(self, x : int, y : int) -> PieceType:
-        return self.board[y - 1][x - 1]
+        return self.mailbox[(y - 1) * 8 + (x - 1)]
     
     def set_at(self, x : int, y : int, new_val : PieceType):
-        self.board[y - 1][x - 1] = new_val
+        self.set_square((y - 1) * 8 + (x - 1), new_val)
+
+    def set_square(self, square : int, new_val : PieceType):
+        square_bit : int = 1 << square
+        old_val : PieceType = self.mailbox[square]
+        if old_val != PieceType.EMPTY:
+            old_team : TeamType = PIECE_TEAMS[old_val]
+            self.bitboards[old_val] ^= square_bit
+            self.occupancy[old_team] ^= square_bit
+            self.piece_squares[old_team].discard(square)
+            self.piece_counts[old_val] -= 1
+            if self.king_squares[old_team] == square: self.king_squares[old_team] = -1
+        if new_val != PieceType.EMPTY:
+            new_team : TeamType = PIECE_TEAMS[new_val]
+            self.bitboards[new_val] |= square_bit
+            self.occupancy[new_team] |= square_bit
+            self.piece_squares[new_team].add(square)
+            self.piece_counts[new_val] += 1
+            if new_val == PieceType.WHITE_KING or new_val == PieceType.BLACK_KING: self.king_squares[new_team] = square
+        self.zobrist_key ^= ZOBRIST_PIECES[old_val][square] ^ ZOBRIST_PIECES[new_val][square]
+        self.midgame_score += MIDGAME_SQUARE_VALUES[new_val][square] - MIDGAME_SQUARE_VALUES[old_val][square]
+        self.endgame_score += ENDGAME_SQUARE_VALUES[new_val][square] - ENDGAME_SQUARE_VALUES[old_val][square]
+        self.phase += PIECE_PHASES[new_val] - PIECE_PHASES[old_val]
+        self.mailbox[square] = new_val
+        self.occupied = self.occupancy[0] | self.occupancy[1]
     
     def get_all_pieces(self) -> dict[tuple[int, int], PieceType]:
-        result_dict : dict[tuple[int, int], PieceType] = {}
-        for y in range(8):
-            for x in range(8):
-                current : PieceType = self.board[y][x]
-                if current != PieceType.EMPTY:
-                    result_dict[(x + 1, y + 1)] = current
-        return result_dict
+        mailbox : list[PieceType] = self.mailbox
+        return {square_coords(square) : mailbox[square] for squares in self.piece_squares.values() for square in squares}
     
     def get_kings(self) -> dict[TeamType, tuple[int, int]]:
-        result_dict : dict[TeamType, tuple[int, int]] = {}
-        for y in range(8):
-            for x in range(8):
-                current : PieceType = self.board[y][x]
-                if current == PieceType.WHITE_KING:
-                    result_dict[TeamType.WHITE] = (x + 1, y + 1)
-                elif current == PieceType.BLACK_KING:
-                    result_dict[TeamType.BLACK] = (x + 1, y + 1)
+        return {team : square_coords(self.king_squares[team]) for team in TeamType if self.king_squares[team] >= 0}
+
+    def perft(self, depth : int) -> int:
+        if depth <= 0: return 1
+        moves : list[PackedMove] = list(self.generate_legal_moves())
+        if depth == 1: return len(moves)
+        nodes : int = 0
+        for move in moves:
+            self.push(move)
+            nodes += self.perft(depth - 1)
+            self.pop()
+        return nodes
+
+    def perft_divide(self, depth : int) -> dict[str, int]:
+        result_dict : dict[str, int] = {}
+        for move in list(self.generate_legal_moves()):
+            self.push(move)
+            result_dict[move_to_string(move)] = self.perft(depth - 1)
+            self.pop()
         return result_dict
 
+    def move_to_san(self, move : PackedMove) -> str:
+        '''Standard algebraic notation of a legal move in the current position, e.g. Nbd7, exd6, e8=Q+ or O-O.'''
+        start, end, flags = move & 63, (move >> 6) & 63, move >> 12
+        if flags == MOVE_KING_CASTLE:
+            text : str = 'O-O'
+        elif flags == MOVE_QUEEN_CASTLE:
+            text : str = 'O-O-O'
+        else:
+            piece : PieceType = self.mailbox[start]
+            capture : str = 'x' if flags & MOVE_CAPTURE else ''
+            target : str = number_to_string_coord(*square_coords(end))
+            if piece == TEAM_PIECES[PIECE_TEAMS[piece]][0]:
+                text : str = ('abcdefgh'[start % 8] + capture if capture else '') + target
+                promotion : PieceType = move_promotion(move)
+                if promotion != PieceType.EMPTY: text += '=' + PROMOTION_LETTERS[promotion].upper()
+            else:
+                rivals : list[int] = [move_start(other) for other in self.generate_legal_moves()
+                                      if other != move and move_end(other) == end and self.mailbox[move_start(other)] == piece]
+                disambiguation : str = ''
+                if rivals:
+                    if all(rival % 8 != start % 8 for rival in rivals):
+                        disambiguation = 'abcdefgh'[start % 8]
+                    elif all(rival // 8 != start // 8 for rival in rivals):
+                        disambiguation = str(start // 8 + 1)
+                    else:
+                        disambiguation = number_to_string_coord(*square_coords(start))
+                text : str = PIECE_FEN_LETTERS[piece].upper() + disambiguation + capture + target
+        self.push(move)
+        if self.is_check():
+            text += '+' if self.has_legal_move() else '#'
+        self.pop()
+        return text
+
 def number_to_string_coord(x : int, y : int):
     return 'abcdefgh'[x-1] + f'{y}' if (1 <= x <= 8) and (type(x) == int) else '??'
 
+PROMOTION_LETTERS : dict[PieceType, str] = {PieceType.EMPTY : '',
+    PieceType.WHITE_QUEEN : 'q', PieceType.WHITE_ROOK : 'r', PieceType.WHITE_BISHOP : 'b', PieceType.WHITE_KNIGHT : 'n',
+    PieceType.BLACK_QUEEN : 'q', PieceType.BLACK_ROOK : 'r', PieceType.BLACK_BISHOP : 'b', PieceType.BLACK_KNIGHT : 'n'}
 
-def encode_move(move : ChessMove) -> bytes:
-    start_pos : tuple[int, int] = move['start_pos']
-    end_pos : tuple[int, int] = move['end_pos']
-    extra_info : ChessMoveExtraInfo = move['extra_info']
-    move_data : bytes = bytes([start_pos[0] + 96, start_pos[1] + 96, end_pos[0] + 96, end_pos[1] + 96])
-    return move_data
+def read_epd(path : str) -> Iterator[tuple[ChessGame, dict[str, str]]]:
+    with open(path, 'r') as epd_file:
+        for line in epd_file:
+            line = line.strip()
+            if not line or line.startswith('#'): continue
+            position, _, operation_text = line.partition(';')
+            fields : list[str] = position.split()
+            #EPD has no move clocks, but files written from full FENs often keep them
+            clock_fields : list[str] = []
+            for field in fields[4:6]:
+                if not field.isdigit(): break
+                clock_fields.append(field)
+            operation_fields : str = ' '.join(fields[4 + len(clock_fields):])
+            operations : dict[str, str] = {}
+            for operation in [operation_fields] + operation_text.split(';'):
+                opcode, _, operand = operation.strip().partition(' ')
+                if opcode: operations[opcode] = operand.strip().strip('"')
+            yield ChessGame.from_fen(' '.join(fields[:4] + clock_fields)), operations
 
-def decode_move(move_data : bytes) -> ChessMove:
-    start_x, start_y = move_data[0] - 96, move_data[1] - 96
-    end_x, end_y = move_data[2] - 96, move_data[3] - 96
+def move_to_string(move : PackedMove) -> str:
+    return number_to_string_coord(*square_coords(move & 63)) + number_to_string_coord(*square_coords((move >> 6) & 63)) + PROMOTION_LETTERS[move_promotion(move)]
 
-    start_pos : tuple[int, int] = (start_x, start_y)
-    end_pos : tuple[int, int] = (end_x, end_y)
-    move : ChessMove = {'start_pos' : start_pos, "end_pos" : end_pos, 'extra_info' : {}}
-    return move
\ No newline at end of file
+def unpack_move(move : PackedMove) -> ChessMove:
+    promotion : PieceType = move_promotion(move)
+    return ChessMove.new(square_coords(move & 63), square_coords((move >> 6) & 63), {'promotion_choice' : promotion} if promotion else {})
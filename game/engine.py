@@ -0,0 +1,229 @@
+from time import perf_counter
+from typing import Any, Callable
+from game.chess_module import ChessGame, TeamType, PackedMove, MOVE_CAPTURE, MOVE_PROMOTION, move_to_string
+from game.move_ordering import MoveOrderer
+from game.bitbase import Bitbases, DRAW, BITBASE_PIECES
+from game.transposition import TranspositionTable, TTEntry, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER
+
+MATE_SCORE : int = 100000
+MATE_THRESHOLD : int = MATE_SCORE - 1000
+INFINITY : int = MATE_SCORE + 1
+MAX_DEPTH : int = 64
+#score of a bitbase win, the evaluation is added on top so the search still makes progress towards mate
+KNOWN_WIN_SCORE : int = 10000
+
+def score_to_tt(score : int, ply : int) -> int:
+    #mate scores are stored relative to the node, not the root
+    if score >= MATE_THRESHOLD: return score + ply
+    if score <= -MATE_THRESHOLD: return score - ply
+    return score
+
+def score_from_tt(score : int, ply : int) -> int:
+    if score >= MATE_THRESHOLD: return score - ply
+    if score <= -MATE_THRESHOLD: return score + ply
+    return score
+
+def evaluate(game : ChessGame) -> int:
+    score : int = game.evaluate()
+    return score if game.current_turn == TeamType.WHITE else -score
+
+class SearchStopped(Exception):
+    pass
+
+class SearchLimits:
+    def __init__(self, depth : int|None = None, nodes : int|None = None, movetime : float|None = None):
+        '''movetime is in seconds. With no limits at all the search runs to MAX_DEPTH.'''
+        self.depth : int = min(depth or MAX_DEPTH, MAX_DEPTH)
+        self.nodes : int|None = nodes
+        self.movetime : float|None = movetime
+
+class SearchResult:
+    def __init__(self, best_move : PackedMove|None, score : int, depth : int, nodes : int, elapsed : float, pv : list[PackedMove]):
+        self.best_move : PackedMove|None = best_move
+        self.score : int = score
+        self.depth : int = depth
+        self.nodes : int = nodes
+        self.elapsed : float = elapsed
+        self.pv : list[PackedMove] = pv
+
+    @property
+    def nps(self) -> float:
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self) -> str:
+        best_move : str = move_to_string(self.best_move) if self.best_move is not None else 'none'
+        return f'SearchResult(best_move={best_move}, score={self.score}, depth={self.depth}, nodes={self.nodes}, nps={self.nps:.0f})'
+
+class Engine:
+    CHECK_INTERVAL : int = 1024
+
+    def __init__(self, hash_mb : float = 16, tt : TranspositionTable|None = None, bitbases : Bitbases|None = None):
+        self.bitbases : Bitbases|None = bitbases
+        self.tt : TranspositionTable = tt if tt is not None else TranspositionTable(hash_mb)
+        self.ordering : MoveOrderer = MoveOrderer(MAX_DEPTH)
+        self.nodes : int = 0
+        self.stopped : bool = False
+        self.limits : SearchLimits = SearchLimits()
+        self.start_time : float = 0
+        self.pv_table : list[list[PackedMove]] = [[] for _ in range(MAX_DEPTH + 1)]
+        self.info_callback : Callable[[SearchResult], None]|None = None
+        #anything with an is_set() method, e.g. a threading.Event; lets another thread or process stop the search
+        self.stop_event : Any = None
+
+    def stop(self):
+        self.stopped = True
+
+    def search(self, game : ChessGame, limits : SearchLimits|None = None,
+               info_callback : Callable[[SearchResult], None]|None = None, depth_offset : int = 0) -> SearchResult:
+        '''Iterative deepening negamax. info_callback receives a SearchResult after every completed depth.
+        depth_offset skips the first iterations, which is how lazy SMP helpers spread out over depths.'''
+        self.limits = limits or SearchLimits()
+        self.info_callback = info_callback
+        self.nodes = 0
+        self.stopped = False
+        self.start_time = perf_counter()
+        self.tt.new_search()
+        self.ordering.new_search()
+        root_moves : list[PackedMove] = list(game.generate_legal_moves())
+        result : SearchResult = SearchResult(root_moves[0] if root_moves else None, 0, 0, 0, 0, root_moves[:1])
+        if len(root_moves) <= 1:
+            result.elapsed = perf_counter() - self.start_time
+            return result
+        for depth in range(min(1 + depth_offset, self.limits.depth), self.limits.depth + 1):
+            try:
+                score : int = self.search_root(game, root_moves, depth)
+            except SearchStopped:
+                break
+            self.tt.store(game.zobrist_key, self.pv_table[0][0], score_to_tt(score, 0), depth, BOUND_EXACT)
+            pv : list[PackedMove] = self.extend_pv(game, self.pv_table[0])
+            result = SearchResult(pv[0], score, depth, self.nodes, perf_counter() - self.start_time, pv)
+            root_moves.remove(pv[0])
+            root_moves.insert(0, pv[0])
+            if self.info_callback: self.info_callback(result)
+            if abs(score) >= MATE_THRESHOLD: break
+            if self.limits.movetime is not None and result.elapsed >= self.limits.movetime * 0.5: break
+        result.nodes = self.nodes
+        result.elapsed = perf_counter() - self.start_time
+        return result
+
+    def extend_pv(self, game : ChessGame, pv : list[PackedMove]) -> list[PackedMove]:
+        '''The principal variation stops wherever a transposition table cutoff returned early,
+        so it is continued with the hash moves of the positions after it, as long as they are legal and do not repeat.'''
+        pv = pv[:]
+        seen_keys : set[int] = set()
+        for move in pv:
+            game.push(move)
+        while len(pv) < MAX_DEPTH and game.zobrist_key not in seen_keys:
+            entry : TTEntry|None = self.tt.probe(game.zobrist_key)
+            if entry is None or not entry.move or entry.move not in game.generate_legal_moves(): break
+            seen_keys.add(game.zobrist_key)
+            game.push(entry.move)
+            pv.append(entry.move)
+        for _ in pv:
+            game.pop()
+        return pv
+
+    def search_root(self, game : ChessGame, root_moves : list[PackedMove], depth : int) -> int:
+        alpha : int = -INFINITY
+        beta : int = INFINITY
+        self.pv_table[0] = []
+        for move in root_moves:
+            game.push(move)
+            try:
+                score : int = -self.negamax(game, depth - 1, -beta, -alpha, 1)
+            finally:
+                game.pop()
+            if score > alpha:
+                alpha = score
+                self.pv_table[0] = [move] + self.pv_table[1]
+        return alpha
+
+    def negamax(self, game : ChessGame, depth : int, alpha : int, beta : int, ply : int) -> int:
+        self.pv_table[ply] = []
+        if depth <= 0: return self.quiescence(game, alpha, beta, ply)
+        self.nodes += 1
+        if self.nodes % Engine.CHECK_INTERVAL == 0 or self.nodes == self.limits.nodes: self.check_limits()
+        if game.halfmove_clock >= 100 or game.position_counts.get(game.zobrist_key, 0) >= 2:
+            return 0
+        if ply >= MAX_DEPTH: return evaluate(game)
+        #counting the pieces first keeps the probe call off every node with more material than the bitbases cover
+        if self.bitbases is not None and game.occupied.bit_count() == BITBASE_PIECES:
+            bitbase_result : int|None = self.bitbases.probe(game)
+            if bitbase_result == DRAW: return 0
+            if bitbase_result is not None: return bitbase_result * KNOWN_WIN_SCORE + evaluate(game)
+        key : int = game.zobrist_key
+        entry : TTEntry|None = self.tt.probe(key)
+        hash_move : PackedMove = entry.move if entry is not None else 0
+        if entry is not None and entry.depth >= depth:
+            score : int = score_from_tt(entry.score, ply)
+            if entry.bound == BOUND_EXACT: return score
+            if entry.bound == BOUND_LOWER and score >= beta: return score
+            if entry.bound == BOUND_UPPER and score <= alpha: return score
+        original_alpha : int = alpha
+        best_move : PackedMove = 0
+        in_check : bool = game.is_check()
+        if in_check: depth += 1
+        moves : list[PackedMove] = self.ordering.order(game, list(game.generate_legal_moves()), ply, hash_move)
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+        for index, move in enumerate(moves):
+            game.push(move)
+            try:
+                score : int = -self.negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                game.pop()
+            if score >= beta:
+                self.ordering.record_cutoff(game, move, ply, depth, index)
+                self.tt.store(key, move, score_to_tt(beta, ply), depth, BOUND_LOWER)
+                return beta
+            if score > alpha:
+                alpha = score
+                best_move = move
+                self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+        self.tt.store(key, best_move, score_to_tt(alpha, ply), depth, BOUND_EXACT if alpha > original_alpha else BOUND_UPPER)
+        return alpha
+
+    def quiescence(self, game : ChessGame, alpha : int, beta : int, ply : int) -> int:
+        '''Searches captures and queen promotions that do not lose material by SEE until the position is quiet.
+        In check every evasion is searched instead, since standing pat is not an option.'''
+        self.nodes += 1
+        if self.nodes % Engine.CHECK_INTERVAL == 0 or self.nodes == self.limits.nodes: self.check_limits()
+        if ply >= MAX_DEPTH: return evaluate(game)
+        in_check : bool = game.is_check()
+        if in_check:
+            moves : list[PackedMove] = list(game.generate_legal_moves())
+            if not moves: return -MATE_SCORE + ply
+        else:
+            stand_pat : int = evaluate(game)
+            if stand_pat >= beta: return beta
+            if stand_pat > alpha: alpha = stand_pat
+            moves = []
+            for move in game.generate_pseudo_legal_moves():
+                flags : int = move >> 12
+                if flags & MOVE_PROMOTION:
+                    if flags & 3 != 3: continue
+                elif not flags & MOVE_CAPTURE: continue
+                if game.see_square(move & 63, (move >> 6) & 63) < 0: continue
+                moves.append(move)
+        mover : TeamType = game.current_turn
+        for move in self.ordering.order(game, moves, ply):
+            game.push(move)
+            try:
+                if not in_check and game.is_check(mover): continue
+                score : int = -self.quiescence(game, -beta, -alpha, ply + 1)
+            finally:
+                game.pop()
+            if score >= beta: return beta
+            if score > alpha: alpha = score
+        return alpha
+
+    def check_limits(self):
+        if self.stopped or (self.stop_event is not None and self.stop_event.is_set()):
+            self.stopped = True
+            raise SearchStopped()
+        if self.limits.nodes is not None and self.nodes >= self.limits.nodes:
+            self.stopped = True
+            raise SearchStopped()
+        if self.limits.movetime is not None and perf_counter() - self.start_time >= self.limits.movetime:
+            self.stopped = True
+            raise SearchStopped()
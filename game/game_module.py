@@ -39,6 +39,8 @@ class Game:
         self.make_connections()
         if event.mode == 'local_pvp':
             self.state = self.STATES.PVPGameState(self)
+        elif event.mode == 'cpu':
+            self.state = self.STATES.PvsCPUGameState(self)
         else:
             self.state = self.STATES.WaitingForOnlineGameState(self)
             await self.state.make_network()
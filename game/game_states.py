@@ -4,6 +4,11 @@ from math import floor
 from random import shuffle, choice
 import random
 import game.chess_module
+import game.engine
+import game.search_worker
+import game.opening_book
+import online.protocol
+from online.protocol import Opcode, MessageDispatcher
 import game.sprite
 import utils.tween_module as TweenModule
 from utils.ui.ui_sprite import UiSprite
@@ -78,6 +83,8 @@ class ChessBaseGameState(NormalGameState):
         self.game = game_object
         self.board : ChessBoard = ChessBoard.spawn()
         self.held_piece : ChessPiece|None = None
+        self.legal_moves : set[tuple[tuple[int, int], tuple[int, int]]]|None = None
+        self.make_material_display()
         self.do_connections()
     
     def main_logic(self, delta : float):
@@ -99,9 +106,33 @@ class ChessBaseGameState(NormalGameState):
             return False
         return True
     
+    def get_legal_moves(self) -> set[tuple[tuple[int, int], tuple[int, int]]]:
+        if self.legal_moves is None:
+            square_coords = game.chess_module.square_coords
+            self.legal_moves = {(square_coords(game.chess_module.move_start(move)), square_coords(game.chess_module.move_end(move))) 
+                                for move in self.board.game.generate_legal_moves()}
+        return self.legal_moves
+    
+    def make_material_display(self):
+        material_text = TextSprite(pygame.Vector2(15, 15), 'topleft', 0, self.get_material_text(), 'material_text', None, None, 0,
+                                   (self.game.font_40, 'White', False), ('Black', 2), colorkey=(0, 255, 0))
+        core_object.main_ui.add(material_text)
+    
+    def update_material_display(self):
+        material_text : TextSprite|None = core_object.main_ui.get_sprite('material_text')
+        if material_text: material_text.text = self.get_material_text()
+    
+    def get_material_text(self) -> str:
+        #piece_counts is kept up to date by ChessGame, so this costs nothing per move
+        white_material : int = self.board.game.get_material(game.chess_module.TeamType.WHITE) // 100
+        black_material : int = self.board.game.get_material(game.chess_module.TeamType.BLACK) // 100
+        return f'Material {white_material} - {black_material}'
+
     def sync_move(self, start_pos : tuple[int, int], end_pos : tuple[int, int], bonus_info : game.chess_module.ChessMoveExtraInfo):
         extra_instructions = self.board.game.make_move(start_pos, end_pos, bonus_info)
         if extra_instructions is False: return
+        self.legal_moves = None
+        self.update_material_display()
         piece : ChessPiece|None = self.board.get_at_board_coords(start_pos)
         piece.settle_on_board(self.board.board_to_visual_coords(*end_pos, self.board.display_style))
         for instruction in extra_instructions:
@@ -134,6 +165,8 @@ class ChessBaseGameState(NormalGameState):
             self.switch_to_gameover("Stalemate!")
         elif instruction_type == 'insufficent_material':
             self.switch_to_gameover("Draw!")
+        elif instruction_type == 'threefold_repetition':
+            self.switch_to_gameover("Draw by repetition!")
     
     def handle_piece_release(self, event : pygame.Event):
         piece : ChessPiece = event.piece
@@ -151,7 +184,7 @@ class ChessBaseGameState(NormalGameState):
             piece.zindex = 0
             self.held_piece = None
             return
-        if not self.board.game.validate_move(old_board_coords, new_board_coords, {}):
+        if (old_board_coords, new_board_coords) not in self.get_legal_moves():
             self.game.alert_player('Illegal Move!', 1.8)
             piece.settle_on_board()
             piece.zindex = 0
@@ -164,6 +197,8 @@ class ChessBaseGameState(NormalGameState):
             piece.zindex = 0
             self.held_piece = None
             return
+        self.legal_moves = None
+        self.update_material_display()
         piece.settle_on_board(new_visual_coords)
         self.held_piece = None
         piece.zindex = 0
@@ -204,15 +239,74 @@ class PVPGameState(ChessBaseGameState):
 
 
 class PvsCPUGameState(ChessBaseGameState):
-    def __init__(self, game_object : 'Game'):
+    CPU_LIMITS : game.engine.SearchLimits = game.engine.SearchLimits(depth=5, movetime=2)
+    CPU_WORKERS : int = 1
+    CPU_BOOK_PATH : str|None = 'assets/books/book.bin'
+
+    def __init__(self, game_object : 'Game', cpu_team : game.chess_module.TeamType = game.chess_module.TeamType.BLACK):
         super().__init__(game_object)
+        self.cpu_team : game.chess_module.TeamType = cpu_team
+        self.search_worker : game.search_worker.SearchWorker = game.search_worker.SearchWorker(self.CPU_WORKERS)
+        self.cpu_task : game.search_worker.SearchTask|None = None
+        self.opening_book : game.opening_book.OpeningBook|None = game.opening_book.OpeningBook.open_if_exists(self.CPU_BOOK_PATH)
+        self.cpu_move_pending : bool = self.board.game.current_turn == self.cpu_team
 
     def main_logic(self, delta : float):
         super().main_logic(delta)
-        pass
+        if self.cpu_move_pending:
+            self.cpu_move_pending = False
+            book_move : game.chess_module.PackedMove|None = None
+            if self.opening_book: book_move = self.opening_book.weighted_choice(self.board.game)
+            if book_move is not None:
+                core_object.set_debug_message(f'CPU book move {game.chess_module.move_to_string(book_move)}')
+                self.play_cpu_move(book_move)
+            else:
+                self.cpu_task = self.search_worker.search(self.board.game.copy(), self.CPU_LIMITS)
+        if self.cpu_task is not None:
+            self.check_cpu_task()
+    
+    def is_piece_grabbable(self, piece : 'ChessPiece') -> bool:
+        if game.chess_module.ChessGame.get_piece_color(piece.type) == self.cpu_team:
+            return False
+        return super().is_piece_grabbable(piece)
+    
+    def after_move_made(self, start_pos : tuple[int, int], end_pos : tuple[int, int], bonus_info : game.chess_module.ChessMoveExtraInfo):
+        if self.game.state is not self: return
+        #wait a frame so the player's move is drawn before the engine starts thinking
+        self.cpu_move_pending = True
+    
+    def check_cpu_task(self):
+        progress : game.engine.SearchResult|None = self.cpu_task.poll()
+        if progress is not None and progress.best_move is not None:
+            core_object.set_debug_message(f'CPU thinking: depth {progress.depth}, best {game.chess_module.move_to_string(progress.best_move)}')
+        if not self.cpu_task.done(): return
+        result : game.engine.SearchResult = self.cpu_task.result()
+        self.cpu_task = None
+        self.make_cpu_move(result)
+    
+    def make_cpu_move(self, result : game.engine.SearchResult):
+        core_object.set_debug_message(f'CPU depth {result.depth}, {result.nodes} nodes in {result.elapsed:.2f}s ({result.nps:.0f} nodes/s)')
+        if result.best_move is None: return
+        self.play_cpu_move(result.best_move)
+    
+    def play_cpu_move(self, packed_move : game.chess_module.PackedMove):
+        move : game.chess_module.ChessMove = game.chess_module.unpack_move(packed_move)
+        self.sync_move(move['start_pos'], move['end_pos'], move['extra_info'])
+
+    def stop_cpu(self):
+        if self.cpu_task is not None: self.cpu_task.cancel()
+        self.cpu_task = None
+        self.search_worker.shutdown()
+        if self.opening_book: self.opening_book.close()
+        self.opening_book = None
+    
+    def switch_to_gameover(self, message : str):
+        self.stop_cpu()
+        super().switch_to_gameover(message)
 
     def cleanup(self):
         super().cleanup()
+        self.stop_cpu()
 
 class WaitingForOnlineGameState(NormalGameState):
     def __init__(self, game_object : 'Game'):
@@ -224,6 +318,9 @@ class WaitingForOnlineGameState(NormalGameState):
 
         self.server_ready_delay : Timer = Timer(-1)
         self.local_team : game.chess_module.TeamType|None = None
+        self.message_dispatcher : MessageDispatcher = MessageDispatcher()
+        self.message_dispatcher.register(Opcode.GAME_STARTING, self.on_game_starting)
+        self.message_dispatcher.register(Opcode.CONNECTION_ESTABLISHED, self.on_connection_established)
     
     async def make_network(self):
         self.network_client = NetworkClient(None, 'localhost')
@@ -243,12 +340,7 @@ class WaitingForOnlineGameState(NormalGameState):
                 data : bytes = event.data
                 print(f'Recieved data : {data}')
                 core_object.set_debug_message(f'Recieved data : {data}')
-                if data.startswith(b'GameStarting'):
-                    self.local_team = game.chess_module.TeamType.WHITE if data.removeprefix(b'GameStarting') == b'W' else game.chess_module.TeamType.BLACK
-                    self.server_ready_delay.set_duration(1.5)
-                    self.game.alert_player('Match Found!')
-                elif data.startswith(b'ConnectionEstablished'):
-                    self.game.alert_player('Connected to server!')
+                self.message_dispatcher.dispatch(data)
             case NetworkClient.NETWORK_MESSAGE_FAILED:
                 data : bytes = event.data
                 progress : int = event.progress
@@ -263,6 +355,14 @@ class WaitingForOnlineGameState(NormalGameState):
                 self.game.fire_gameover_event()
                 core_object.menu.alert_player('Server was disconnected!')
     
+    def on_game_starting(self, local_team : game.chess_module.TeamType):
+        self.local_team = local_team
+        self.server_ready_delay.set_duration(1.5)
+        self.game.alert_player('Match Found!')
+
+    def on_connection_established(self):
+        self.game.alert_player('Connected to server!')
+
     def start_online_game(self, local_team : game.chess_module.TeamType):
         self.game.state = OnlinePvPGameState(self.game, self.network_client, local_team)
         self.remove_network_connections()
@@ -288,7 +388,7 @@ class WaitingForOnlineGameState(NormalGameState):
     
     def cleanup(self):
         super().cleanup()
-        self.network_client.send_message(b'Disconnecting')
+        self.network_client.send_message(online.protocol.encode_message(Opcode.DISCONNECTING))
         core_object.task_scheduler.schedule_continuous_task(0.5, self.network_client.update)
         core_object.task_scheduler.schedule_task(1, self.network_client.close)
         core_object.task_scheduler.schedule_task(2, self.network_client.cleanup)
@@ -309,6 +409,8 @@ class OnlinePvPGameState(ChessBaseGameState):
                                                    if local_team == game.chess_module.TeamType.WHITE 
                                                    else BoardDisplayStyle.BLACK_STANDARD)
         self.held_piece : ChessPiece|None = None
+        self.legal_moves : set[tuple[tuple[int, int], tuple[int, int]]]|None = None
+        self.make_material_display()
         game.chess_sprites.do_connections()
         core_object.event_manager.bind(ChessPiece.PIECE_RELEASED, self.handle_piece_release)
 
@@ -323,6 +425,10 @@ class OnlinePvPGameState(ChessBaseGameState):
         self.can_make_move : bool = True
         self.dc_timer : Timer|None = None
         self.current_outcome : str|None = None
+        self.message_dispatcher : MessageDispatcher = MessageDispatcher()
+        self.message_dispatcher.register(Opcode.GAME_OVER, self.on_game_over)
+        self.message_dispatcher.register(Opcode.OPPONENT_MOVE, self.on_opponent_move)
+        self.message_dispatcher.register(Opcode.MADE_INVALID_MOVE, self.on_invalid_move)
 
     def switch_to_gameover(self, message : str, flag = False):
         if not flag: 
@@ -359,22 +465,21 @@ class OnlinePvPGameState(ChessBaseGameState):
                 core_object.menu.alert_player('Server was disconnected!')
     
     def handle_network_message(self, message : bytes):
-        if message.startswith(b'GameOver'):
-            outcome : bytes = message.removeprefix(b'GameOver')
-            self.switch_to_gameover(outcome.decode(), flag=True)
-    
-        if message.startswith(b'OpponentMove'):
-            move_chosen : game.chess_module.ChessMove = game.chess_module.decode_move(message.removeprefix(b'OpponentMove'))
-            self.sync_move(move_chosen['start_pos'], move_chosen['end_pos'], move_chosen['extra_info'])
-        
-        if message.startswith(b'MadeInvalidMove'):
-            self.switch_to_gameover('Something went wrong in move validation!', flag=True)
+        self.message_dispatcher.dispatch(message)
+
+    def on_game_over(self, outcome : str):
+        self.switch_to_gameover(outcome, flag=True)
+
+    def on_opponent_move(self, move_chosen : game.chess_module.ChessMove):
+        self.sync_move(move_chosen['start_pos'], move_chosen['end_pos'], move_chosen['extra_info'])
+
+    def on_invalid_move(self):
+        self.switch_to_gameover('Something went wrong in move validation!', flag=True)
     
     
     def after_move_made(self, start_pos : tuple[int, int], end_pos : tuple[int, int], bonus_info : game.chess_module.ChessMoveExtraInfo):
-        move_data : bytes = game.chess_module.encode_move(game.chess_module.ChessMove.new(start_pos, end_pos, bonus_info))
-        netowrk_message : bytes = b'TryMove' + move_data
-        self.network_client.send_message(netowrk_message)
+        move : game.chess_module.ChessMove = game.chess_module.ChessMove.new(start_pos, end_pos, bonus_info)
+        self.network_client.send_message(online.protocol.encode_message(Opcode.TRY_MOVE, move))
     
     def make_network_connections(self):
         core_object.event_manager.bind(NetworkClient.NETWORK_MESSAGE_RECIVED, self.handle_network_event)
@@ -400,7 +505,7 @@ class OnlinePvPGameState(ChessBaseGameState):
 
     def cleanup(self):
         super().cleanup()
-        self.network_client.send_message(b'Disconnecting')
+        self.network_client.send_message(online.protocol.encode_message(Opcode.DISCONNECTING))
         core_object.task_scheduler.schedule_task(1, self.network_client.close)
         core_object.task_scheduler.schedule_task(2, self.network_client.cleanup)
         self.remove_network_connections()
@@ -0,0 +1,123 @@
+import argparse
+import sys
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from queue import Empty
+from time import perf_counter
+from typing import Any, Callable
+from game.chess_module import ChessGame, STARTING_FEN
+from game.engine import Engine, SearchLimits, SearchResult
+from game.transposition import TranspositionTable, AGE_MASK
+from game.bitbase import load_bitbases
+
+#state of a helper process, set once by init_smp_worker
+smp_engine : Engine|None = None
+smp_stop_id : Any = None
+smp_progress : Any = None
+
+def init_smp_worker(shared_memory : SharedMemory, hash_mb : float, stop_id : Any, progress_queue : Any):
+    global smp_engine, smp_stop_id, smp_progress
+    smp_engine = Engine(tt=TranspositionTable(hash_mb, shared_memory.buf), bitbases=load_bitbases())
+    smp_stop_id = stop_id
+    smp_progress = progress_queue
+
+class StopWatcher:
+    def __init__(self, search_id : int):
+        self.search_id : int = search_id
+
+    def is_set(self) -> bool:
+        return smp_stop_id.value >= self.search_id
+
+def run_smp_search(search_id : int, worker_index : int, game : ChessGame, limits : SearchLimits, age : int) -> SearchResult:
+    #search() moves the table to the next age, every worker has to land on the same one
+    smp_engine.tt.age = (age - 1) & AGE_MASK
+    smp_engine.stop_event = StopWatcher(search_id)
+    report : Callable[[SearchResult], None]|None = None
+    if worker_index == 0:
+        report = lambda result : smp_progress.put((search_id, result))
+    return smp_engine.search(game, limits, report, depth_offset=worker_index % 2)
+
+class LazySMP:
+    '''Lazy SMP: every worker process searches the same root, odd workers one ply ahead, and they cooperate
+    only through a transposition table in shared memory. The result of the first worker is used unless a
+    helper completed a deeper iteration. Has the same search()/stop_event interface as Engine.'''
+    POLL_INTERVAL : float = 0.02
+
+    def __init__(self, workers : int = 2, hash_mb : float = 64):
+        self.workers : int = max(1, workers)
+        #spawned helpers re-import __main__, which is only safe from an entry point behind a __name__ == '__main__' guard
+        #like main() below. main.py has none, so SearchWorker never creates a LazySMP without fork
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        self.shared_memory : SharedMemory = SharedMemory(create=True, size=TranspositionTable.table_bytes(hash_mb))
+        self.tt : TranspositionTable = TranspositionTable(hash_mb, self.shared_memory.buf)
+        self.stop_id : Any = context.Value('q', 0, lock=False)
+        self.progress_queue : Any = context.Queue()
+        self.executor : ProcessPoolExecutor = ProcessPoolExecutor(self.workers, context, init_smp_worker,
+                                                                  (self.shared_memory, hash_mb, self.stop_id, self.progress_queue))
+        self.search_id : int = 0
+        self.stop_event : Any = None
+
+    def search(self, game : ChessGame, limits : SearchLimits|None = None,
+               info_callback : Callable[[SearchResult], None]|None = None) -> SearchResult:
+        limits = limits or SearchLimits()
+        self.search_id += 1
+        self.tt.new_search()
+        futures : list[Future] = [self.executor.submit(run_smp_search, self.search_id, index, game, limits, self.tt.age)
+                                  for index in range(self.workers)]
+        while not futures[0].done():
+            wait(futures[:1], self.POLL_INTERVAL)
+            self.drain_progress(info_callback)
+            if self.stop_event is not None and self.stop_event.is_set(): self.stop()
+        self.stop()
+        wait(futures)
+        self.drain_progress(info_callback)
+        results : list[SearchResult] = [future.result() for future in futures]
+        best : SearchResult = results[0]
+        for result in results[1:]:
+            if result.depth > best.depth and result.best_move is not None: best = result
+        best.nodes = sum(result.nodes for result in results)
+        best.elapsed = max(result.elapsed for result in results)
+        return best
+
+    def drain_progress(self, info_callback : Callable[[SearchResult], None]|None):
+        while True:
+            try:
+                search_id, result = self.progress_queue.get_nowait()
+            except Empty:
+                return
+            if search_id == self.search_id and info_callback: info_callback(result)
+
+    def stop(self):
+        self.stop_id.value = self.search_id
+
+    def close(self):
+        self.stop()
+        self.executor.shutdown()
+        self.tt.release()
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+def main(argv : list[str]|None = None) -> int:
+    parser = argparse.ArgumentParser(description='Time to depth of the lazy SMP search for several worker counts')
+    parser.add_argument('fen', nargs='?', default=STARTING_FEN)
+    parser.add_argument('-d', '--depth', type=int, default=5)
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--hash', type=float, default=64, help='transposition table size in MB')
+    args = parser.parse_args(argv)
+    game : ChessGame = ChessGame.from_fen(args.fen)
+    base_time : float|None = None
+    for workers in args.workers:
+        searcher : LazySMP = LazySMP(workers, args.hash)
+        try:
+            start_time : float = perf_counter()
+            result : SearchResult = searcher.search(game, SearchLimits(depth=args.depth))
+            elapsed : float = perf_counter() - start_time
+        finally:
+            searcher.close()
+        base_time = base_time or elapsed
+        print(f'{workers} workers: {result} in {elapsed:.3f}s, speedup {base_time / elapsed:.2f}x')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+from game.chess_module import ChessGame, PieceType, PackedMove, MOVE_CAPTURE, MOVE_EN_PASSANT, MOVE_PROMOTION
+
+#ordering rank of each piece kind; the king only ever shows up as an attacker
+PIECE_RANKS : dict[str, int] = {'pawn' : 1, 'knight' : 2, 'bishop' : 3, 'rook' : 4, 'queen' : 5, 'king' : 6}
+
+def make_mvv_lva_table() -> list[list[int]]:
+    #MVV_LVA[victim][attacker], most valuable victim first and least valuable attacker breaking ties
+    ranks : list[int] = [0] + [PIECE_RANKS[piece.name.split('_')[1].lower()] for piece in list(PieceType)[1:]]
+    return [[ranks[victim] * 8 - ranks[attacker] for attacker in range(13)] for victim in range(13)]
+
+MVV_LVA : list[list[int]] = make_mvv_lva_table()
+
+HASH_MOVE_SCORE : int = 1 << 30
+CAPTURE_SCORE : int = 1 << 28
+PROMOTION_SCORE : int = 1 << 27
+KILLER_SCORES : tuple[int, int] = (1 << 26, (1 << 26) - 1)
+HISTORY_LIMIT : int = 1 << 20
+
+class MoveOrderer:
+    '''Orders moves as hash move, captures by MVV-LVA, promotions, the two killers of the ply, then quiet moves by history.'''
+    def __init__(self, max_ply : int = 64):
+        self.killers : list[list[PackedMove]] = [[0, 0] for _ in range(max_ply + 1)]
+        #butterfly table, indexed by side * 4096 + start * 64 + end
+        self.history : list[int] = [0] * (2 * 64 * 64)
+        self.cutoffs : int = 0
+        self.first_move_cutoffs : int = 0
+        self.cutoff_index_total : int = 0
+
+    def clear(self):
+        self.killers = [[0, 0] for _ in range(len(self.killers))]
+        self.history = [0] * len(self.history)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.cutoff_index_total = 0
+
+    def new_search(self):
+        #keep the killers and history from the last search, but let new information outweigh them
+        self.history = [value // 8 for value in self.history]
+        self.reset_stats()
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def average_cutoff_index(self) -> float:
+        return self.cutoff_index_total / self.cutoffs if self.cutoffs else 0.0
+
+    def order(self, game : ChessGame, moves : list[PackedMove], ply : int, hash_move : PackedMove = 0) -> list[PackedMove]:
+        mailbox : list[PieceType] = game.mailbox
+        killer_1, killer_2 = self.killers[ply]
+        history : list[int] = self.history
+        side_offset : int = game.current_turn * 4096
+        def move_score(move : PackedMove) -> int:
+            if move == hash_move: return HASH_MOVE_SCORE
+            flags : int = move >> 12
+            if flags & MOVE_CAPTURE:
+                victim : int = PieceType.WHITE_PAWN if flags == MOVE_EN_PASSANT else mailbox[(move >> 6) & 63]
+                return CAPTURE_SCORE + MVV_LVA[victim][mailbox[move & 63]] + (flags & 3 if flags & MOVE_PROMOTION else 0)
+            if flags & MOVE_PROMOTION: return PROMOTION_SCORE + (flags & 3)
+            if move == killer_1: return KILLER_SCORES[0]
+            if move == killer_2: return KILLER_SCORES[1]
+            return history[side_offset + (move & 4095)]
+        moves.sort(key=move_score, reverse=True)
+        return moves
+
+    def record_cutoff(self, game : ChessGame, move : PackedMove, ply : int, depth : int, move_index : int):
+        self.cutoffs += 1
+        self.cutoff_index_total += move_index
+        if move_index == 0: self.first_move_cutoffs += 1
+        if (move >> 12) & (MOVE_CAPTURE | MOVE_PROMOTION): return
+        killers : list[PackedMove] = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        index : int = game.current_turn * 4096 + (move & 4095)
+        self.history[index] += depth * depth
+        if self.history[index] > HISTORY_LIMIT:
+            self.history = [value // 2 for value in self.history]
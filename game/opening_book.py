@@ -0,0 +1,125 @@
+import mmap
+import os
+import random
+import struct
+from game.chess_module import (ChessGame, PieceType, TeamType, PackedMove, PIECE_TEAMS, TEAM_PIECES, PROMOTION_PIECES,
+                               move_start, move_end, move_promotion, square_index)
+from game.polyglot_random import POLYGLOT_RANDOM
+
+#polyglot numbers pieces black pawn, white pawn, black knight, white knight... up to white king
+POLYGLOT_PIECE_KINDS : list[int] = [-1 for _ in PieceType]
+for _kind, (_white, _black) in enumerate(zip(TEAM_PIECES[TeamType.WHITE], TEAM_PIECES[TeamType.BLACK])):
+    POLYGLOT_PIECE_KINDS[_black] = 2 * _kind
+    POLYGLOT_PIECE_KINDS[_white] = 2 * _kind + 1
+del _kind, _white, _black
+
+POLYGLOT_CASTLING : int = 768
+POLYGLOT_EN_PASSANT : int = 772
+POLYGLOT_TURN : int = 780
+
+#key (8 bytes), move (2), weight (2), learn (4), all big endian
+BOOK_ENTRY : struct.Struct = struct.Struct('>QHHI')
+
+def polyglot_key(game : ChessGame) -> int:
+    '''Zobrist key of the position as defined by the Polyglot book format, which uses its own random numbers.'''
+    key : int = 0
+    mailbox : list[PieceType] = game.mailbox
+    for team_squares in game.piece_squares.values():
+        for square in team_squares:
+            key ^= POLYGLOT_RANDOM[64 * POLYGLOT_PIECE_KINDS[mailbox[square]] + square]
+    white_rights : list[bool] = game.castling_rights[TeamType.WHITE]
+    black_rights : list[bool] = game.castling_rights[TeamType.BLACK]
+    for offset, has_right in enumerate((white_rights[1], white_rights[0], black_rights[1], black_rights[0])):
+        if has_right: key ^= POLYGLOT_RANDOM[POLYGLOT_CASTLING + offset]
+    if game.en_passant is not None:
+        #only hashed when a pawn of the side to move stands next to the pawn that just double pushed
+        pawn_x, pawn_y = game.en_passant[1]
+        pawn : PieceType = TEAM_PIECES[game.current_turn][0]
+        if (pawn_x > 1 and game.get_at(pawn_x - 1, pawn_y) == pawn) or (pawn_x < 8 and game.get_at(pawn_x + 1, pawn_y) == pawn):
+            key ^= POLYGLOT_RANDOM[POLYGLOT_EN_PASSANT + pawn_x - 1]
+    if game.current_turn == TeamType.WHITE:
+        key ^= POLYGLOT_RANDOM[POLYGLOT_TURN]
+    return key
+
+class BookEntry:
+    __slots__ = ('move', 'weight', 'learn')
+    def __init__(self, move : PackedMove, weight : int, learn : int):
+        self.move : PackedMove = move
+        self.weight : int = weight
+        self.learn : int = learn
+
+class OpeningBook:
+    '''Polyglot .bin book. The file is memory mapped and its key-sorted 16 byte entries are binary searched in place,
+    so opening a book of any size costs no memory beyond the mapping.'''
+    def __init__(self, path : str):
+        self.file = open(path, 'rb')
+        self.size : int = os.fstat(self.file.fileno()).st_size
+        self.entry_count : int = self.size // BOOK_ENTRY.size
+        self.mapping : mmap.mmap|None = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    @classmethod
+    def open_if_exists(cls, path : str|None) -> 'OpeningBook|None':
+        if not path or not os.path.isfile(path): return None
+        return cls(path)
+
+    def close(self):
+        if self.mapping is not None: self.mapping.close()
+        self.mapping = None
+        self.file.close()
+
+    def __enter__(self) -> 'OpeningBook':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def first_index(self, key : int) -> int:
+        #lower bound on the key, reading only the 8 key bytes of each probed entry
+        mapping : mmap.mmap = self.mapping
+        low : int = 0
+        high : int = self.entry_count
+        while low < high:
+            middle : int = (low + high) // 2
+            if int.from_bytes(mapping[middle * BOOK_ENTRY.size : middle * BOOK_ENTRY.size + 8], 'big') < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_entries(self, game : ChessGame) -> list[BookEntry]:
+        '''Book moves for the position, already converted to the engine's packed legal moves. Moves that are not legal are skipped.'''
+        if self.mapping is None: return []
+        key : int = polyglot_key(game)
+        legal_moves : list[PackedMove]|None = None
+        entries : list[BookEntry] = []
+        index : int = self.first_index(key)
+        while index < self.entry_count:
+            entry_key, raw_move, weight, learn = BOOK_ENTRY.unpack_from(self.mapping, index * BOOK_ENTRY.size)
+            if entry_key != key: break
+            index += 1
+            if legal_moves is None: legal_moves = list(game.generate_legal_moves())
+            move : PackedMove|None = self.find_move(game, raw_move, legal_moves)
+            if move is not None: entries.append(BookEntry(move, weight, learn))
+        return entries
+
+    @staticmethod
+    def find_move(game : ChessGame, raw_move : int, legal_moves : list[PackedMove]) -> PackedMove|None:
+        end : int = square_index((raw_move & 7) + 1, ((raw_move >> 3) & 7) + 1)
+        start : int = square_index(((raw_move >> 6) & 7) + 1, ((raw_move >> 9) & 7) + 1)
+        promotion_index : int = (raw_move >> 12) & 7
+        moving_piece : PieceType = game.mailbox[start]
+        if moving_piece != PieceType.EMPTY and moving_piece == TEAM_PIECES[PIECE_TEAMS[moving_piece]][5]:
+            #castling is written as the king capturing its own rook
+            end = {(4, 7) : 6, (4, 0) : 2, (60, 63) : 62, (60, 56) : 58}.get((start, end), end)
+        promotion : PieceType = PieceType.EMPTY
+        if promotion_index: promotion = PROMOTION_PIECES[game.current_turn][promotion_index - 1]
+        for move in legal_moves:
+            if move_start(move) == start and move_end(move) == end and move_promotion(move) == promotion:
+                return move
+        return None
+
+    def weighted_choice(self, game : ChessGame, rng : random.Random|None = None) -> PackedMove|None:
+        '''Picks a book move with probability proportional to its weight, or None when the position is not in the book.'''
+        entries : list[BookEntry] = [entry for entry in self.get_entries(game) if entry.weight > 0]
+        if not entries: return None
+        return (rng or random).choices([entry.move for entry in entries], [entry.weight for entry in entries])[0]
@@ -0,0 +1,80 @@
+import argparse
+import sys
+from time import perf_counter
+from game.chess_module import ChessGame, read_epd
+
+#(fen, node counts for depth 1, 2, 3...)
+PERFT_POSITIONS : dict[str, tuple[str, list[int]]] = {
+    'initial' : ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', [20, 400, 8902, 197281, 4865609]),
+    'kiwipete' : ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862, 4085603]),
+    'en_passant' : ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624]),
+    'promotion' : ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467, 422333]),
+    'promotion_check' : ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+}
+
+def run_perft(name : str, game : ChessGame, expected_counts : list[int], max_depth : int, divide : bool = False) -> tuple[bool, int, float]:
+    print(f'{name}: {game.to_fen()}')
+    all_passed : bool = True
+    total_nodes : int = 0
+    total_time : float = 0
+    for depth in range(1, max_depth + 1):
+        start_time : float = perf_counter()
+        if divide and depth == max_depth:
+            divide_result : dict[str, int] = game.perft_divide(depth)
+            for move_string, move_nodes in sorted(divide_result.items()):
+                print(f'    {move_string}: {move_nodes}')
+            nodes : int = sum(divide_result.values())
+        else:
+            nodes : int = game.perft(depth)
+        elapsed : float = perf_counter() - start_time
+        total_nodes += nodes
+        total_time += elapsed
+        expected : int|None = expected_counts[depth - 1] if depth <= len(expected_counts) else None
+        if expected is None:
+            status : str = '??'
+        elif nodes == expected:
+            status : str = 'OK'
+        else:
+            status : str = f'FAIL (expected {expected})'
+            all_passed = False
+        print(f'  depth {depth}: {nodes} nodes in {elapsed:.3f}s ({nodes / max(elapsed, 1e-9):.0f} nodes/s) {status}')
+    return all_passed, total_nodes, total_time
+
+def epd_expected_counts(operations : dict[str, str]) -> list[int]:
+    #perft suites store the expected counts as 'D1 20 ;D2 400 ...'
+    expected_counts : list[int] = []
+    while f'D{len(expected_counts) + 1}' in operations:
+        expected_counts.append(int(operations[f'D{len(expected_counts) + 1}']))
+    return expected_counts
+
+def main(argv : list[str]|None = None) -> int:
+    parser = argparse.ArgumentParser(description='Perft node counts and throughput for ChessGame')
+    parser.add_argument('positions', nargs='*', help=f'positions to run (default: all of {", ".join(PERFT_POSITIONS)})')
+    parser.add_argument('-d', '--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help='print per-move node counts at the deepest depth')
+    parser.add_argument('--epd', help='run every position of an EPD perft suite instead of the built-in positions')
+    args = parser.parse_args(argv)
+    all_passed : bool = True
+    total_nodes : int = 0
+    total_time : float = 0
+    if args.epd:
+        for index, (game, operations) in enumerate(read_epd(args.epd)):
+            expected_counts : list[int] = epd_expected_counts(operations)
+            passed, nodes, elapsed = run_perft(operations.get('id', f'#{index + 1}'), game, expected_counts, args.depth, args.divide)
+            all_passed = passed and all_passed
+            total_nodes += nodes
+            total_time += elapsed
+    else:
+        for name in args.positions or PERFT_POSITIONS:
+            if name not in PERFT_POSITIONS:
+                parser.error(f'unknown position {name}')
+            fen, expected_counts = PERFT_POSITIONS[name]
+            passed, nodes, elapsed = run_perft(name, ChessGame.from_fen(fen), expected_counts, args.depth, args.divide)
+            all_passed = passed and all_passed
+            total_nodes += nodes
+            total_time += elapsed
+    print(f'total: {total_nodes} nodes in {total_time:.3f}s ({total_nodes / max(total_time, 1e-9):.0f} nodes/s)')
+    return 0 if all_passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
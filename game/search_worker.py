@@ -0,0 +1,131 @@
+import sys
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from queue import Empty
+from typing import Any, Generator
+from game.chess_module import ChessGame
+from game.engine import Engine, SearchLimits, SearchResult
+from game.lazy_smp import LazySMP
+from game.bitbase import load_bitbases
+
+WEBPLATFORM = 'emscripten'
+
+#state of the worker side, set once by init_worker. Thread local because with the thread fallback
+#every SearchWorker's thread lives in this process, and each needs its own engine and cancel counter
+worker_state : threading.local = threading.local()
+
+def init_worker(engine : Engine|LazySMP, progress_queue : Any, cancelled_id : Any):
+    worker_state.engine = engine
+    worker_state.progress = progress_queue
+    worker_state.cancelled_id = cancelled_id
+
+class CancelWatcher:
+    '''Looks like a threading.Event to the engine; set once the main side cancels this search id.'''
+    def __init__(self, search_id : int, cancelled_id : Any):
+        self.search_id : int = search_id
+        self.cancelled_id : Any = cancelled_id
+
+    def is_set(self) -> bool:
+        return self.cancelled_id.value >= self.search_id
+
+def run_search(search_id : int, game : ChessGame, limits : SearchLimits) -> SearchResult:
+    engine : Engine|LazySMP = worker_state.engine
+    progress_queue : Any = worker_state.progress
+    engine.stop_event = CancelWatcher(search_id, worker_state.cancelled_id)
+    def report(result : SearchResult):
+        progress_queue.put((search_id, result))
+    return engine.search(game, limits, report)
+
+class SearchTask:
+    def __init__(self, worker : 'SearchWorker', search_id : int, future : Future):
+        self.worker : SearchWorker = worker
+        self.search_id : int = search_id
+        self.future : Future = future
+        self.latest : SearchResult|None = None
+
+    def poll(self) -> SearchResult|None:
+        '''Returns the deepest completed iteration reported so far, or None if nothing came in yet.'''
+        self.worker.drain_progress()
+        return self.latest
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self) -> SearchResult:
+        return self.future.result()
+
+    def cancel(self):
+        '''Stops the search as soon as the worker notices. The future still completes with the best result found.'''
+        self.worker.cancel(self.search_id)
+
+    def __await__(self) -> Generator[Any, None, SearchResult]:
+        return asyncio.wrap_future(self.future).__await__()
+
+class SearchWorker:
+    '''Runs engine searches in a separate process so the pygame loop keeps rendering.
+    Falls back to a thread where fork is unavailable (spawn would re-run main.py) and to a blocking search on the web.
+    With workers > 1 a thread drives a lazy SMP search, which already runs its workers in their own processes;
+    that also needs fork, so without it the search stays on one worker.'''
+    def __init__(self, workers : int = 1):
+        self.workers : int = workers
+        self.engine : Engine|LazySMP|None = None
+        self.executor : Executor|None = None
+        self.progress_queue : Any = None
+        self.cancelled_id : Any = None
+        self.next_id : int = 1
+        self.tasks : dict[int, SearchTask] = {}
+
+    def start_executor(self):
+        self.progress_queue = multiprocessing.Queue()
+        self.cancelled_id = multiprocessing.Value('q', 0, lock=False)
+        can_fork : bool = 'fork' in multiprocessing.get_all_start_methods()
+        if self.workers > 1 and can_fork:
+            self.engine = LazySMP(self.workers)
+            self.executor = ThreadPoolExecutor(1, 'search', init_worker, (self.engine, self.progress_queue, self.cancelled_id))
+        elif can_fork:
+            context = multiprocessing.get_context('fork')
+            self.progress_queue = context.Queue()
+            self.cancelled_id = context.Value('q', 0, lock=False)
+            self.executor = ProcessPoolExecutor(1, context, init_worker, (Engine(bitbases=load_bitbases()), self.progress_queue, self.cancelled_id))
+        else:
+            self.executor = ThreadPoolExecutor(1, 'search', init_worker, (Engine(bitbases=load_bitbases()), self.progress_queue, self.cancelled_id))
+
+    def search(self, game : ChessGame, limits : SearchLimits) -> SearchTask:
+        search_id : int = self.next_id
+        self.next_id += 1
+        if sys.platform == WEBPLATFORM:
+            future : Future = Future()
+            future.set_result(Engine(bitbases=load_bitbases()).search(game, limits))
+            return SearchTask(self, search_id, future)
+        if self.executor is None: self.start_executor()
+        task : SearchTask = SearchTask(self, search_id, self.executor.submit(run_search, search_id, game, limits))
+        self.tasks[search_id] = task
+        task.future.add_done_callback(lambda _ : self.tasks.pop(search_id, None))
+        return task
+
+    def drain_progress(self):
+        if self.progress_queue is None: return
+        while True:
+            try:
+                search_id, result = self.progress_queue.get_nowait()
+            except Empty:
+                return
+            task : SearchTask|None = self.tasks.get(search_id)
+            if task is not None: task.latest = result
+
+    def cancel(self, search_id : int):
+        if self.cancelled_id is not None and self.cancelled_id.value < search_id:
+            self.cancelled_id.value = search_id
+
+    def shutdown(self):
+        if self.executor is None: return
+        self.cancel(self.next_id - 1)
+        if isinstance(self.engine, LazySMP):
+            #queued behind the cancelled search, so the shared memory is only freed once nothing uses it
+            self.executor.submit(self.engine.close)
+        self.executor.shutdown(wait=False)
+        self.executor = None
+        self.engine = None
+        self.tasks.clear()
@@ -0,0 +1,177 @@
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from time import perf_counter
+from game.chess_module import ChessGame, TeamType, PackedMove, STARTING_FEN, read_epd
+from game.engine import Engine, SearchLimits
+
+#everything here has to stay importable without pygame so it runs on headless machines
+
+class MoveChooser(ABC):
+    '''Base class of the players. choose() gets a position with at least one legal move and must leave it unchanged.'''
+    def __init__(self, seed : int|None = None):
+        self.rng : random.Random = random.Random(seed)
+
+    @abstractmethod
+    def choose(self, game : ChessGame) -> PackedMove:
+        pass
+
+class RandomChooser(MoveChooser):
+    def choose(self, game : ChessGame) -> PackedMove:
+        return self.rng.choice(list(game.generate_legal_moves()))
+
+class GreedyChooser(MoveChooser):
+    '''Takes the move with the best static evaluation one ply ahead, ties broken at random.'''
+    def choose(self, game : ChessGame) -> PackedMove:
+        sign : int = 1 if game.current_turn == TeamType.WHITE else -1
+        best_moves : list[PackedMove] = []
+        best_score : int|None = None
+        for move in list(game.generate_legal_moves()):
+            game.push(move)
+            score : int = sign * game.evaluate()
+            if not game.has_legal_move(): score = 1000000 if game.is_check() else 0
+            game.pop()
+            if best_score is None or score > best_score:
+                best_score = score
+                best_moves = [move]
+            elif score == best_score:
+                best_moves.append(move)
+        return self.rng.choice(best_moves)
+
+class EngineChooser(MoveChooser):
+    def __init__(self, seed : int|None = None, depth : int|None = None, nodes : int|None = None, movetime : float|None = None, hash_mb : float = 16):
+        super().__init__(seed)
+        self.limits : SearchLimits = SearchLimits(depth, nodes, movetime)
+        self.engine : Engine = Engine(hash_mb)
+
+    def choose(self, game : ChessGame) -> PackedMove:
+        return self.engine.search(game, self.limits).best_move
+
+CHOOSERS : dict[str, type[MoveChooser]] = {'random' : RandomChooser, 'greedy' : GreedyChooser, 'engine' : EngineChooser}
+
+def make_chooser(spec : str, seed : int|None = None) -> MoveChooser:
+    '''Builds a player from a spec like random, greedy or engine:depth=4,movetime=0.5'''
+    name, _, option_text = spec.partition(':')
+    if name not in CHOOSERS: raise ValueError(f'Unknown player {name}, expected one of {", ".join(CHOOSERS)}')
+    options : dict[str, float] = {}
+    for option in filter(None, option_text.split(',')):
+        key, _, value = option.partition('=')
+        options[key] = float(value) if '.' in value else int(value)
+    return CHOOSERS[name](seed, **options)
+
+def game_outcome(game : ChessGame, max_plies : int, plies : int) -> str|None:
+    if not game.has_legal_move():
+        if not game.is_check(): return '1/2-1/2'
+        return '0-1' if game.current_turn == TeamType.WHITE else '1-0'
+    if game.halfmove_clock >= 100 or game.is_threefold_repetition(): return '1/2-1/2'
+    if not game.has_checkmating_material(TeamType.WHITE) and not game.has_checkmating_material(TeamType.BLACK): return '1/2-1/2'
+    if plies >= max_plies: return '1/2-1/2'
+    return None
+
+def play_game(white_spec : str, black_spec : str, fen : str, max_plies : int, seed : int, round_number : int) -> tuple[str, str]:
+    '''Plays one game and returns its result and PGN. Runs in the worker processes, so it only takes picklable arguments.'''
+    game : ChessGame = ChessGame.from_fen(fen)
+    players : dict[TeamType, MoveChooser] = {TeamType.WHITE : make_chooser(white_spec, seed), TeamType.BLACK : make_chooser(black_spec, seed + 1)}
+    san_moves : list[str] = []
+    plies : int = 0
+    move_number : int = game.fullmove_number
+    if game.current_turn == TeamType.BLACK: san_moves.append(f'{move_number}...')
+    while (result := game_outcome(game, max_plies, plies)) is None:
+        move : PackedMove = players[game.current_turn].choose(game)
+        if game.current_turn == TeamType.WHITE: san_moves.append(f'{game.fullmove_number}.')
+        san_moves.append(game.move_to_san(move))
+        game.push(move)
+        plies += 1
+    headers : list[str] = [f'[Event "Self-play"]', f'[Round "{round_number}"]', f'[White "{white_spec}"]', f'[Black "{black_spec}"]',
+                           f'[Result "{result}"]']
+    if fen != STARTING_FEN: headers += ['[SetUp "1"]', f'[FEN "{fen}"]']
+    return result, '\n'.join(headers) + '\n\n' + ' '.join(san_moves + [result]) + '\n\n'
+
+def sprt_llr(wins : int, draws : int, losses : int, elo0 : float, elo1 : float) -> float:
+    '''Log-likelihood ratio of elo1 against elo0 under the normal approximation of the trinomial game results.'''
+    if wins + draws + losses == 0: return 0.0
+    #half a game of each outcome keeps the variance above zero when one side wins everything
+    wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+    games : float = wins + draws + losses
+    score : float = (wins + draws / 2) / games
+    variance : float = (wins + draws / 4) / games - score * score
+    score0 : float = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 : float = 1 / (1 + 10 ** (-elo1 / 400))
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / games)
+
+def sprt_bounds(alpha : float, beta : float) -> tuple[float, float]:
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+def load_openings(path : str|None) -> list[str]:
+    if path is None: return [STARTING_FEN]
+    openings : list[str] = [game.to_fen() for game, _ in read_epd(path)]
+    if not openings: raise ValueError(f'No positions in {path}')
+    return openings
+
+def main(argv : list[str]|None = None) -> int:
+    parser = argparse.ArgumentParser(description='Self-play match between two move choosers with an SPRT stopping rule')
+    parser.add_argument('player', help='player under test, e.g. engine:depth=3, greedy or random')
+    parser.add_argument('baseline', help='player to compare against')
+    parser.add_argument('-n', '--games', type=int, default=1000, help='maximum number of games, every opening is played with both colours')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--openings', help='EPD or FEN file with one opening position per line')
+    parser.add_argument('--pgn', help='append the games to this PGN file')
+    parser.add_argument('--max-plies', type=int, default=400, help='adjudicate a draw after this many plies')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--elo0', type=float, default=0)
+    parser.add_argument('--elo1', type=float, default=10)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    args = parser.parse_args(argv)
+    for spec in (args.player, args.baseline):
+        try:
+            make_chooser(spec)
+        except (ValueError, TypeError) as error:
+            parser.error(f'{spec}: {error}')
+    openings : list[str] = load_openings(args.openings)
+    rng : random.Random = random.Random(args.seed)
+    rng.shuffle(openings)
+    lower_bound, upper_bound = sprt_bounds(args.alpha, args.beta)
+    wins = draws = losses = 0
+    verdict : str|None = None
+    start_time : float = perf_counter()
+    pgn_file = open(args.pgn, 'a') if args.pgn else None
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    executor : ProcessPoolExecutor = ProcessPoolExecutor(args.jobs, context)
+    try:
+        pending : dict[Future, bool] = {}
+        for round_number in range(args.games):
+            fen : str = openings[(round_number // 2) % len(openings)]
+            player_is_white : bool = round_number % 2 == 0
+            white, black = (args.player, args.baseline) if player_is_white else (args.baseline, args.player)
+            future : Future = executor.submit(play_game, white, black, fen, args.max_plies, args.seed + 2 * round_number, round_number + 1)
+            pending[future] = player_is_white
+        while pending and verdict is None:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                player_is_white : bool = pending.pop(future)
+                result, pgn = future.result()
+                if pgn_file: pgn_file.write(pgn)
+                if result == '1/2-1/2':
+                    draws += 1
+                elif (result == '1-0') == player_is_white:
+                    wins += 1
+                else:
+                    losses += 1
+            llr : float = sprt_llr(wins, draws, losses, args.elo0, args.elo1)
+            games : int = wins + draws + losses
+            print(f'games {games}: +{wins} ={draws} -{losses}  LLR {llr:.2f} [{lower_bound:.2f}, {upper_bound:.2f}]  {games / (perf_counter() - start_time):.1f} games/s')
+            if llr >= upper_bound: verdict = f'H1 accepted: {args.player} is stronger by at least {args.elo1:g} Elo'
+            elif llr <= lower_bound: verdict = f'H0 accepted: {args.player} is not stronger by {args.elo1:g} Elo'
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if pgn_file: pgn_file.close()
+    print(verdict or 'No SPRT verdict within the game limit')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+from array import array
+from game.chess_module import PackedMove
+
+BOUND_NONE : int = 0
+BOUND_UPPER : int = 1
+BOUND_LOWER : int = 2
+BOUND_EXACT : int = 3
+
+#layout of the 64 bit data word of an entry
+MOVE_BITS : int = 16
+SCORE_BITS : int = 20
+DEPTH_BITS : int = 8
+BOUND_BITS : int = 2
+AGE_BITS : int = 8
+
+SCORE_SHIFT : int = MOVE_BITS
+DEPTH_SHIFT : int = SCORE_SHIFT + SCORE_BITS
+BOUND_SHIFT : int = DEPTH_SHIFT + DEPTH_BITS
+AGE_SHIFT : int = BOUND_SHIFT + BOUND_BITS
+
+MOVE_MASK : int = (1 << MOVE_BITS) - 1
+SCORE_MASK : int = (1 << SCORE_BITS) - 1
+SCORE_OFFSET : int = 1 << (SCORE_BITS - 1)
+DEPTH_MASK : int = (1 << DEPTH_BITS) - 1
+BOUND_MASK : int = (1 << BOUND_BITS) - 1
+AGE_MASK : int = (1 << AGE_BITS) - 1
+
+ENTRY_BYTES : int = 16
+BUCKET_SIZE : int = 2
+
+class TTEntry:
+    __slots__ = ('move', 'score', 'depth', 'bound')
+    def __init__(self, move : PackedMove, score : int, depth : int, bound : int):
+        self.move : PackedMove = move
+        self.score : int = score
+        self.depth : int = depth
+        self.bound : int = bound
+
+class TranspositionTable:
+    '''Fixed size hash table over two flat array('Q') buffers, one word for the key and one for the data of every slot.
+    Each bucket holds a depth-preferred slot and an always-replace slot.
+    The key word is stored xored with the data word, so a torn write just reads back as a miss.
+    Passing a buffer (e.g. a SharedMemory.buf of at least table_bytes(size_mb)) lets several processes share one table.'''
+    def __init__(self, size_mb : float = 16, buffer : memoryview|None = None):
+        self.keys : array|memoryview
+        self.data : array|memoryview
+        self.buffer : memoryview|None = buffer
+        self.bucket_count : int = 0
+        self.age : int = 0
+        self.resize(size_mb)
+
+    @staticmethod
+    def bucket_count_for(size_mb : float) -> int:
+        buckets : int = max(1, int(size_mb * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SIZE))
+        #round down to a power of two so the index is a mask
+        return 1 << (buckets.bit_length() - 1)
+
+    @staticmethod
+    def table_bytes(size_mb : float) -> int:
+        return TranspositionTable.bucket_count_for(size_mb) * BUCKET_SIZE * ENTRY_BYTES
+
+    def resize(self, size_mb : float):
+        self.bucket_count = self.bucket_count_for(size_mb)
+        word_count : int = BUCKET_SIZE * self.bucket_count
+        if self.buffer is None:
+            self.keys = array('Q', bytes(8 * word_count))
+            self.data = array('Q', bytes(8 * word_count))
+        else:
+            self.keys = self.buffer[:8 * word_count].cast('Q')
+            self.data = self.buffer[8 * word_count:16 * word_count].cast('Q')
+
+    @property
+    def size_bytes(self) -> int:
+        return self.bucket_count * BUCKET_SIZE * ENTRY_BYTES
+
+    def clear(self):
+        if self.buffer is None:
+            self.keys = array('Q', bytes(8 * len(self.keys)))
+            self.data = array('Q', bytes(8 * len(self.data)))
+        else:
+            self.buffer[:self.size_bytes] = bytes(self.size_bytes)
+        self.age = 0
+
+    def release(self):
+        #views on a shared buffer have to be released before the SharedMemory can be closed
+        if self.buffer is None: return
+        self.keys.release()
+        self.data.release()
+        self.buffer = None
+
+    def new_search(self):
+        self.age = (self.age + 1) & AGE_MASK
+
+    def probe(self, key : int) -> TTEntry|None:
+        slot : int = (key & (self.bucket_count - 1)) * BUCKET_SIZE
+        keys : array|memoryview = self.keys
+        data : array|memoryview = self.data
+        for index in (slot, slot + 1):
+            word : int = data[index]
+            if keys[index] ^ word == key and word:
+                return TTEntry(word & MOVE_MASK, ((word >> SCORE_SHIFT) & SCORE_MASK) - SCORE_OFFSET,
+                               (word >> DEPTH_SHIFT) & DEPTH_MASK, (word >> BOUND_SHIFT) & BOUND_MASK)
+        return None
+
+    def store(self, key : int, move : PackedMove, score : int, depth : int, bound : int):
+        slot : int = (key & (self.bucket_count - 1)) * BUCKET_SIZE
+        keys : array|memoryview = self.keys
+        data : array|memoryview = self.data
+        old_word : int = data[slot]
+        same_key : bool = keys[slot] ^ old_word == key
+        #the first slot keeps the deepest entry of the current search, everything else goes to the second one
+        if not (same_key or ((old_word >> AGE_SHIFT) & AGE_MASK) != self.age or depth >= (old_word >> DEPTH_SHIFT) & DEPTH_MASK):
+            slot += 1
+            old_word = data[slot]
+            same_key = keys[slot] ^ old_word == key
+        if same_key and not move:
+            move = old_word & MOVE_MASK
+        word : int = (move | ((score + SCORE_OFFSET) << SCORE_SHIFT) | (min(max(depth, 0), DEPTH_MASK) << DEPTH_SHIFT)
+                      | (bound << BOUND_SHIFT) | (self.age << AGE_SHIFT))
+        data[slot] = word
+        keys[slot] = key ^ word
+
+    def hashfull(self) -> int:
+        '''Per mille of the first thousand slots used by the current search, as reported by UCI engines.'''
+        data : array|memoryview = self.data
+        sample : int = min(1000, len(data))
+        used : int = sum(1 for index in range(sample) if data[index] and ((data[index] >> AGE_SHIFT) & AGE_MASK) == self.age)
+        return used * 1000 // sample
@@ -0,0 +1,180 @@
+import sys
+import threading
+from typing import TextIO
+from game.chess_module import ChessGame, TeamType, PackedMove, STARTING_FEN, move_to_string
+from game.engine import Engine, SearchLimits, SearchResult, MATE_SCORE, MATE_THRESHOLD
+from game.bitbase import load_bitbases
+
+#only the engine modules are imported here, never pygame, so a GUI or match runner can start it quickly
+ENGINE_NAME : str = 'online_chess'
+ENGINE_AUTHOR : str = 'mementojunior123'
+DEFAULT_HASH_MB : int = 16
+MAX_HASH_MB : int = 1024
+#without movestogo, assume the game lasts this many more moves
+DEFAULT_MOVES_TO_GO : int = 30
+#kept back from the clock for the time it takes to send the move
+MOVE_OVERHEAD : float = 0.05
+
+def format_score(score : int) -> str:
+    if abs(score) < MATE_THRESHOLD: return f'cp {score}'
+    plies : int = MATE_SCORE - abs(score)
+    return f'mate {(plies + 1) // 2 if score > 0 else -((plies + 1) // 2)}'
+
+def parse_move(game : ChessGame, text : str) -> PackedMove|None:
+    for move in game.generate_legal_moves():
+        if move_to_string(move) == text: return move
+    return None
+
+class UCIEngine:
+    '''Reads UCI commands and runs the search in a background thread, so stop and isready are answered while it thinks.'''
+    def __init__(self, output : TextIO = sys.stdout):
+        self.output : TextIO = output
+        self.output_lock : threading.Lock = threading.Lock()
+        self.hash_mb : int = DEFAULT_HASH_MB
+        self.engine : Engine = Engine(self.hash_mb, bitbases=load_bitbases())
+        self.game : ChessGame = ChessGame.from_fen(STARTING_FEN)
+        self.search_thread : threading.Thread|None = None
+        #set by stop, go infinite waits for it before reporting a move
+        self.stop_requested : threading.Event = threading.Event()
+
+    def send(self, line : str):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, commands : TextIO = sys.stdin):
+        for line in commands:
+            if not self.handle_command(line): break
+        self.stop_search()
+
+    def handle_command(self, line : str) -> bool:
+        '''Handles one line of input and returns False on quit. Unknown commands are ignored as the protocol asks.'''
+        tokens : list[str] = line.split()
+        if not tokens: return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == 'quit':
+            return False
+        elif command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send(f'option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}')
+            self.send('option name Clear Hash type button')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(arguments)
+        elif command == 'ucinewgame':
+            self.stop_search()
+            self.engine.tt.clear()
+            self.engine.ordering.clear()
+        elif command == 'position':
+            self.stop_search()
+            self.set_position(arguments)
+        elif command == 'go':
+            self.stop_search()
+            self.start_search(arguments)
+        elif command == 'stop':
+            self.stop_search()
+        elif command == 'd':
+            self.send(self.game.to_fen())
+        return True
+
+    def set_option(self, arguments : list[str]):
+        text : str = ' '.join(arguments)
+        name, _, value = text.removeprefix('name ').partition(' value ')
+        name = name.strip().lower()
+        if name == 'hash':
+            try:
+                hash_mb : int = int(value)
+            except ValueError:
+                self.send(f'info string bad Hash value {value.strip()}')
+                return
+            self.stop_search()
+            self.hash_mb = max(1, min(MAX_HASH_MB, hash_mb))
+            self.engine.tt.release()
+            self.engine = Engine(self.hash_mb, bitbases=self.engine.bitbases)
+        elif name == 'clear hash':
+            self.stop_search()
+            self.engine.tt.clear()
+
+    def set_position(self, arguments : list[str]):
+        moves_index : int = arguments.index('moves') if 'moves' in arguments else len(arguments)
+        if arguments and arguments[0] == 'fen':
+            try:
+                game : ChessGame = ChessGame.from_fen(' '.join(arguments[1:moves_index]))
+            except (ValueError, IndexError) as error:
+                #the previous position is kept
+                self.send(f'info string {error}')
+                return
+        else:
+            game : ChessGame = ChessGame.from_fen(STARTING_FEN)
+        #moves are pushed rather than set up from a fen so the repetition history is kept
+        for text in arguments[moves_index + 1:]:
+            move : PackedMove|None = parse_move(game, text)
+            if move is None:
+                self.send(f'info string illegal move {text}')
+                break
+            game.push(move)
+        self.game = game
+
+    def parse_limits(self, arguments : list[str]) -> tuple[SearchLimits, bool]:
+        values : dict[str, int] = {}
+        infinite : bool = False
+        index : int = 0
+        while index < len(arguments):
+            token : str = arguments[index]
+            if token == 'infinite':
+                infinite = True
+            elif token == 'searchmoves':
+                break
+            elif index + 1 < len(arguments) and arguments[index + 1].lstrip('-').isdigit():
+                try:
+                    values[token] = int(arguments[index + 1])
+                except ValueError:
+                    self.send(f'info string bad value {arguments[index + 1]} for {token}')
+                index += 1
+            index += 1
+        movetime : float|None = values['movetime'] / 1000 if 'movetime' in values else None
+        clock_name, increment_name = ('wtime', 'winc') if self.game.current_turn == TeamType.WHITE else ('btime', 'binc')
+        if movetime is None and clock_name in values and not infinite:
+            remaining : float = values[clock_name] / 1000
+            increment : float = values.get(increment_name, 0) / 1000
+            budget : float = remaining / values.get('movestogo', DEFAULT_MOVES_TO_GO) + increment * 0.75
+            movetime = max(0.01, min(budget, remaining - MOVE_OVERHEAD))
+        return SearchLimits(values.get('depth'), values.get('nodes'), movetime), infinite
+
+    def start_search(self, arguments : list[str]):
+        limits, infinite = self.parse_limits(arguments)
+        self.stop_requested.clear()
+        self.search_thread = threading.Thread(target=self.search, args=(self.game.copy(), limits, infinite), daemon=True)
+        self.search_thread.start()
+
+    def stop_search(self):
+        if self.search_thread is None: return
+        self.stop_requested.set()
+        self.engine.stop()
+        self.search_thread.join()
+        self.search_thread = None
+
+    def search(self, game : ChessGame, limits : SearchLimits, infinite : bool):
+        self.engine.stop_event = self.stop_requested
+        result : SearchResult = self.engine.search(game, limits, self.send_info)
+        #the protocol forbids bestmove before stop in infinite mode, even if the search itself has finished
+        if infinite: self.stop_requested.wait()
+        if result.best_move is None:
+            self.send('bestmove 0000')
+            return
+        ponder_text : str = f' ponder {move_to_string(result.pv[1])}' if len(result.pv) > 1 else ''
+        self.send(f'bestmove {move_to_string(result.best_move)}{ponder_text}')
+
+    def send_info(self, result : SearchResult):
+        self.send(f'info depth {result.depth} score {format_score(result.score)} nodes {result.nodes} nps {result.nps:.0f} '
+                  f'hashfull {self.engine.tt.hashfull()} time {result.elapsed * 1000:.0f} pv {" ".join(move_to_string(move) for move in result.pv)}')
+
+def main() -> int:
+    UCIEngine().run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
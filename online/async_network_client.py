@@ -0,0 +1,165 @@
+import asyncio
+from typing import Any
+from online.framing import FrameBuffer, FramingNegotiation, FramingError, read_prefix, FRAMING_VARINT, MAX_VARINT_BYTES, PREFIX_LENGTHS
+
+NETWORK_MESSAGE_RECIVED : int = 1
+NETWORK_SERVER_DISCONNECTED : int = 2
+NETWORK_MESSAGE_SENT : int = 3
+NETWORK_MESSAGE_FAILED : int = 4
+USE_PYGAME_EVENTS : bool = False
+event : Any = None
+Event : Any = None
+
+def init(use_pygame_events : bool = True):
+    '''Call before creating clients that should post pygame events, pygame is only imported here.'''
+    global NETWORK_MESSAGE_RECIVED, NETWORK_SERVER_DISCONNECTED, NETWORK_MESSAGE_SENT, NETWORK_MESSAGE_FAILED
+    global USE_PYGAME_EVENTS, event, Event
+    USE_PYGAME_EVENTS = use_pygame_events
+    if not use_pygame_events: return
+    from pygame import event, Event
+    NETWORK_MESSAGE_RECIVED = event.custom_type()
+    NETWORK_SERVER_DISCONNECTED = event.custom_type()
+    NETWORK_MESSAGE_SENT = event.custom_type()
+    NETWORK_MESSAGE_FAILED = event.custom_type()
+    AsyncNetworkClient.NETWORK_MESSAGE_RECIVED = NETWORK_MESSAGE_RECIVED
+    AsyncNetworkClient.NETWORK_SERVER_DISCONNECTED = NETWORK_SERVER_DISCONNECTED
+    AsyncNetworkClient.NETWORK_MESSAGE_SENT = NETWORK_MESSAGE_SENT
+    AsyncNetworkClient.NETWORK_MESSAGE_FAILED = NETWORK_MESSAGE_FAILED
+
+class AsyncNetworkClient:
+    '''Client on asyncio streams with the same length prefixed frames as NetworkClient, so it needs no threads and no polling.
+    Use it directly with await connect_to_server(), await send() and async for message in client, or call receive_messages()
+    and send_message() to get the same pygame events as the other clients.'''
+    NETWORK_MESSAGE_RECIVED = NETWORK_MESSAGE_RECIVED
+    NETWORK_SERVER_DISCONNECTED = NETWORK_SERVER_DISCONNECTED
+    NETWORK_MESSAGE_SENT = NETWORK_MESSAGE_SENT
+    NETWORK_MESSAGE_FAILED = NETWORK_MESSAGE_FAILED
+
+    UUID = 0
+    DEFAULT_PORT = 40674
+
+    def __init__(self, port : int|None = None, connection_ip : str = 'localhost'):
+        self.port : int = port or AsyncNetworkClient.DEFAULT_PORT
+        self.connection_ip : str = connection_ip
+        self.reader : asyncio.StreamReader|None = None
+        self.writer : asyncio.StreamWriter|None = None
+        self.connected : bool = False
+        self._closed : bool = False
+        self.listening : int = 0
+        self.use_pygame_events : bool = USE_PYGAME_EVENTS
+        #asyncio does the buffering here, the frame buffer only carries the framing version that is being read
+        self.framing : FramingNegotiation = FramingNegotiation(FrameBuffer(0))
+        #send_message tasks chain on each other so messages go out in call order
+        self.last_send : asyncio.Task|None = None
+        self.receive_task : asyncio.Task|None = None
+        AsyncNetworkClient.UUID += 1
+        self.identifier : int = AsyncNetworkClient.UUID
+
+    async def connect_to_server(self):
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.connection_ip, self.port)
+        except OSError:
+            self.connected = False
+            return
+        self.connected = True
+
+    async def send(self, data : bytes) -> bool:
+        if self._closed or not self.connected: return False
+        try:
+            self.writer.write(self.framing.encode(data))
+            await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.disconnected()
+            self.post_event(NETWORK_MESSAGE_FAILED, {'data' : data, 'progress' : 0, 'network' : self})
+            return False
+        self.post_event(NETWORK_MESSAGE_SENT, {'data' : data, 'network' : self})
+        return True
+
+    async def receive(self) -> bytes|None:
+        '''The next message, or None once the connection is gone. Framing negotiation is answered here and never returned.'''
+        while not self._closed and self.connected:
+            try:
+                message : bytes = await self.read_frame()
+                reply : bytes|None = self.framing.handle(message)
+            except (asyncio.IncompleteReadError, ConnectionError, OSError, FramingError):
+                self.disconnected()
+                return None
+            if reply is None: return message
+            if reply: self.writer.write(reply)
+        return None
+
+    async def read_frame(self) -> bytes:
+        version : int = self.framing.frame_buffer.version
+        if version != FRAMING_VARINT:
+            prefix : bytes = await self.reader.readexactly(PREFIX_LENGTHS[version])
+        else:
+            prefix : bytes = await self.reader.readexactly(1)
+            while prefix[-1] & 0x80 and len(prefix) < MAX_VARINT_BYTES:
+                prefix += await self.reader.readexactly(1)
+        prefix_result : tuple[int, int]|None = read_prefix(prefix, version)
+        if prefix_result is None: raise FramingError('Varint length prefix is too long')
+        return await self.reader.readexactly(prefix_result[0])
+
+    def __aiter__(self) -> 'AsyncNetworkClient':
+        return self
+
+    async def __anext__(self) -> bytes:
+        message : bytes|None = await self.receive()
+        if message is None: raise StopAsyncIteration
+        return message
+
+    def disconnected(self):
+        if not self.connected: return
+        self.connected = False
+        self.post_event(NETWORK_SERVER_DISCONNECTED, {'network' : self})
+
+    def post_event(self, event_type : int, event_dict : dict):
+        if self.use_pygame_events: event.post(Event(event_type, event_dict))
+
+    #the methods below mirror NetworkClient so game states can use either client
+    def receive_messages(self, message_count : int = -1) -> bool:
+        if self._closed: return False
+        self.receive_task = asyncio.get_running_loop().create_task(self._receive_messages(message_count))
+        return True
+
+    async def _receive_messages(self, message_count : int = -1):
+        self.listening += 1
+        messages_received : int = 0
+        try:
+            while messages_received < message_count or message_count < 0:
+                message : bytes|None = await self.receive()
+                if message is None: break
+                messages_received += 1
+                self.post_event(NETWORK_MESSAGE_RECIVED, {'data' : message, 'network' : self})
+        finally:
+            self.listening -= 1
+
+    def send_message(self, data : bytes) -> bool:
+        if self._closed or not self.connected: return False
+        self.last_send = asyncio.get_running_loop().create_task(self._send_after(self.last_send, data))
+        return True
+
+    async def _send_after(self, previous : asyncio.Task|None, data : bytes):
+        if previous is not None: await asyncio.wait([previous])
+        await self.send(data)
+
+    def update(self):
+        pass
+
+    def close(self):
+        self._closed = True
+
+    def cleanup(self):
+        self._closed = True
+        if self.receive_task is not None: self.receive_task.cancel()
+        if self.writer is not None: self.writer.close()
+        self.connected = False
+
+    async def aclose(self):
+        if self.last_send is not None: await asyncio.wait([self.last_send])
+        self.cleanup()
+        if self.writer is not None:
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
@@ -0,0 +1,180 @@
+import socket
+from typing import Iterator
+
+#every message is sent as a length prefix followed by the payload, the prefix format depends on the framing version.
+#connections start with the legacy 2 byte prefix and can switch to a bigger one with FramingNegotiation
+FRAMING_LEGACY : int = 0
+FRAMING_FIXED32 : int = 1
+FRAMING_VARINT : int = 2
+SUPPORTED_VERSIONS : tuple[int, ...] = (FRAMING_LEGACY, FRAMING_FIXED32, FRAMING_VARINT)
+
+PREFIX_LENGTH : int = 2
+#prefix sizes of the fixed width versions
+PREFIX_LENGTHS : dict[int, int] = {FRAMING_LEGACY : PREFIX_LENGTH, FRAMING_FIXED32 : 4}
+MAX_MESSAGE_LENGTHS : dict[int, int] = {FRAMING_LEGACY : 2 ** 16 - 1, FRAMING_FIXED32 : 2 ** 32 - 1, FRAMING_VARINT : 2 ** 35 - 1}
+#a varint of more bytes than this is treated as a broken stream
+MAX_VARINT_BYTES : int = 5
+
+#control messages of the negotiation, always sent with the framing in use before the switch
+FRAMING_OFFER : bytes = b'FramingOffer'
+FRAMING_REQUEST : bytes = b'FramingRequest'
+FRAMING_ACCEPT : bytes = b'FramingAccept'
+FRAMING_MESSAGES : tuple[bytes, ...] = (FRAMING_OFFER, FRAMING_REQUEST, FRAMING_ACCEPT)
+
+class FramingError(ValueError):
+    pass
+
+def make_prefix(message_length : int, version : int = FRAMING_LEGACY) -> bytes:
+    if message_length > MAX_MESSAGE_LENGTHS[version]:
+        raise FramingError(f'Message of {message_length} bytes is too long for framing version {version}')
+    if version in PREFIX_LENGTHS: return message_length.to_bytes(PREFIX_LENGTHS[version], 'little')
+    #LEB128: 7 bits per byte, lowest first, the high bit set on every byte but the last
+    prefix : bytearray = bytearray()
+    while message_length > 0x7f:
+        prefix.append((message_length & 0x7f) | 0x80)
+        message_length >>= 7
+    prefix.append(message_length)
+    return bytes(prefix)
+
+def encode_frame(data : bytes, version : int = FRAMING_LEGACY) -> bytes:
+    return make_prefix(len(data), version) + data
+
+def read_prefix(view : memoryview|bytes, version : int = FRAMING_LEGACY) -> tuple[int, int]|None:
+    '''(message length, prefix length) of the frame at the start of view, or None when the prefix is not complete yet.'''
+    if version == FRAMING_VARINT:
+        message_length : int = 0
+        for index in range(min(len(view), MAX_VARINT_BYTES)):
+            byte : int = view[index]
+            message_length |= (byte & 0x7f) << (7 * index)
+            if not byte & 0x80: return message_length, index + 1
+        if len(view) >= MAX_VARINT_BYTES: raise FramingError('Varint length prefix is too long')
+        return None
+    prefix_length : int = PREFIX_LENGTHS[version]
+    if len(view) < prefix_length: return None
+    return int.from_bytes(view[:prefix_length], 'little'), prefix_length
+
+class FrameBuffer:
+    '''Receive buffer shared by the clients and the server. Data is read straight into a bytearray with recv_into,
+    frames are parsed through a memoryview, and the only copy made is the payload handed out for each complete frame.
+    Consumed bytes are reclaimed by moving the unread tail to the front once it is cheaper than growing.'''
+    INITIAL_SIZE : int = 4096
+
+    def __init__(self, size : int = INITIAL_SIZE):
+        self.buffer : bytearray = bytearray(size)
+        self.start : int = 0
+        self.end : int = 0
+        #framing of the incoming data, may change between two frames
+        self.version : int = FRAMING_LEGACY
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def reserve(self, size : int):
+        #makes room for at least size more bytes after end
+        if len(self.buffer) - self.end >= size: return
+        unread : int = self.end - self.start
+        if self.start and unread + size <= len(self.buffer):
+            self.buffer[:unread] = self.buffer[self.start:self.end]
+        else:
+            new_buffer : bytearray = bytearray(max(2 * len(self.buffer), unread + size))
+            new_buffer[:unread] = self.buffer[self.start:self.end]
+            self.buffer = new_buffer
+        self.start = 0
+        self.end = unread
+
+    def recv_into(self, sock : socket.socket, size : int = INITIAL_SIZE) -> int:
+        '''One recv straight into the buffer. Returns the byte count, 0 when the peer closed the connection.
+        Socket errors, including timeouts and BlockingIOError, are left to the caller.'''
+        self.reserve(size)
+        with memoryview(self.buffer) as view:
+            received : int = sock.recv_into(view[self.end:self.end + size])
+        self.end += received
+        return received
+
+    def feed(self, data : bytes):
+        self.reserve(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def frame_end(self) -> tuple[int, int]|None:
+        #(payload start, payload end) of the first frame if it is complete
+        with memoryview(self.buffer) as view:
+            prefix : tuple[int, int]|None = read_prefix(view[self.start:self.end], self.version)
+        if prefix is None: return None
+        message_length, prefix_length = prefix
+        if self.start + prefix_length + message_length > self.end: return None
+        return self.start + prefix_length, self.start + prefix_length + message_length
+
+    def has_frame(self) -> bool:
+        return self.frame_end() is not None
+
+    def next_frame(self) -> bytes|None:
+        '''Removes and returns the payload of the first complete frame, or None if there is none yet.'''
+        bounds : tuple[int, int]|None = self.frame_end()
+        if bounds is None: return None
+        with memoryview(self.buffer) as view:
+            message : bytes = bytes(view[bounds[0]:bounds[1]])
+        self.start = bounds[1]
+        if self.start == self.end:
+            self.start = self.end = 0
+        return message
+
+    def frames(self) -> Iterator[bytes]:
+        '''Yields every complete frame in the buffer in one pass. The version is read again for every frame,
+        so a consumer that switches it in the middle gets the following frames parsed the new way.'''
+        while (message := self.next_frame()) is not None:
+            yield message
+
+    def take_all(self) -> bytes:
+        #for connections that do not use prefixes
+        data : bytes = bytes(self.buffer[self.start:self.end])
+        self.start = self.end = 0
+        return data
+
+class FramingNegotiation:
+    '''Framing versions of the two directions of a connection. The server sends offer() after its greeting; a client that
+    understands it answers with a request for the best common version and sends everything after the request that way.
+    The server switches its reading on the request and answers with an accept, after which it writes the new way too,
+    and the client switches its reading on the accept. Peers that ignore the offer keep the legacy framing.'''
+    def __init__(self, frame_buffer : FrameBuffer):
+        self.frame_buffer : FrameBuffer = frame_buffer
+        self.send_version : int = FRAMING_LEGACY
+
+    @staticmethod
+    def offer() -> bytes:
+        return FRAMING_OFFER + bytes(SUPPORTED_VERSIONS)
+
+    def encode(self, data : bytes) -> bytes:
+        return encode_frame(data, self.send_version)
+
+    def handle(self, message : bytes) -> bytes|None:
+        '''Returns None for ordinary messages. For negotiation messages, returns the encoded frame to send back,
+        possibly empty; it has to be sent before anything encoded after this call.'''
+        if message.startswith(FRAMING_OFFER):
+            offered : bytes = message[len(FRAMING_OFFER):]
+            version : int = max((version for version in SUPPORTED_VERSIONS if version in offered), default=FRAMING_LEGACY)
+            if version == FRAMING_LEGACY: return b''
+            reply : bytes = self.encode(FRAMING_REQUEST + bytes([version]))
+            self.send_version = version
+            return reply
+        if message.startswith(FRAMING_REQUEST):
+            version : int = message[len(FRAMING_REQUEST)] if len(message) > len(FRAMING_REQUEST) else FRAMING_LEGACY
+            if version not in SUPPORTED_VERSIONS: raise FramingError(f'Peer asked for unknown framing version {version}')
+            self.frame_buffer.version = version
+            reply : bytes = self.encode(FRAMING_ACCEPT + bytes([version]))
+            self.send_version = version
+            return reply
+        if message.startswith(FRAMING_ACCEPT):
+            version : int = message[len(FRAMING_ACCEPT)] if len(message) > len(FRAMING_ACCEPT) else FRAMING_LEGACY
+            if version not in SUPPORTED_VERSIONS: raise FramingError(f'Peer accepted unknown framing version {version}')
+            self.frame_buffer.version = version
+            return b''
+        return None
+
+    def handle_buffered(self) -> bytes:
+        '''Answers the negotiation frames waiting at the front of the buffer and returns the replies to send,
+        so that a peek at the buffer only sees ordinary messages.'''
+        replies : bytes = b''
+        while (bounds := self.frame_buffer.frame_end()) is not None and self.frame_buffer.buffer.startswith(FRAMING_MESSAGES, *bounds):
+            replies += self.handle(self.frame_buffer.next_frame())
+        return replies
@@ -1,8 +1,11 @@
 import socket
 import _thread
+import threading
+from queue import Queue, Empty, Full
 from time import perf_counter
 from typing import Callable
 from select import select
+from online.framing import FrameBuffer, FramingNegotiation, read_prefix, make_prefix
 
 class EventModuleShadow:
     @staticmethod
@@ -43,8 +46,11 @@ def init(use_pygame_events : bool = True):
         NETWORK_MESSAGE_SENT = NETWORK_MESSAGE_SENT
         NETWORK_MESSAGE_FAILED = NETWORK_MESSAGE_FAILED
 
-        PREFIX_LENTGH = 2
         BUFF_SIZE = 4096
+        #frames waiting for the writer thread, send_message blocks once this many are queued
+        OUTBOUND_QUEUE_SIZE = 256
+        #queued frames are joined into batches of up to this many bytes before being sent
+        MAX_BATCH_BYTES = 65536
         UUID = 0
         DEFAULT_PORT = 40674
 
@@ -57,7 +63,8 @@ def init(use_pygame_events : bool = True):
             self.listening : int = 0
             self.connected : bool = False
             self.use_pygame_events : bool = USE_PYGAME_EVENTS
-            self.untreated_data : bytes = bytes(0)
+            self.frame_buffer : FrameBuffer = FrameBuffer(NetworkClient.BUFF_SIZE)
+            self.framing : FramingNegotiation = FramingNegotiation(self.frame_buffer)
             self.buffered_messages : list[bytes] = []
             NetworkClient.UUID += 1
             self.identifier : int = NetworkClient.UUID
@@ -65,32 +72,48 @@ def init(use_pygame_events : bool = True):
             self.interrupt_wait : bool = False
             self.message_received_callback : Callable[[bytes, NetworkClient], None]|None = None
             self.buffer_next_message : bool = False
+            #one writer thread per connection sends the queued (message, frame) pairs in order, started by the first send_message.
+            #writer_lock is held from encoding a frame to queueing it, framing negotiation included
+            #the message is None for frames of the framing negotiation, which get no events
+            self.outbound_queue : Queue[tuple[bytes|None, bytes]|None] = Queue(NetworkClient.OUTBOUND_QUEUE_SIZE)
+            self.writer_thread : threading.Thread|None = None
+            self.writer_lock : threading.Lock = threading.Lock()
 
         def update(self):
             pass
             
         def close(self):
             self._closed = True
+            #wakes the writer up, it still sends what was queued before close
+            try:
+                self.outbound_queue.put_nowait(None)
+            except Full:
+                pass
         
         def cleanup(self):
+            if self.writer_thread is not None and self.writer_thread is not threading.current_thread():
+                self.writer_thread.join(self.socket.gettimeout() or 1)
             self.socket.shutdown(socket.SHUT_RDWR)
             self.socket.close()
         
         def peek(self) -> bool:
+            '''True when wait_for_message will not block: a complete message is buffered or the peer closed the connection.'''
             if self._closed: return False
-            timeout : float|None = self.socket.timeout
-            self.socket.settimeout(0.0)
-            ready_read : list[socket.socket] = (select([self.socket], [], [], 0.0))[0]
-            result : bool = False
-            if self.socket in ready_read:
-                try:
-                    self.untreated_data += self.socket.recv(NetworkClient.BUFF_SIZE)
-                    result = True
-                except Exception as e:
-                    pass
-
-            self.socket.settimeout(timeout)
-            return result
+            peer_closed : bool = False
+            if not self.frame_buffer.has_frame():
+                timeout : float|None = self.socket.timeout
+                self.socket.settimeout(0.0)
+                ready_read : list[socket.socket] = (select([self.socket], [], [], 0.0))[0]
+                if self.socket in ready_read:
+                    try:
+                        peer_closed = self.frame_buffer.recv_into(self.socket, NetworkClient.BUFF_SIZE) == 0
+                    except Exception as e:
+                        pass
+                self.socket.settimeout(timeout)
+            with self.writer_lock:
+                replies : bytes = self.framing.handle_buffered()
+                if replies: self._queue_frame(None, replies)
+            return peer_closed or self.frame_buffer.has_frame()
         
         
         def connect_to_server(self):
@@ -108,10 +131,7 @@ def init(use_pygame_events : bool = True):
             if self.buffered_messages and use_buffer:
                 to_return : bytes = self.buffered_messages.pop(0)
                 return to_return
-            prefix : bytes = self.receive_prefix()
-            if prefix is None: return
-            msg_len : int = from_base_256(prefix)
-            data = self._receive_message(msg_len)
+            data : bytes|None = self._receive_frame()
             if data is None: return None
             if data:
                 if self.buffered_messages and use_buffer:
@@ -136,10 +156,7 @@ def init(use_pygame_events : bool = True):
             messages_received : int = 0
             while messages_received < message_count or (message_count < 0):
                 if self._closed: break
-                prefix : bytes = self.receive_prefix()
-                if prefix is None: break
-                msg_len : int = from_base_256(prefix)
-                data = self._receive_message(msg_len)
+                data : bytes|None = self._receive_frame()
                 if data:
                     messages_received += 1
                     if not self.buffer_next_message:
@@ -151,97 +168,108 @@ def init(use_pygame_events : bool = True):
                     break
             self.listening -= 1
         
-        def receive_prefix(self) -> bytes|None:
-            prefix_received : int = 0
-            prefix : bytes = bytes(0)
-            while prefix_received < NetworkClient.PREFIX_LENTGH:
-                try:
-                    if self._closed: return
-                    data = self.untreated_data or self.socket.recv(NetworkClient.BUFF_SIZE)
-                    self.untreated_data = bytes(0)
-                except socket.timeout:
+        def _receive_frame(self) -> bytes|None:
+            #blocks until a whole frame is buffered, None when the client is closed or the server disconnected
+            while True:
+                data : bytes|None = self.frame_buffer.next_frame()
+                if data is not None:
+                    #the version switch and the queued reply happen under the lock, so no frame of the new format gets ahead of the reply
+                    with self.writer_lock:
+                        reply : bytes|None = self.framing.handle(data)
+                        if reply: self._queue_frame(None, reply)
+                    if reply is None: return data
                     continue
-                if data == b'':
-                    if self.use_pygame_events: event.post(Event(NETWORK_SERVER_DISCONNECTED, {'network' : self}))
-                    return None
-                prefix_received += len(data)
-                prefix += data
-
-            self.untreated_data += prefix[NetworkClient.PREFIX_LENTGH:]
-            return prefix[:NetworkClient.PREFIX_LENTGH]
-        
-        def _receive_message(self, lentgh : int) -> bytes|None:
-            data_received : int = 0
-            total_data : bytes = bytes(0)
-            while data_received < lentgh:
-                if self._closed: return
+                if self._closed: return None
                 try:
-                    data = self.untreated_data or self.socket.recv(NetworkClient.BUFF_SIZE)
-                    self.untreated_data = bytes(0)
+                    received : int = self.frame_buffer.recv_into(self.socket, NetworkClient.BUFF_SIZE)
                 except socket.timeout:
                     continue
-                if data == b'':
+                if received == 0:
                     if self.use_pygame_events: event.post(Event(NETWORK_SERVER_DISCONNECTED, {'network' : self}))
                     self.connected = False
                     return None
-                data_received += len(data)
-                total_data += data
-            self.untreated_data += total_data[lentgh:]
-            return total_data[:lentgh]
 
         def send_message(self, data : bytes) -> bool:
+            '''Queues a message for the writer thread. Returns False when the client is closed or the queue stayed full for a socket timeout.
+            Raises FramingError for a message too long for the framing in use.'''
             if self._closed: return False
-            _thread.start_new_thread(self._send_message, (data,))
+            with self.writer_lock:
+                return self._queue_frame(data, self.framing.encode(data))
+
+        def _queue_frame(self, data : bytes|None, frame : bytes) -> bool:
+            #call with writer_lock held, frames are encoded and queued under it so they stay in the order of the framing versions
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(target=self._write_messages, daemon=True)
+                self.writer_thread.start()
+            try:
+                self.outbound_queue.put((data, frame), timeout=self.socket.gettimeout() or 1)
+            except Full:
+                return False
             return True
         
-        @staticmethod
-        def make_prefix(message_lentgh : int) -> bytes:
-            if message_lentgh > 2 ** (8 * NetworkClient.PREFIX_LENTGH):
-                return None
-            return bytes(convert_to_base_256(message_lentgh, min_chars=NetworkClient.PREFIX_LENTGH))
-        
-        @staticmethod
-        def read_prefix(prefix : bytes) -> int:
-            return from_base_256(prefix)
+        def _write_messages(self):
+            while True:
+                try:
+                    item : tuple[bytes|None, bytes]|None = self.outbound_queue.get(timeout=1)
+                except Empty:
+                    if self._closed: return
+                    continue
+                if item is None: return
+                #everything already queued goes out with this frame in a single send
+                batch : list[tuple[bytes|None, bytes]] = [item]
+                batch_size : int = len(item[1])
+                while batch_size < NetworkClient.MAX_BATCH_BYTES:
+                    try:
+                        item = self.outbound_queue.get_nowait()
+                    except Empty:
+                        break
+                    if item is None: break
+                    batch.append(item)
+                    batch_size += len(item[1])
+                if not self._send_batch(batch): return
+                if item is None: return
 
-        def _send_message(self, data : bytes):
-            byte_count : int = len(data)
+        def _send_batch(self, batch : list[tuple[bytes|None, bytes]], raise_errors : bool = False) -> bool:
+            final_data : bytes = b''.join([frame for _, frame in batch])
+            view : memoryview = memoryview(final_data)
             bytes_sent : int = 0
-            prefix = self.make_prefix(byte_count)
-
-            final_data : bytes = b''.join([prefix, data])
-            final_byte_count : int = len(final_data)
-
-            while bytes_sent < final_byte_count:
+            #like sendall, but keeps going through the socket timeouts and knows how far it got
+            while bytes_sent < len(final_data):
                 try:
-                    successful_sent : int = self.socket.send(final_data[bytes_sent:])
+                    successful_sent : int = self.socket.send(view[bytes_sent:])
                 except socket.timeout:
                     continue
+                except OSError:
+                    if raise_errors: raise
+                    successful_sent = 0
                 if successful_sent == 0:
                     if self.use_pygame_events: event.post(Event(NETWORK_SERVER_DISCONNECTED, {'network' : self}))
                     self.connected = False
-                    if self.use_pygame_events: event.post(Event(NETWORK_MESSAGE_FAILED, {'data_sent' : data, 'progress' : bytes_sent - (final_byte_count - byte_count), 'network' : self}))
-                    return
+                    for data, frame in batch:
+                        progress : int = max(bytes_sent - (len(frame) - len(data or b'')), 0)
+                        if self.use_pygame_events and data is not None:
+                            event.post(Event(NETWORK_MESSAGE_FAILED, {'data_sent' : data, 'progress' : progress, 'network' : self}))
+                        bytes_sent -= len(frame)
+                    return False
                 bytes_sent += successful_sent
-            
-            if self.use_pygame_events: event.post(Event(NETWORK_MESSAGE_SENT, {'data' : data, 'network' : self}))
+            if self.use_pygame_events:
+                for data, _ in batch:
+                    if data is not None: event.post(Event(NETWORK_MESSAGE_SENT, {'data' : data, 'network' : self}))
+            return True
+        
+        @staticmethod
+        def make_prefix(message_lentgh : int) -> bytes:
+            return make_prefix(message_lentgh)
+        
+        @staticmethod
+        def read_prefix(prefix : bytes) -> int:
+            return read_prefix(prefix)[0]
+
+        def _send_message(self, data : bytes):
+            '''Sends one message right away on the calling thread and raises on socket errors. Bypasses the queue, so only use it before the first send_message.'''
+            self._send_batch([(data, self.framing.encode(data))], raise_errors=True)
 
     global _is_init
     _is_init = True
 
-def convert_to_base_256(n : int, min_chars : int) -> list[int]:
-    base = 256
-    if n == 0: return [0]
-    result = []
-    char_count : int = 0
-    while n or char_count < min_chars:
-        n, remainder = divmod(n, base)
-        result.append(remainder)
-        char_count += 1
-    return result
-
-def from_base_256(val : bytes|list[int]):
-    return sum([x * (256 ** n) for n, x in enumerate(val)])
-
-
 _is_init : bool = False
\ No newline at end of file
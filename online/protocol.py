@@ -0,0 +1,86 @@
+import struct
+from enum import IntEnum
+from typing import Any, Callable
+from game.chess_module import (ChessMove, TeamType, PieceType, PackedMove, MOVE_QUIET, MOVE_PROMOTION, PROMOTION_INDEXES,
+                               pack_move, unpack_move, square_index)
+
+#every message is one opcode byte followed by a fixed struct layout, GAME_OVER also carries its outcome as utf-8 text
+class Opcode(IntEnum):
+    CONNECTION_ESTABLISHED = 1
+    GAME_STARTING = 2
+    TRY_MOVE = 3
+    OPPONENT_MOVE = 4
+    MADE_INVALID_MOVE = 5
+    GAME_OVER = 6
+    DISCONNECTING = 7
+    #the one byte message the server has always used to check that a socket is alive
+    PING = 90
+
+#a move is sent as the 16 bit PackedMove of chess_module, with only the promotion flags set since the receiver works out the rest
+MESSAGE_LAYOUTS : dict[Opcode, struct.Struct] = {
+    Opcode.CONNECTION_ESTABLISHED : struct.Struct('<B'),
+    Opcode.GAME_STARTING : struct.Struct('<BB'),
+    Opcode.TRY_MOVE : struct.Struct('<BH'),
+    Opcode.OPPONENT_MOVE : struct.Struct('<BH'),
+    Opcode.MADE_INVALID_MOVE : struct.Struct('<B'),
+    Opcode.GAME_OVER : struct.Struct('<B'),
+    Opcode.DISCONNECTING : struct.Struct('<B'),
+    Opcode.PING : struct.Struct('<B'),
+}
+OPCODES : dict[int, Opcode] = {opcode.value : opcode for opcode in Opcode}
+PAYLOAD_OPCODES : frozenset[Opcode] = frozenset((Opcode.GAME_STARTING, Opcode.TRY_MOVE, Opcode.OPPONENT_MOVE, Opcode.GAME_OVER))
+
+class ProtocolError(ValueError):
+    pass
+
+def pack_wire_move(move : ChessMove) -> PackedMove:
+    promotion : PieceType = move['extra_info'].get('promotion_choice', PieceType.EMPTY)
+    flags : int = MOVE_PROMOTION | PROMOTION_INDEXES[promotion] if promotion else MOVE_QUIET
+    return pack_move(square_index(*move['start_pos']), square_index(*move['end_pos']), flags)
+
+def encode_message(opcode : Opcode, payload : Any = None) -> bytes:
+    '''payload is a TeamType for GAME_STARTING, a ChessMove for TRY_MOVE and OPPONENT_MOVE, the outcome text for GAME_OVER
+    and None otherwise.'''
+    layout : struct.Struct = MESSAGE_LAYOUTS[opcode]
+    if opcode == Opcode.GAME_STARTING: return layout.pack(opcode, payload)
+    if opcode in (Opcode.TRY_MOVE, Opcode.OPPONENT_MOVE): return layout.pack(opcode, pack_wire_move(payload))
+    if opcode == Opcode.GAME_OVER: return layout.pack(opcode) + payload.encode()
+    return layout.pack(opcode)
+
+def decode_message(message : bytes) -> tuple[Opcode, Any]:
+    '''The opcode and payload of a message, the reverse of encode_message. Raises ProtocolError for malformed messages.'''
+    opcode : Opcode|None = OPCODES.get(message[0]) if message else None
+    if opcode is None: raise ProtocolError(f'Unknown message {message[:16]!r}')
+    layout : struct.Struct = MESSAGE_LAYOUTS[opcode]
+    if len(message) != layout.size and not (opcode == Opcode.GAME_OVER and len(message) > layout.size):
+        raise ProtocolError(f'{opcode.name} message of {len(message)} bytes, expected {layout.size}')
+    fields : tuple = layout.unpack_from(message)
+    try:
+        if opcode == Opcode.GAME_STARTING: return opcode, TeamType(fields[1])
+        if opcode in (Opcode.TRY_MOVE, Opcode.OPPONENT_MOVE): return opcode, unpack_move(fields[1])
+    except (ValueError, IndexError):
+        raise ProtocolError(f'Malformed {opcode.name} message {message!r}')
+    if opcode == Opcode.GAME_OVER: return opcode, message[layout.size:].decode(errors='replace')
+    return opcode, None
+
+class MessageDispatcher:
+    '''Table of handlers by opcode. Handlers get the decoded payload, or nothing for messages without one.'''
+    def __init__(self):
+        self.handlers : dict[Opcode, Callable[..., Any]] = {}
+
+    def register(self, opcode : Opcode, handler : Callable[..., Any]):
+        self.handlers[opcode] = handler
+
+    def dispatch(self, message : bytes) -> bool:
+        '''Calls the handler of the message. Returns False for malformed messages and opcodes without a handler.'''
+        try:
+            opcode, payload = decode_message(message)
+        except ProtocolError:
+            return False
+        handler : Callable[..., Any]|None = self.handlers.get(opcode)
+        if handler is None: return False
+        if opcode in PAYLOAD_OPCODES:
+            handler(payload)
+        else:
+            handler()
+        return True
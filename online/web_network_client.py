@@ -3,9 +3,9 @@ import pygame
 from pygame import event, Event
 import socket
 from select import select
-from enum import Enum
 import asyncio
 from time import perf_counter
+from online.framing import FrameBuffer, FramingNegotiation, encode_frame, make_prefix, read_prefix
 WEBPLATFORM = 'emscripten'
 
 NETWORK_MESSAGE_RECIVED = event.custom_type()
@@ -18,42 +18,8 @@ if sys.platform != WEBPLATFORM:
     pass
     #raise ImportError('Imported the web client while offline!')
 
-class MessageBuildingPhase(Enum):
-    PREFIX = 1
-    MESSAGE = 2
-
-class MessageBuilder:
-    def __init__(self):
-        self.phase : MessageBuildingPhase = MessageBuildingPhase.PREFIX
-        self.held_data : list[bytes|None] = [None]
-    
-    def process(self, data : bytes) -> tuple[int, bytes|None]:
-        total_data_processed : int = 0
-        if self.phase == MessageBuildingPhase.PREFIX:
-            if len(data) < WebNetworkClient.PREFIX_LENTGH: return total_data_processed, None
-            prefix : bytes = data[:WebNetworkClient.PREFIX_LENTGH]
-            data = data[WebNetworkClient.PREFIX_LENTGH:]
-            total_data_processed += WebNetworkClient.PREFIX_LENTGH
-            self.held_data[0] = prefix
-            self.phase = MessageBuildingPhase.MESSAGE
-            
-        if self.phase == MessageBuildingPhase.MESSAGE:
-            prefix : bytes = self.held_data[0]
-            if prefix is None: 
-                self.phase = MessageBuildingPhase.PREFIX
-                return (total_data_processed, None)
-            msg_len : int = from_base_256(prefix)
-            if len(data) < msg_len: return (total_data_processed, None)
-            message : bytes = data[:msg_len]
-            total_data_processed += msg_len
-            data = data[msg_len:]
-            self.phase = MessageBuildingPhase.PREFIX
-            self.held_data[0] = None
-            return (total_data_processed, message)
-        
 class WebNetworkClient:
     UUID = 0
-    PREFIX_LENTGH = 2
     PORT = 40674
     USE_PREFIXES = True
     BUFF_SIZE = 4096
@@ -75,9 +41,9 @@ class WebNetworkClient:
         self.connected : bool = False
         self.listening : int = 1
 
-        self.unread_data : bytes = bytes(0)
+        self.frame_buffer : FrameBuffer = FrameBuffer(WebNetworkClient.BUFF_SIZE)
+        self.framing : FramingNegotiation = FramingNegotiation(self.frame_buffer)
         self.unsent_data : bytes = bytes(0)
-        self.messsage_builder : MessageBuilder = MessageBuilder()
     
     def update(self):
         if self._closed: return
@@ -90,17 +56,16 @@ class WebNetworkClient:
         if self.socket not in ready_read: return False
         if not self.connected: return False
         try:
-            data : bytes = self.socket.recv(WebNetworkClient.BUFF_SIZE)
+            received : int = self.frame_buffer.recv_into(self.socket, WebNetworkClient.BUFF_SIZE)
         except ConnectionResetError:
             self.send_dc_event()
             return False
         except ConnectionAbortedError:
             self.send_dc_event()
             return False
-        if data == b'':
+        if received == 0:
             self.send_dc_event()
             return False
-        self.unread_data += data
         return True
 
     def process_send_queue(self) -> bool:
@@ -116,22 +81,23 @@ class WebNetworkClient:
         return True
     
     def process_reception_queue(self) -> bool:
-        if not self.unread_data: return False
+        if not len(self.frame_buffer): return False
         if not self.USE_PREFIXES:
-            self.send_message_received_event(self.unread_data)
-            self.unread_data = bytes(0)
+            self.send_message_received_event(self.frame_buffer.take_all())
             return True
-        total_processed, message = self.messsage_builder.process(self.unread_data)
-        self.unread_data = self.unread_data[total_processed:]
-        if message:
-            self.send_message_received_event(message)
+        for message in self.frame_buffer.frames():
+            reply : bytes|None = self.framing.handle(message)
+            if reply is None:
+                self.send_message_received_event(message)
+            else:
+                self.unsent_data += reply
         return True
     
     @staticmethod
     def is_socket_alive(sock : socket.socket) -> bool:
         data_sent : int = 0
         try:
-            result : int = sock.send((bytes(convert_to_base_256(1, min_chars=WebNetworkClient.PREFIX_LENTGH)) + bytes([90]))[data_sent:])
+            result : int = sock.send(encode_frame(bytes([90]))[data_sent:])
         except:
             return False
         if result == 0: return False
@@ -139,7 +105,7 @@ class WebNetworkClient:
         data_sent += result
         while data_sent < 3:
             try:
-                result = sock.send((bytes(convert_to_base_256(1, min_chars=WebNetworkClient.PREFIX_LENTGH)) + bytes([90]))[data_sent:])
+                result = sock.send(encode_frame(bytes([90]))[data_sent:])
             except:
                 return False
             if result == 0: return False
@@ -175,13 +141,11 @@ class WebNetworkClient:
     
     @staticmethod
     def make_prefix(message_lentgh : int) -> bytes:
-        if message_lentgh > 2 ** (8 * WebNetworkClient.PREFIX_LENTGH):
-            return None
-        return bytes(convert_to_base_256(message_lentgh, min_chars=WebNetworkClient.PREFIX_LENTGH))
+        return make_prefix(message_lentgh)
     
     @staticmethod
     def read_prefix(prefix : bytes) -> int:
-        return from_base_256(prefix)
+        return read_prefix(prefix)[0]
     
     def send_message(self, data : bytes) -> bool:
         print(f'attempted_send : {data}', self._closed, self.connected)
@@ -189,8 +153,7 @@ class WebNetworkClient:
         if self.connected == False: return False
         final_data : bytes
         if WebNetworkClient.USE_PREFIXES:
-            prefix : bytes = self.make_prefix(len(data))
-            final_data = prefix + data
+            final_data = self.framing.encode(data)
         else:
             final_data = data
 
@@ -215,18 +178,3 @@ class WebNetworkClient:
     
     def cleanup(self):
         self.socket.close()
-
-
-def convert_to_base_256(n : int, min_chars : int) -> list[int]:
-    base = 256
-    if n == 0: return [0]
-    result = []
-    char_count : int = 0
-    while n or char_count < min_chars:
-        n, remainder = divmod(n, base)
-        result.append(remainder)
-        char_count += 1
-    return result
-
-def from_base_256(val : bytes|list[int]):
-    return sum([x * (256 ** n) for n, x in enumerate(val)])
\ No newline at end of file
@@ -7,10 +7,16 @@ import socket
 from time import sleep
 import _thread
 import game.chess_module as chess_module
+import game.bitbase as bitbase
 from random import shuffle, randint
 import online.network_client as network_client
+from online.framing import FramingNegotiation, encode_frame
+from online.protocol import Opcode, MessageDispatcher, encode_message
 network_client.init(use_pygame_events=False)
 
+#kqk/krk/kpk files from `python -m game.bitbase generate`, used to end decided games early
+BITBASES : bitbase.Bitbases|None = bitbase.load_bitbases(os.path.join(os.path.dirname(__file__), os.path.pardir, bitbase.DEFAULT_DIRECTORY))
+
 s = socket.socket()
 s.setblocking(True)
 print("Socket successfully created")
@@ -38,7 +44,7 @@ def is_socket_alive(sock : socket.socket) -> bool:
     data_sent : int = 0
     try:
         sock.settimeout(10)
-        result : int = sock.send((bytes(network_client.convert_to_base_256(1, min_chars=NetworkClient.PREFIX_LENTGH)) + bytes([90]))[data_sent:])
+        result : int = sock.send(encode_frame(encode_message(Opcode.PING))[data_sent:])
         sock.settimeout(old_timeout)
     except:
         return False
@@ -48,7 +54,7 @@ def is_socket_alive(sock : socket.socket) -> bool:
     while data_sent < 3:
         try:
             sock.settimeout(10)
-            result = sock.send((bytes(network_client.convert_to_base_256(1, min_chars=NetworkClient.PREFIX_LENTGH)) + bytes([90]))[data_sent:])
+            result = sock.send(encode_frame(encode_message(Opcode.PING))[data_sent:])
             sock.settimeout(old_timeout)
         except:
             return False
@@ -58,6 +64,9 @@ def is_socket_alive(sock : socket.socket) -> bool:
     return True
 
 
+#stands in for the message of a client whose connection dropped
+DISCONNECTING_MESSAGE : bytes = encode_message(Opcode.DISCONNECTING)
+
 def manage_client(conn1 : socket.socket, adress1 : Any):
     global current_thread_count, grab_socket_ok
     SOCKET_TIMEOUT = 2
@@ -67,7 +76,8 @@ def manage_client(conn1 : socket.socket, adress1 : Any):
     print(adress1)
     grab_socket_ok = False
     try:
-        client1._send_message(b'ConnectionEstablished')
+        client1._send_message(encode_message(Opcode.CONNECTION_ESTABLISHED))
+        client1._send_message(FramingNegotiation.offer())
     except ConnectionAbortedError:
         current_thread_count -= 1
         print('client aborted connection')
@@ -90,7 +100,7 @@ def manage_client(conn1 : socket.socket, adress1 : Any):
         client2.use_pygame_events = False
         client2.socket.settimeout(SOCKET_TIMEOUT)
         try:
-            client2._send_message(b'ConnectionEstablished')
+            client2._send_message(encode_message(Opcode.CONNECTION_ESTABLISHED))
         except ConnectionAbortedError:
             print('Client aborted connection')
             print('Getting a new client')
@@ -116,27 +126,83 @@ def manage_client(conn1 : socket.socket, adress1 : Any):
     client2 : NetworkClient = NetworkClient(connection_socket=conn2, connection_ip='')
     client2.use_pygame_events = False
     client2.socket.settimeout(SOCKET_TIMEOUT)
+    client2.send_message(FramingNegotiation.offer())
     
-    order = [b'W', b'B'] if randint(0, 1) else [b'B', b'W']
+    order = [chess_module.TeamType.WHITE, chess_module.TeamType.BLACK] if randint(0, 1) else [chess_module.TeamType.BLACK, chess_module.TeamType.WHITE]
     id1, id2 = client1.identifier, client2.identifier
     print(id1, id2)
     game : chess_module.ChessGame = chess_module.ChessGame()
     first_client : NetworkClient
-    print(f'{order[0]}-->', end='')
-    if order[0] == b'W':
-        client1_team = chess_module.TeamType.WHITE
-    else:
-        client1_team = chess_module.TeamType.BLACK
+    print(f'{order[0].name}-->', end='')
+    client1_team = order[0]
     client2_team = client1_team.opposite()
-    outcome1 : bytes = b'None'
-    outcome2 : bytes = b'None'
+    outcome1 : str = 'None'
+    outcome2 : str = 'None'
     break_loop : bool = False
 
     other_message : bytes|None = None
     message : bytes|None = None
 
-    client1.send_message(b'GameStarting' + order[0])
-    client2.send_message(b'GameStarting' + order[1])
+    def end_by_disconnect(client : NetworkClient):
+        nonlocal outcome1, outcome2, break_loop
+        client.close()
+        outcome1 = 'Your opponent disconnected. You win!'
+        outcome2 = 'Your opponent disconnected. You win!'
+        break_loop = True
+
+    def on_try_move(move_made : chess_module.ChessMove):
+        nonlocal outcome1, outcome2, break_loop
+        if not game.validate_move(move_made['start_pos'], move_made['end_pos'], move_made['extra_info']):
+            current_client.send_message(encode_message(Opcode.MADE_INVALID_MOVE))
+            outcome1 = 'Your opponent disconnected. You win!'
+            outcome2 = 'Your opponent disconnected. You win!'
+            break_loop = True
+            return
+        ext = game.make_move(move_made['start_pos'], move_made['end_pos'], move_made['extra_info'])
+        other_client.send_message(encode_message(Opcode.OPPONENT_MOVE, move_made))
+        for inst in ext:
+            if inst['type'] == 'stalemate':
+                outcome1 = 'Stalemate!'
+                outcome2 = 'Stalemate!'
+                break_loop = True
+                break
+            elif inst['type'] == 'insufficent_material':
+                outcome1 = 'Draw by insufficent material!'
+                outcome2 = 'Draw by insufficent material!'
+                break_loop = True
+                break
+            elif inst['type'] == 'threefold_repetition':
+                outcome1 = 'Draw by threefold repetition!'
+                outcome2 = 'Draw by threefold repetition!'
+                break_loop = True
+                break
+
+            elif inst['type'] == 'checkmate':
+                outcome1 = 'Checkmate!'
+                outcome2 = 'Checkmate!'
+                break_loop = True
+                break
+        if not break_loop and BITBASES is not None:
+            bitbase_result : int|None = BITBASES.probe(game)
+            if bitbase_result == bitbase.DRAW:
+                outcome1 = 'Draw by adjudication!'
+                outcome2 = 'Draw by adjudication!'
+                break_loop = True
+            elif bitbase_result is not None:
+                winner : chess_module.TeamType = game.current_turn if bitbase_result == bitbase.WIN else game.current_turn.opposite()
+                outcome1 = 'White wins by adjudication!' if winner == chess_module.TeamType.WHITE else 'Black wins by adjudication!'
+                outcome2 = outcome1
+                break_loop = True
+
+    #the client whose turn it is may move or leave, the other one may only leave
+    mover_dispatcher : MessageDispatcher = MessageDispatcher()
+    mover_dispatcher.register(Opcode.DISCONNECTING, lambda : end_by_disconnect(current_client))
+    mover_dispatcher.register(Opcode.TRY_MOVE, on_try_move)
+    waiting_dispatcher : MessageDispatcher = MessageDispatcher()
+    waiting_dispatcher.register(Opcode.DISCONNECTING, lambda : end_by_disconnect(other_client))
+
+    client1.send_message(encode_message(Opcode.GAME_STARTING, order[0]))
+    client2.send_message(encode_message(Opcode.GAME_STARTING, order[1]))
     grab_socket_ok = True
     current_client : NetworkClient = client1 if client1_team == game.current_turn else client2
     print(current_client.identifier)
@@ -150,12 +216,12 @@ def manage_client(conn1 : socket.socket, adress1 : Any):
             if current_client.peek():
                 try:
                     message : bytes|None = current_client.wait_for_message(use_buffer=True)
-                    if message is None: message = b'Disconnecting'
+                    if message is None: message = DISCONNECTING_MESSAGE
                 except OSError:
                     current_thread_count -= 1
                     print("Removing a trhead")
                     print(f'Current Trhead Count: {current_thread_count}')
-                    other_client.send_message(b'GameOverYour opponent disconnected. You win!')
+                    other_client.send_message(encode_message(Opcode.GAME_OVER, 'Your opponent disconnected. You win!'))
                     sleep(1.5)
                     
                     other_client.close()
@@ -166,12 +232,12 @@ def manage_client(conn1 : socket.socket, adress1 : Any):
             elif other_client.peek():
                 try:
                     other_message : bytes|None = other_client.wait_for_message(use_buffer=True)
-                    if other_message is None: other_message = b'Disconnecting'
+                    if other_message is None: other_message = DISCONNECTING_MESSAGE
                 except OSError:
                     current_thread_count -= 1
                     print("Removing a trhead")
                     print(f'Current Trhead Count: {current_thread_count}')
-                    current_client.send_message(b'GameOverYour opponent disconnected. You win!')
+                    current_client.send_message(encode_message(Opcode.GAME_OVER, 'Your opponent disconnected. You win!'))
                     sleep(1.5)          
                     other_client.close()
                     other_client.cleanup()
@@ -182,55 +248,17 @@ def manage_client(conn1 : socket.socket, adress1 : Any):
             sleep(0.05)
         print(f'Received {message or other_message}')
         
-        if other_message == b'Disconnecting':
-            break_loop = True
-            outcome1 = b'Your opponent disconnected. You win!'
-            outcome2 = b'Your opponent disconnected. You win!'
-            other_client.close()
-        
-        elif other_message is not None:
-            continue
-
-        elif message == b'Disconnecting':
-            current_client.close()
-            outcome1 = b'Your opponent disconnected. You win!'
-            outcome2 = b'Your opponent disconnected. You win!'
-            break
-        elif message.startswith(b'TryMove'):
-            move_data : bytes = message.removeprefix(b'TryMove')
-            move_made : chess_module.ChessMove = chess_module.decode_move(move_data)
-            if game.validate_move(move_made['start_pos'], move_made['end_pos'], move_made['extra_info']):
-                ext = game.make_move(move_made['start_pos'], move_made['end_pos'], move_made['extra_info'])
-                other_client.send_message(b'OpponentMove' + chess_module.encode_move(move_made))
-                for inst in ext:
-                    if inst['type'] == 'stalemate':
-                        outcome1 = b'Stalemate!'
-                        outcome2 = b'Stalemate!'
-                        break_loop = True
-                        break
-                    elif inst['type'] == 'insufficent_material':
-                        outcome1 = b'Draw by insufficent material!'
-                        outcome2 = b'Draw by insufficent material!'
-                        break_loop = True
-                        break
-
-                    elif inst['type'] == 'checkmate':
-                        outcome1 = b'Checkmate!'
-                        outcome2 = b'Checkmate!'
-                        break_loop = True
-                        break
-            else:
-                current_client.send_message(b'MadeInvalidMove')
-                outcome1 = b'Your opponent disconnected. You win!'
-                outcome2 = b'Your opponent disconnected. You win!'
-                break
+        if other_message is not None:
+            waiting_dispatcher.dispatch(other_message)
+        else:
+            mover_dispatcher.dispatch(message)
         if break_loop:
             break
         
     
     sleep(0.1)
-    client1.send_message(b'GameOver' + outcome1)
-    client2.send_message(b'GameOver' + outcome2)
+    client1.send_message(encode_message(Opcode.GAME_OVER, outcome1))
+    client2.send_message(encode_message(Opcode.GAME_OVER, outcome2))
     sleep(3)
     client1.close()
     client1.cleanup()
@@ -0,0 +1,39 @@
+import os
+import pytest
+from game.chess_module import ChessGame
+from game.bitbase import Bitbases, generate_bitbase, write_bitbase, WIN, DRAW, LOSS
+
+@pytest.fixture(scope='module')
+def bitbases(tmp_path_factory : pytest.TempPathFactory):
+    #the generation takes a few seconds, so it runs once for the whole module
+    directory : str = str(tmp_path_factory.mktemp('bitbases'))
+    tables : dict[str, tuple[bytearray, bytearray]] = {}
+    for ending in ('kqk', 'krk', 'kpk'):
+        tables[ending] = generate_bitbase(ending, tables)
+        write_bitbase(os.path.join(directory, f'{ending}.bb'), tables[ending])
+    result : Bitbases = Bitbases(directory)
+    yield result
+    result.close()
+
+@pytest.mark.parametrize('fen, expected', [
+    ('8/8/8/4k3/8/8/8/4K2Q w - - 0 1', WIN),
+    ('8/8/8/4k3/8/8/8/4K2Q b - - 0 1', LOSS),
+    #the weak king takes the undefended queen
+    ('8/8/8/8/8/8/6kQ/4K3 b - - 0 1', DRAW),
+    ('8/8/8/4k3/8/8/8/R3K3 w - - 0 1', WIN),
+    ('4k3/8/4K3/4P3/8/8/8/8 b - - 0 1', LOSS),
+    #rook pawn with the weak king in the corner
+    ('k7/8/8/8/8/8/P7/K7 w - - 0 1', DRAW),
+    #black strong side, probed through the ^56 mirror
+    ('r3k3/8/8/8/8/8/8/4K3 b - - 0 1', WIN),
+    ('r3k3/8/8/8/8/8/8/4K3 w - - 0 1', LOSS),
+    ('8/8/8/8/4p3/4k3/8/4K3 b - - 0 1', WIN),
+    ('8/8/8/8/4p3/4k3/8/4K3 w - - 0 1', LOSS),
+    ('k7/p7/8/8/8/8/8/K7 b - - 0 1', DRAW),
+])
+def test_probe(bitbases : Bitbases, fen : str, expected : int):
+    assert bitbases.probe(ChessGame.from_fen(fen)) == expected
+
+def test_probe_outside_the_endings(bitbases : Bitbases):
+    assert bitbases.probe(ChessGame.from_fen('8/8/8/4k3/8/8/8/4KQ1q w - - 0 1')) is None
+    assert bitbases.probe(ChessGame.from_fen('8/8/8/4k3/8/8/8/4KB2 w - - 0 1')) is None
@@ -0,0 +1,28 @@
+import pytest
+from game.chess_module import ChessGame, ChessMoveExtraInfo, TeamType, MOVE_EN_PASSANT, move_flags
+
+def play(game : ChessGame, start_pos : tuple[int, int], end_pos : tuple[int, int]) -> list[str]:
+    extra_info : ChessMoveExtraInfo = {}
+    return [instruction['type'] for instruction in game.make_move(start_pos, end_pos, extra_info)]
+
+def test_perpetual_check_is_threefold_repetition():
+    game : ChessGame = ChessGame.from_fen('8/6pk/8/8/8/8/3Q2PP/6K1 w - - 0 1')
+    assert play(game, (4, 2), (4, 3)) == ['check']
+    shuffle : list[tuple[tuple[int, int], tuple[int, int]]] = [((8, 7), (7, 8)), ((4, 3), (4, 8)), ((7, 8), (8, 7)), ((4, 8), (4, 3))]
+    results : list[list[str]] = [play(game, start_pos, end_pos) for start_pos, end_pos in shuffle * 2]
+    assert results[3] == ['check']
+    assert results[-1] == ['check', 'threefold_repetition']
+
+def test_en_passant_only_for_side_to_move():
+    game : ChessGame = ChessGame.from_fen('4k3/4p3/8/3pP3/8/8/8/4K3 w - d6 0 1')
+    assert any(move_flags(move) == MOVE_EN_PASSANT for move in game.generate_pseudo_legal_moves(TeamType.WHITE))
+    assert not any(move_flags(move) == MOVE_EN_PASSANT for move in game.generate_pseudo_legal_moves(TeamType.BLACK))
+
+@pytest.mark.parametrize('field', ['e9', 'z3', 'e', 'e33', 'e4'])
+def test_from_fen_rejects_bad_en_passant(field : str):
+    with pytest.raises(ValueError, match='bad FEN en passant field'):
+        ChessGame.from_fen(f'4k3/8/8/8/8/8/8/4K3 w - {field} 0 1')
+
+def test_from_fen_en_passant_round_trip():
+    fen : str = 'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3'
+    assert ChessGame.from_fen(fen).to_fen() == fen
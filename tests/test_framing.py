@@ -0,0 +1,98 @@
+import socket
+import threading
+import time
+import pytest
+from online.framing import (FrameBuffer, FramingNegotiation, FramingError, make_prefix, read_prefix, encode_frame,
+                            FRAMING_LEGACY, FRAMING_FIXED32, FRAMING_VARINT, MAX_MESSAGE_LENGTHS)
+import online.network_client as network_client
+
+@pytest.mark.parametrize('length, prefix_length', [(0, 1), (127, 1), (128, 2), (2 ** 14 - 1, 2), (2 ** 14, 3),
+                                                   (2 ** 21, 4), (2 ** 28 - 1, 4), (2 ** 28, 5), (2 ** 35 - 1, 5)])
+def test_varint_prefix_round_trip(length : int, prefix_length : int):
+    prefix : bytes = make_prefix(length, FRAMING_VARINT)
+    assert len(prefix) == prefix_length
+    assert read_prefix(prefix + b'rest', FRAMING_VARINT) == (length, prefix_length)
+    #every shorter slice is an incomplete prefix, not an error
+    for end in range(prefix_length):
+        assert read_prefix(prefix[:end], FRAMING_VARINT) is None
+
+def test_overlong_varint_raises():
+    with pytest.raises(FramingError):
+        read_prefix(bytes([0x80] * 5), FRAMING_VARINT)
+    with pytest.raises(FramingError):
+        make_prefix(MAX_MESSAGE_LENGTHS[FRAMING_VARINT] + 1, FRAMING_VARINT)
+    with pytest.raises(FramingError):
+        make_prefix(2 ** 16, FRAMING_LEGACY)
+
+@pytest.mark.parametrize('version', [FRAMING_LEGACY, FRAMING_FIXED32, FRAMING_VARINT])
+def test_frames_split_across_reads(version : int):
+    messages : list[bytes] = [b'', b'a', bytes(range(256)) * 3, b'x' * 300]
+    stream : bytes = b''.join(encode_frame(message, version) for message in messages)
+    frame_buffer : FrameBuffer = FrameBuffer(16)
+    frame_buffer.version = version
+    received : list[bytes] = []
+    for index in range(0, len(stream), 7):
+        frame_buffer.feed(stream[index:index + 7])
+        received.extend(frame_buffer.frames())
+    assert received == messages
+    assert len(frame_buffer) == 0
+
+def exchange(receiver : FramingNegotiation, frame : bytes) -> bytes|None:
+    receiver.frame_buffer.feed(frame)
+    return receiver.handle(receiver.frame_buffer.next_frame())
+
+def test_negotiation_switches_both_directions():
+    server : FramingNegotiation = FramingNegotiation(FrameBuffer())
+    client : FramingNegotiation = FramingNegotiation(FrameBuffer())
+    request : bytes = exchange(client, server.encode(FramingNegotiation.offer()))
+    assert client.send_version == FRAMING_VARINT and client.frame_buffer.version == FRAMING_LEGACY
+    #the client writes the new way right after the request, the server reads the request the old way
+    accept : bytes = exchange(server, request)
+    assert server.frame_buffer.version == server.send_version == FRAMING_VARINT
+    assert exchange(client, accept) == b''
+    assert client.frame_buffer.version == FRAMING_VARINT
+    big_message : bytes = b'm' * 100000
+    assert exchange(server, client.encode(big_message)) is None
+    assert server.frame_buffer.next_frame() is None
+    server.frame_buffer.feed(client.encode(big_message))
+    assert server.frame_buffer.next_frame() == big_message
+
+def test_negotiation_leaves_ordinary_messages_alone():
+    negotiation : FramingNegotiation = FramingNegotiation(FrameBuffer())
+    assert negotiation.handle(b'\x04hello') is None
+    assert negotiation.send_version == FRAMING_LEGACY
+
+def test_network_client_switches_framing_in_order_with_concurrent_sends():
+    #the reply that switches the framing has to go out before any frame encoded the new way
+    network_client.init(use_pygame_events=False)
+    client_socket, server_socket = socket.socketpair()
+    client = network_client.NetworkClient(connection_socket=client_socket)
+    client.receive_messages()
+    message_count : int = 2000
+    sender : threading.Thread = threading.Thread(target=lambda : [client.send_message(b'x' * (index % 300)) for index in range(message_count)])
+    sender.start()
+    server : FramingNegotiation = FramingNegotiation(FrameBuffer())
+    server_socket.sendall(server.encode(FramingNegotiation.offer()))
+    server_socket.settimeout(5)
+    received : int = 0
+    try:
+        while received < message_count:
+            assert server.frame_buffer.recv_into(server_socket) > 0
+            for message in server.frame_buffer.frames():
+                reply : bytes|None = server.handle(message)
+                if reply is None:
+                    assert message == b'x' * (received % 300)
+                    received += 1
+                elif reply:
+                    server_socket.sendall(reply)
+    finally:
+        #closing first makes the remaining send_message calls return at once if the stream broke
+        client.close()
+        sender.join()
+        server_socket.close()
+        #the reader stops on the end of the stream, cleanup only closes the socket after that
+        deadline : float = time.monotonic() + 5
+        while client.listening and time.monotonic() < deadline:
+            time.sleep(0.01)
+        client.cleanup()
+    assert server.frame_buffer.version == FRAMING_VARINT
@@ -0,0 +1,20 @@
+import pytest
+from game.chess_module import ChessGame
+from game.perft import PERFT_POSITIONS
+
+#depth 3 runs in a few seconds and still goes through castling, en passant, promotions and checks
+PERFT_DEPTH : int = 3
+
+@pytest.mark.parametrize('name', ['initial', 'kiwipete', 'en_passant', 'promotion', 'promotion_check'])
+def test_perft(name : str):
+    fen, expected_counts = PERFT_POSITIONS[name]
+    game : ChessGame = ChessGame.from_fen(fen)
+    zobrist_key : int = game.zobrist_key
+    assert game.perft(PERFT_DEPTH) == expected_counts[PERFT_DEPTH - 1]
+    #push/pop has to leave the position exactly as it was
+    assert game.to_fen() == fen
+    assert game.zobrist_key == zobrist_key == game.compute_zobrist_key()
+
+def test_perft_divide_sums_to_perft():
+    game : ChessGame = ChessGame.from_fen(PERFT_POSITIONS['kiwipete'][0])
+    assert sum(game.perft_divide(2).values()) == PERFT_POSITIONS['kiwipete'][1][1]
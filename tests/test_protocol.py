@@ -0,0 +1,49 @@
+import pytest
+from typing import Any
+from game.chess_module import ChessMove, TeamType, PROMOTION_PIECES, unpack_move
+from online.protocol import (Opcode, MessageDispatcher, ProtocolError, PAYLOAD_OPCODES, encode_message, decode_message,
+                             pack_wire_move)
+
+MOVES : list[ChessMove] = [
+    ChessMove.new((5, 2), (5, 4), {}),
+    ChessMove.new((7, 1), (6, 3), {}),
+    ChessMove.new((8, 8), (1, 1), {}),
+] + [ChessMove.new((1, 7), (2, 8), {'promotion_choice' : piece}) for piece in PROMOTION_PIECES[TeamType.WHITE]] \
+  + [ChessMove.new((8, 2), (8, 1), {'promotion_choice' : piece}) for piece in PROMOTION_PIECES[TeamType.BLACK]]
+
+PAYLOADS : dict[Opcode, list[Any]] = {
+    Opcode.GAME_STARTING : [TeamType.WHITE, TeamType.BLACK],
+    Opcode.TRY_MOVE : MOVES,
+    Opcode.OPPONENT_MOVE : MOVES,
+    Opcode.GAME_OVER : ['Checkmate!', '', 'Draw by threefold repetition!', 'Échec et mat'],
+}
+
+@pytest.mark.parametrize('opcode', list(Opcode))
+def test_round_trip(opcode : Opcode):
+    for payload in PAYLOADS.get(opcode, [None]):
+        message : bytes = encode_message(opcode, payload)
+        assert message[0] == opcode
+        assert decode_message(message) == (opcode, payload)
+
+@pytest.mark.parametrize('move', MOVES)
+def test_wire_move_is_a_packed_move(move : ChessMove):
+    assert pack_wire_move(move) < 2 ** 16
+    assert unpack_move(pack_wire_move(move)) == move
+    assert len(encode_message(Opcode.TRY_MOVE, move)) == 3
+
+@pytest.mark.parametrize('message', [b'', b'\x00', b'\xff', bytes([Opcode.TRY_MOVE]), bytes([Opcode.PING, 0]), bytes([Opcode.GAME_STARTING, 7])])
+def test_malformed_messages_raise(message : bytes):
+    with pytest.raises(ProtocolError):
+        decode_message(message)
+
+def test_dispatcher():
+    calls : list[Any] = []
+    dispatcher : MessageDispatcher = MessageDispatcher()
+    dispatcher.register(Opcode.OPPONENT_MOVE, calls.append)
+    dispatcher.register(Opcode.DISCONNECTING, lambda : calls.append('disconnecting'))
+    assert dispatcher.dispatch(encode_message(Opcode.OPPONENT_MOVE, MOVES[3]))
+    assert dispatcher.dispatch(encode_message(Opcode.DISCONNECTING))
+    assert not dispatcher.dispatch(encode_message(Opcode.PING))
+    assert not dispatcher.dispatch(b'GameOverCheckmate!')
+    assert calls == [MOVES[3], 'disconnecting']
+    assert Opcode.OPPONENT_MOVE in PAYLOAD_OPCODES and Opcode.DISCONNECTING not in PAYLOAD_OPCODES
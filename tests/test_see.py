@@ -0,0 +1,26 @@
+import pytest
+from game.chess_module import ChessGame
+from game.engine import Engine, INFINITY, evaluate
+
+@pytest.mark.parametrize('fen, start_pos, end_pos, expected', [
+    #pawn takes a knight defended by a pawn
+    ('4k3/8/4p3/3n4/4P3/8/8/4K3 w - - 0 1', (5, 4), (4, 5), 320 - 100),
+    #queen takes a pawn defended by a pawn
+    ('4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1', (4, 1), (4, 5), 100 - 900),
+    #rook takes an undefended knight
+    ('4k3/8/8/3n4/8/8/8/3RK3 w - - 0 1', (4, 1), (4, 5), 320),
+    #doubled rooks win the pawn through the x-ray behind the first one
+    ('3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1', (4, 2), (4, 5), 100),
+    #en passant captures the pawn beside the target square
+    ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', (5, 5), (4, 6), 100),
+])
+def test_see(fen : str, start_pos : tuple[int, int], end_pos : tuple[int, int], expected : int):
+    assert ChessGame.from_fen(fen).see(start_pos, end_pos) == expected
+
+def test_quiescence_takes_a_hanging_queen():
+    game : ChessGame = ChessGame.from_fen('q3k3/8/8/8/8/8/8/R3K3 w - - 0 1')
+    assert evaluate(game) < 0 < Engine(1).quiescence(game, -INFINITY, INFINITY, 0)
+
+def test_quiescence_skips_losing_captures():
+    game : ChessGame = ChessGame.from_fen('4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1')
+    assert Engine(1).quiescence(game, -INFINITY, INFINITY, 0) == evaluate(game)
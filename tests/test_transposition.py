@@ -0,0 +1,55 @@
+from game.transposition import TranspositionTable, TTEntry, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER
+from game.engine import MATE_SCORE, score_to_tt, score_from_tt
+
+KEY : int = 0x9d39247e33776d41
+
+def small_table() -> TranspositionTable:
+    table : TranspositionTable = TranspositionTable(0.01)
+    table.new_search()
+    return table
+
+def test_store_and_probe():
+    table : TranspositionTable = small_table()
+    table.store(KEY, 1234, -56, 7, BOUND_LOWER)
+    entry : TTEntry|None = table.probe(KEY)
+    assert entry is not None
+    assert (entry.move, entry.score, entry.depth, entry.bound) == (1234, -56, 7, BOUND_LOWER)
+
+def test_key_check_rejects_other_positions():
+    table : TranspositionTable = small_table()
+    table.store(KEY, 1234, 10, 3, BOUND_EXACT)
+    #same bucket, different key
+    assert table.probe(KEY + table.bucket_count) is None
+    #a torn write leaves a key word that no longer matches its data word
+    slot : int = (KEY & (table.bucket_count - 1)) * 2
+    table.data[slot] ^= 1
+    assert table.probe(KEY) is None
+
+def test_depth_preferred_slot_survives_shallow_entries():
+    table : TranspositionTable = small_table()
+    deep_key, shallow_key, other_key = KEY, KEY + table.bucket_count, KEY + 2 * table.bucket_count
+    table.store(deep_key, 1, 100, 12, BOUND_EXACT)
+    table.store(shallow_key, 2, 200, 2, BOUND_UPPER)
+    table.store(other_key, 3, 300, 1, BOUND_UPPER)
+    assert table.probe(deep_key).score == 100
+    #the always-replace slot only holds the latest shallow entry
+    assert table.probe(shallow_key) is None
+    assert table.probe(other_key).score == 300
+
+def test_old_deep_entry_is_replaced_in_a_new_search():
+    table : TranspositionTable = small_table()
+    table.store(KEY, 1, 100, 12, BOUND_EXACT)
+    table.new_search()
+    table.store(KEY + table.bucket_count, 2, 200, 2, BOUND_EXACT)
+    assert table.probe(KEY) is None
+    assert table.probe(KEY + table.bucket_count).score == 200
+
+def test_mate_scores_survive_the_ply_adjustment():
+    table : TranspositionTable = small_table()
+    #mate in 5 plies from the root, found at ply 3, is mate in 2 from the stored node
+    table.store(KEY, 1, score_to_tt(MATE_SCORE - 5, 3), 4, BOUND_EXACT)
+    assert score_from_tt(table.probe(KEY).score, 3) == MATE_SCORE - 5
+    assert score_from_tt(table.probe(KEY).score, 7) == MATE_SCORE - 9
+    table.store(KEY, 1, score_to_tt(-MATE_SCORE + 6, 4), 4, BOUND_EXACT)
+    assert score_from_tt(table.probe(KEY).score, 2) == -MATE_SCORE + 4
+    assert score_from_tt(score_to_tt(150, 9), 1) == 150
@@ -0,0 +1,17 @@
+import io
+from game.uci import UCIEngine
+
+def run_commands(*commands : str) -> list[str]:
+    output : io.StringIO = io.StringIO()
+    UCIEngine(output).run(io.StringIO(''.join(command + '\n' for command in commands)))
+    return output.getvalue().splitlines()
+
+def test_bad_input_is_reported_and_ignored():
+    lines : list[str] = run_commands('setoption name Hash value abc', 'position fen not a fen',
+                                     'position fen 4k3/8/8/8/8/8/8/4K3 w - e9 0 1', 'd', 'isready', 'quit')
+    assert lines == ['info string bad Hash value abc', 'info string Invalid FEN: not a fen',
+                     'info string bad FEN en passant field', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', 'readyok']
+
+def test_go_depth_reports_a_best_move():
+    lines : list[str] = run_commands('position startpos moves e2e4', 'go depth 2')
+    assert lines[-1].startswith('bestmove ')